@@ -9,43 +9,127 @@ from typing import Dict, Any
 from datetime import datetime
 from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 import asyncio
+import atexit
+import contextvars
+import queue
+import threading
+import time
+import uuid
 
 # Import ADK components
 from google.adk.agents import Agent
+from google.adk.agents.invocation_context import new_invocation_context_id
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.models.lite_llm import LiteLlm
 from google.adk.sessions import InMemorySessionService, Session
 from google.adk.runners import Runner
+from google.adk.events import Event, EventActions
 from google.genai import types
 import litellm
 
 # Import Cognisphere components
 from services.database import DatabaseService
 from services.embedding import EmbeddingService
+from services.emotion_classifier import EmotionClassifier
+from services.ingestion import MemoryIngestionQueue
+from services.session_store import PersistentSessionService
+from services.tracing import tracer
+from services.intent_router import IntentRouter, DIRECT
 import services_container
-from callbacks.safety import content_filter_callback, tool_argument_validator
+from callbacks.safety import content_filter_callback, tool_argument_validator, safety_matcher
+from services.safety_matcher import CLEAN_VERDICT
 import config
 from services.openrouter_setup import OpenRouterIntegration
-
-if not OpenRouterIntegration.configure_openrouter():
+from services.mock_llm import register_mock_llm
+
+if config.LLM_BACKEND == "mock":
+    # Offline, scripted LLM (models "mock/<agent>"); no API key needed
+    register_mock_llm(
+        script_path=config.MOCK_LLM_CONFIG["script_path"] or None,
+        latency=config.MOCK_LLM_CONFIG["latency"],
+        seed=config.MOCK_LLM_CONFIG["seed"]
+    )
+    print("Mock LLM backend registered.")
+elif not OpenRouterIntegration.configure_openrouter():
     raise RuntimeError("OpenRouter initialisation failed – check API key")
 # Initialize the Flask app
 app = Flask(__name__)
+tracer.configure(enabled=config.TRACING_CONFIG["enabled"], max_traces=config.TRACING_CONFIG["max_traces"])
 print("Flask app initialized.")
 
 # --- Initialize Services ---
 print("Initializing DatabaseService...")
-db_service = DatabaseService(db_path=config.DATABASE_CONFIG["path"])
+db_service = DatabaseService(
+    db_path=config.DATABASE_CONFIG["path"],
+    thread_backend=config.DATABASE_CONFIG["thread_backend"],
+    lexical_index=config.DATABASE_CONFIG["lexical_index"],
+    query_cache_items=config.DATABASE_CONFIG["query_cache_items"],
+    query_cache_ttl_s=config.DATABASE_CONFIG["query_cache_ttl_s"],
+    vector_backend=config.DATABASE_CONFIG["vector_backend"],
+    vector_options=config.DATABASE_CONFIG["vector_options"]
+)
 print("DatabaseService initialized.")
 print("Initializing EmbeddingService...")
-embedding_service = EmbeddingService()
+embedding_service = EmbeddingService(
+    model_name=config.EMBEDDING_CONFIG["model_name"],
+    batch_window_ms=config.EMBEDDING_CONFIG["batch_window_ms"],
+    max_batch_size=config.EMBEDDING_CONFIG["max_batch_size"],
+    cache_dir=config.EMBEDDING_CONFIG["cache_dir"] or None,
+    cache_memory_items=config.EMBEDDING_CONFIG["cache_memory_items"],
+    cache_disk_items=config.EMBEDDING_CONFIG["cache_disk_items"]
+)
 print("EmbeddingService initialized.")
 
+emotion_classifier = None
+if config.EMOTION_CONFIG["classifier"] == "embedding":
+    # Emotions scored against prototype embeddings, sharing vectors with create_memory
+    emotion_classifier = EmotionClassifier(
+        embedding_service=embedding_service,
+        temperature=config.EMOTION_CONFIG["temperature"],
+        min_similarity=config.EMOTION_CONFIG["min_similarity"],
+        min_score=config.EMOTION_CONFIG["min_score"],
+        turn_cache_items=config.EMOTION_CONFIG["turn_cache_items"]
+    )
+
+ingestion_queue = None
+if config.INGESTION_CONFIG["enabled"]:
+    # create_memory returns once the memory is journaled; a worker embeds and stores batches
+    ingestion_queue = MemoryIngestionQueue(
+        db_service=db_service,
+        embedding_service=embedding_service,
+        max_pending=config.INGESTION_CONFIG["max_pending"],
+        batch_size=config.INGESTION_CONFIG["batch_size"],
+        flush_interval_ms=config.INGESTION_CONFIG["flush_interval_ms"],
+        backpressure=config.INGESTION_CONFIG["backpressure"],
+        block_timeout_s=config.INGESTION_CONFIG["block_timeout_s"],
+        journal_path=config.INGESTION_CONFIG["journal_path"] or None,
+        fsync=config.INGESTION_CONFIG["fsync"]
+    )
+
+
+def shutdown_storage():
+    """Store everything still queued, then close the memories vector store."""
+    if ingestion_queue is not None:
+        ingestion_queue.close()
+    db_service.memory_store.close()
+
+# atexit runs handlers in reverse order: this one runs before multiprocessing's (registered
+# when the stores were imported), which stops the sharded store's worker processes
+atexit.register(shutdown_storage)
+
 # Inicialize o container de serviços
-services_container.initialize_services(db_service, embedding_service)
+services_container.initialize_services(db_service, embedding_service, emotion_classifier, ingestion_queue)
 
 # --- Create Session Service ---
 print("Initializing SessionService...")
-session_service = InMemorySessionService()
+if config.SESSION_CONFIG["backend"] == "memory":
+    session_service = InMemorySessionService()
+else:
+    session_service = PersistentSessionService(
+        db_file=config.SESSION_CONFIG["path"],
+        max_cached_sessions=config.SESSION_CONFIG["max_cached_sessions"],
+        max_cached_bytes=config.SESSION_CONFIG["max_cached_bytes"]
+    )
 print("SessionService initialized.")
 litellm._turn_on_debug()
 
@@ -54,6 +138,10 @@ litellm._turn_on_debug()
 from agents.memory_agent import create_memory_agent
 from agents.narrative_agent import create_narrative_agent
 from agents.orchestrator_agent import create_orchestrator_agent
+from agents.greeting_agent import say_hello, say_goodbye
+from tools.emotion_tools import analyze_emotion
+from tools.memory_tools import create_memory, recall_memories
+from tools.narrative_tools import get_active_threads
 
 # --- Initialize Agents ---
 # Set up sub-agents
@@ -67,12 +155,13 @@ orchestrator_agent = create_orchestrator_agent(
     narrative_agent=narrative_agent
 )
 
-# Add safety callbacks if enabled
-if config.SAFETY_CONFIG["enable_content_filter"]:
-    orchestrator_agent.before_model_callback = content_filter_callback
+# Add safety callbacks if enabled (sub-agents too: memory_agent is the one calling create_memory)
+for agent in (orchestrator_agent, memory_agent, narrative_agent):
+    if config.SAFETY_CONFIG["enable_content_filter"]:
+        agent.before_model_callback = content_filter_callback
 
-if config.SAFETY_CONFIG["enable_tool_validation"]:
-    orchestrator_agent.before_tool_callback = tool_argument_validator
+    if config.SAFETY_CONFIG["enable_tool_validation"]:
+        agent.before_tool_callback = tool_argument_validator
 
 # Create Runner
 app_name = "cognisphere_adk"
@@ -82,6 +171,20 @@ runner = Runner(
     session_service=session_service
 )
 
+# Runners rooted at the sub-agents, used when the intent router sends a
+# message straight to one of them (skipping the orchestrator hop)
+sub_agent_runners = {
+    agent.name: Runner(agent=agent, app_name=app_name, session_service=session_service)
+    for agent in (memory_agent, narrative_agent)
+}
+
+# Fast-path router (messages flagged by the safety matcher are never routed, see route_message)
+intent_router = IntentRouter(
+    embedding_service=embedding_service,
+    similarity_threshold=config.ROUTER_CONFIG["similarity_threshold"],
+    max_embedding_words=config.ROUTER_CONFIG["max_embedding_words"]
+)
+
 
 # --- Helper Functions ---
 def ensure_session(user_id: str, session_id: str) -> Session:
@@ -111,12 +214,159 @@ def ensure_session(user_id: str, session_id: str) -> Session:
     return session
 
 
-async def process_message(user_id: str, session_id: str, message: str):
+def new_request_id() -> str:
+    """Generate an ID used to look up a request's trace."""
+    return uuid.uuid4().hex
+
+
+def trace_runner_event(event):
+    """Mark the arrival of an ADK event in the current trace."""
+    if not tracer.enabled:
+        return
+    tracer.event(
+        f"adk.event.{event.author}",
+        partial=bool(event.partial),
+        function_calls=[call.name for call in event.get_function_calls()],
+        function_responses=[response.name for response in event.get_function_responses()],
+        transfer_to_agent=event.actions.transfer_to_agent if event.actions else None,
+        final=event.is_final_response()
+    )
+
+
+class FastPathToolContext:
+    """Stand-in for ToolContext when the router calls a tool directly; collects state writes."""
+
+    def __init__(self):
+        self.state = {}
+
+
+def route_message(message: str):
+    """Classify a message with the intent router (None means use the orchestrator)."""
+    if not config.ROUTER_CONFIG["enabled"]:
+        return None
+    # Blocked keywords, sensitive topics or PII: let the agents' safety callbacks handle it
+    # (the verdict is cached, so the callbacks don't rescan the message)
+    if safety_matcher.scan(message) != CLEAN_VERDICT:
+        return None
+    with tracer.span("router.route") as route_span:
+        decision = intent_router.route(message)
+        route_span.set_attribute("intent", decision.intent if decision else None)
+        route_span.set_attribute("target", decision.target if decision else None)
+    return decision
+
+
+def run_direct_intent(decision, session: Session, message: str):
+    """
+    Handle a routed message by calling its tool directly, without an LLM call.
+
+    The user message and the reply are appended to the session as if the
+    orchestrator had answered, so later turns keep the conversation history.
+
+    Returns:
+        tuple: (reply text, tool name, tool args, tool result)
+    """
+    tool_context = FastPathToolContext()
+
+    if decision.intent == "greeting":
+        tool_name, args = "say_hello", {"name": decision.argument or "there"}
+        result = say_hello(**args)
+        reply = f"{result} How can I help you today?"
+    elif decision.intent == "farewell":
+        tool_name, args = "say_goodbye", {}
+        result = say_goodbye()
+        reply = result
+    elif decision.intent == "remember":
+        emotion = analyze_emotion(decision.argument)
+        tool_name = "create_memory"
+        args = {
+            "content": decision.argument,
+            "memory_type": "explicit",
+            "emotion_type": emotion["emotion_type"],
+            "emotion_score": emotion["score"]
+        }
+        result = create_memory(tool_context, **args)
+        if result.get("status") == "success":
+            reply = f"Got it, I'll remember that {decision.argument}."
+        else:
+            reply = f"I couldn't store that memory: {result.get('message')}"
+    elif decision.intent == "recall":
+        tool_name, args = "recall_memories", {"query": decision.argument}
+        result = recall_memories(tool_context, **args)
+        if result.get("status") != "success":
+            reply = f"I couldn't search my memories: {result.get('message')}"
+        elif not result["memories"]:
+            reply = f"I don't remember anything about {decision.argument} yet."
+        else:
+            lines = [f"- {memory['content']}" for memory in result["memories"]]
+            reply = f"Here's what I remember about {decision.argument}:\n" + "\n".join(lines)
+    elif decision.intent == "list_threads":
+        tool_name, args = "get_active_threads", {"limit": 5}
+        result = get_active_threads(**args)
+        if result.get("status") != "success":
+            reply = f"I couldn't load the narrative threads: {result.get('message')}"
+        elif not result["threads"]:
+            reply = "There are no active narrative threads yet."
+        else:
+            lines = [f"- {thread['title']} ({thread['theme']})" for thread in result["threads"]]
+            reply = "Active narrative threads:\n" + "\n".join(lines)
+    else:
+        raise ValueError(f"No direct handler for intent '{decision.intent}'")
+
+    # Record the turn in the session history
+    invocation_id = new_invocation_context_id()
+    with tracer.span("session.append_fast_path_turn"):
+        session_service.append_event(session, Event(
+            invocation_id=invocation_id,
+            author="user",
+            content=types.Content(role="user", parts=[types.Part(text=message)])
+        ))
+        session_service.append_event(session, Event(
+            invocation_id=invocation_id,
+            author=orchestrator_agent.name,
+            content=types.Content(role="model", parts=[types.Part(text=reply)]),
+            actions=EventActions(state_delta=dict(tool_context.state, last_orchestrator_response=reply))
+        ))
+
+    return reply, tool_name, args, result
+
+
+async def process_message(user_id: str, session_id: str, message: str, request_id: str = None):
     """
     Process a user message through the orchestrator agent.
+
+    Simple intents are answered on the fast path (see services/intent_router.py)
+    or sent straight to the sub-agent that handles them.
+
+    When tracing is enabled the request is recorded under request_id
+    (see /api/debug/trace/<request_id>).
     """
+    with tracer.start_trace(request_id or new_request_id(), "process_message",
+                            user_id=user_id, session_id=session_id):
+        return await _process_message(user_id, session_id, message)
+
+
+async def _process_message(user_id: str, session_id: str, message: str):
     # Ensure session exists
-    session = ensure_session(user_id, session_id)
+    with tracer.span("session.ensure_session"):
+        session = ensure_session(user_id, session_id)
+
+    started = time.perf_counter()
+    decision = route_message(message)
+
+    # Fast path: answer with the tool directly
+    if decision and decision.target == DIRECT:
+        try:
+            with tracer.span("router.direct", intent=decision.intent):
+                reply = run_direct_intent(decision, session, message)[0]
+        except Exception as e:
+            print(f"Error on fast path for intent '{decision.intent}', falling back: {e}")  # Log error
+            decision = None
+        else:
+            intent_router.record(decision, time.perf_counter() - started)
+            return reply
+
+    # Routed to a sub-agent: skip the orchestrator hop
+    selected_runner = sub_agent_runners.get(decision.target, runner) if decision else runner
 
     # Prepare the user's message in ADK format
     content = types.Content(role='user', parts=[types.Part(text=message)])
@@ -125,11 +375,12 @@ async def process_message(user_id: str, session_id: str, message: str):
     try:
         # Processar todos os eventos, não apenas o final
         last_event = None
-        async for event in runner.run_async(
+        async for event in selected_runner.run_async(
                 user_id=user_id,
                 session_id=session_id,
                 new_message=content
         ):
+            trace_runner_event(event)
             last_event = event
             # Verificar se este é um evento de resposta final
             if event.is_final_response():
@@ -141,6 +392,8 @@ async def process_message(user_id: str, session_id: str, message: str):
             if last_event and last_event.content and last_event.content.parts:
                 final_response_text = last_event.content.parts[0].text
 
+        intent_router.record(decision, time.perf_counter() - started)
+
     except Exception as e:
         print(f"Error during runner.run_async: {e}")  # Log error
         final_response_text = f"Error processing message: {e}"
@@ -148,6 +401,121 @@ async def process_message(user_id: str, session_id: str, message: str):
     return final_response_text
 
 
+def event_payloads(event) -> list:
+    """
+    Convert an ADK event into the JSON payloads sent over /api/chat/stream.
+
+    Payload types: partial (streamed text chunk), tool_call, tool_result,
+    delegation (transfer to a sub-agent), message (intermediate text) and
+    final (the agent's final response).
+    """
+    payloads = []
+    author = event.author
+
+    for call in event.get_function_calls():
+        if call.name == "transfer_to_agent":
+            payloads.append({"type": "delegation", "author": author, "agent": (call.args or {}).get("agent_name")})
+        else:
+            payloads.append({"type": "tool_call", "author": author, "name": call.name, "args": call.args or {}})
+
+    for function_response in event.get_function_responses():
+        if function_response.name != "transfer_to_agent":
+            payloads.append({"type": "tool_result", "author": author, "name": function_response.name,
+                             "response": function_response.response})
+
+    text = ""
+    if event.content and event.content.parts:
+        text = "".join(part.text for part in event.content.parts if part.text)
+
+    if text:
+        if event.partial:
+            payloads.append({"type": "partial", "author": author, "text": text})
+        elif event.is_final_response():
+            payloads.append({"type": "final", "author": author, "text": text})
+        else:
+            payloads.append({"type": "message", "author": author, "text": text})
+
+    return payloads
+
+
+def stream_message_events(user_id: str, session_id: str, message: str, request_id: str = None):
+    """
+    Run a message through the orchestrator and yield event payloads as they arrive.
+
+    The ADK runner is async, so it runs on its own event loop in a worker thread
+    and hands payloads to this (synchronous, WSGI-friendly) generator through a queue.
+    """
+    session = ensure_session(user_id, session_id)
+    request_id = request_id or new_request_id()
+    content = types.Content(role='user', parts=[types.Part(text=message)])
+    events = queue.Queue()
+    stop = threading.Event()
+    done = object()
+
+    async def pump():
+        with tracer.start_trace(request_id, "stream_message", user_id=user_id, session_id=session_id):
+            started = time.perf_counter()
+            decision = route_message(message)
+
+            # Fast path, falling back to the orchestrator on failure like _process_message
+            if decision and decision.target == DIRECT:
+                try:
+                    with tracer.span("router.direct", intent=decision.intent):
+                        reply, tool_name, args, result = run_direct_intent(decision, session, message)
+                except Exception as e:
+                    print(f"Error on fast path for intent '{decision.intent}', falling back: {e}")  # Log error
+                    decision = None
+                else:
+                    author = orchestrator_agent.name
+                    events.put({"type": "tool_call", "author": author, "name": tool_name, "args": args})
+                    events.put({"type": "tool_result", "author": author, "name": tool_name,
+                                "response": result if isinstance(result, dict) else {"result": result}})
+                    events.put({"type": "final", "author": author, "text": reply})
+                    intent_router.record(decision, time.perf_counter() - started)
+                    return
+
+            selected_runner = runner
+            if decision:
+                selected_runner = sub_agent_runners.get(decision.target, runner)
+                events.put({"type": "delegation", "author": "intent_router", "agent": decision.target})
+
+            async for event in selected_runner.run_async(
+                    user_id=user_id,
+                    session_id=session_id,
+                    new_message=content,
+                    run_config=RunConfig(streaming_mode=StreamingMode.SSE)
+            ):
+                trace_runner_event(event)
+                for payload in event_payloads(event):
+                    events.put(payload)
+                if stop.is_set():
+                    break
+            else:
+                intent_router.record(decision, time.perf_counter() - started)
+
+    def worker():
+        try:
+            asyncio.run(pump())
+        except Exception as e:
+            print(f"Error during streamed runner.run_async: {e}")  # Log error
+            events.put({"type": "error", "error": f"Error processing message: {e}"})
+        finally:
+            events.put(done)
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(worker,), name="chat-stream", daemon=True).start()
+
+    try:
+        while True:
+            payload = events.get()
+            if payload is done:
+                break
+            yield payload
+    finally:
+        # Client went away or the run finished; let the worker stop early
+        stop.set()
+
+
 # --- Routes ---
 @app.route('/')
 def index():
@@ -162,23 +530,74 @@ async def chat():
     user_message = data.get('message', '')
     user_id = data.get('user_id', 'default_user')
     session_id = data.get('session_id', 'default_session')
+    request_id = data.get('request_id') or new_request_id()
 
     if not user_message:
         return jsonify({'error': 'No message provided'}), 400
 
     try:
         # Process the message through the orchestrator
-        response = await process_message(user_id, session_id, user_message)
+        response = await process_message(user_id, session_id, user_message, request_id=request_id)
 
         # Return the response
         return jsonify({
             'response': response,
+            'request_id': request_id,
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle chat messages, streaming each agent event as Server-Sent Events."""
+    data = request.json or {}
+    user_message = data.get('message', '')
+    user_id = data.get('user_id', 'default_user')
+    session_id = data.get('session_id', 'default_session')
+    request_id = data.get('request_id') or new_request_id()
+
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+
+    def generate():
+        final_text = None
+        for payload in stream_message_events(user_id, session_id, user_message, request_id=request_id):
+            if payload["type"] == "final":
+                final_text = payload["text"]
+            yield f"event: {payload['type']}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+        done = {
+            'type': 'done',
+            'response': final_text or "No response generated.",
+            'request_id': request_id,
+            'timestamp': datetime.now().isoformat()
+        }
+        yield f"event: done\ndata: {json.dumps(done)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/debug/trace/<request_id>', methods=['GET'])
+def get_trace(request_id):
+    """Export a request's trace as nested JSON, or Chrome trace format with ?format=chrome."""
+    if not tracer.enabled:
+        return jsonify({'error': 'Tracing is disabled (set COGNISPHERE_TRACING=true)'}), 404
+
+    trace = tracer.get_trace(request_id)
+    if trace is None:
+        return jsonify({'error': f'No trace recorded for request {request_id}'}), 404
+
+    if request.args.get('format') == 'chrome':
+        return jsonify(trace.to_chrome_trace())
+    return jsonify(trace.to_dict())
+
+
 @app.route('/api/memories', methods=['GET'])
 def get_memories():
     """Get recent memories."""
@@ -233,11 +652,9 @@ def get_narratives():
     session_id = request.args.get('session_id', 'default_session')
 
     try:
-        # Get all threads from database
-        threads = db_service.get_all_threads()
-
-        # Filter for active threads
-        active_threads = [thread.to_dict() for thread in threads if thread.status == "active"]
+        # Get active threads from database
+        threads = db_service.get_threads(status="active")
+        active_threads = [thread.to_dict() for thread in threads]
 
         return jsonify({
             'threads': active_threads,
@@ -268,7 +685,15 @@ def get_status():
         return jsonify({
             'system_online': all(components.values()),
             'timestamp': datetime.now().isoformat(),
-            'components': components
+            'components': components,
+            'embedding_stats': embedding_service.get_stats(),
+            'session_stats': session_service.get_stats() if hasattr(session_service, 'get_stats') else None,
+            'router_stats': intent_router.get_stats(),
+            'safety_stats': safety_matcher.get_stats(),
+            'emotion_stats': emotion_classifier.get_stats() if emotion_classifier else None,
+            'ingestion_stats': ingestion_queue.get_stats() if ingestion_queue else None,
+            'query_cache_stats': db_service.query_cache.get_stats() if db_service.query_cache else None,
+            'vector_store_stats': db_service.memory_store.get_stats()
         })
     except Exception as e:
         print(f"Error in /api/status: {e}")
@@ -0,0 +1,117 @@
+"""
+# cognisphere_adk/benchmarks/bench_quantization.py
+Recall and latency of compressed memory search against exact search.
+
+Builds NumPy vector stores from the same synthetic vectors (float32, int8
+and IVF-PQ) and reports, for each re-score (and nprobe) setting, recall@k
+against the exact float top-k, query latency and the bytes of the codes
+each search reads. IVF-PQ training time is reported under "setup".
+
+Run from the cognisphere_adk directory:
+    python -m benchmarks.bench_quantization --memories 100000 --k 10 --rescore 0,2,4,8
+    python -m benchmarks.bench_quantization --memories 1000000 --nlist 1024 --nprobe 4,16,64 --skip int8
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_storage import measure, parse_sizes
+from benchmarks.synthetic import SyntheticCorpus
+from services.vector_store import NumpyVectorStore
+
+POPULATE_BATCH = 10000
+
+
+def populate(store, corpus, count):
+    for start in range(0, count, POPULATE_BATCH):
+        vectors = corpus.vectors(min(POPULATE_BATCH, count - start), start=start)
+        store.add([f"memory-{start + i}" for i in range(len(vectors))], vectors)
+
+
+def run(args, data_dir):
+    corpus = SyntheticCorpus(dim=args.dim, seed=args.seed)
+    queries = corpus.queries(args.queries)
+    skip = {name.strip() for name in args.skip.split(",") if name.strip()}
+    results, setup = {}, {}
+    index_bytes = {"float32": args.memories * args.dim * 4}
+
+    exact = NumpyVectorStore(os.path.join(data_dir, "float32"))
+    populate(exact, corpus, args.memories)
+    results[f"float32.query[k={args.k}]"] = measure(
+        lambda i: exact.query([queries[i % len(queries)]], n_results=args.k), args.queries)
+
+    if "int8" not in skip:
+        quantized = NumpyVectorStore(os.path.join(data_dir, "int8"), quantization="int8",
+                                     calibration_sample=args.calibration_sample)
+        populate(quantized, corpus, args.memories)
+        recall = quantized.evaluate_recall(queries, k=args.k, rescore_factors=args.rescore)
+        for factor in args.rescore:
+            quantized.rescore = factor
+            result = measure(lambda i: quantized.query([queries[i % len(queries)]], n_results=args.k), args.queries)
+            result["recall"] = recall[f"recall@{args.k}[rescore={factor}]"]
+            results[f"int8.query[k={args.k},rescore={factor}]"] = result
+        index_bytes["int8"] = args.memories * args.dim
+        setup["int8"] = {"calibrated_on": quantized.get_stats()["calibrated_on"]}
+
+    if "ivfpq" not in skip:
+        ivf = NumpyVectorStore(os.path.join(data_dir, "ivfpq"), index="ivfpq", nlist=args.nlist,
+                               pq_subquantizers=args.subquantizers, train_sample=args.train_sample)
+        populate(ivf, corpus, args.memories)
+        started = time.perf_counter()
+        setup["ivfpq"] = ivf.train_index()
+        setup["ivfpq"]["train_seconds"] = time.perf_counter() - started
+        recall = ivf.evaluate_recall(queries, k=args.k, rescore_factors=args.rescore, nprobes=args.nprobe)
+        for nprobe in args.nprobe:
+            for factor in args.rescore:
+                ivf.nprobe, ivf.rescore = nprobe, factor
+                result = measure(lambda i: ivf.query([queries[i % len(queries)]], n_results=args.k), args.queries)
+                result["recall"] = recall[f"recall@{args.k}[nprobe={nprobe},rescore={factor}]"]
+                results[f"ivfpq.query[k={args.k},nprobe={nprobe},rescore={factor}]"] = result
+        index_bytes["ivfpq"] = args.memories * args.subquantizers
+
+    return {
+        "suite": "quantization",
+        "parameters": vars(args),
+        "index_bytes": index_bytes,
+        "setup": setup,
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark int8 quantized memory search")
+    parser.add_argument("--memories", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200, help="Queries for recall and timing")
+    parser.add_argument("--k", type=int, default=10, help="recall@k cut-off")
+    parser.add_argument("--rescore", type=parse_sizes, default=[0, 2, 4, 8],
+                        help="Comma-separated re-score factors (0: int8 ranking only)")
+    parser.add_argument("--calibration-sample", type=int, default=20000)
+    parser.add_argument("--nlist", type=int, default=1024, help="IVF-PQ coarse centroids")
+    parser.add_argument("--nprobe", type=parse_sizes, default=[4, 16, 64], help="IVF-PQ lists visited per query")
+    parser.add_argument("--subquantizers", type=int, default=48, help="IVF-PQ bytes per code")
+    parser.add_argument("--train-sample", type=int, default=50000, help="IVF-PQ training vectors")
+    parser.add_argument("--skip", default="", help="Comma-separated stores to skip: int8,ivfpq")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="cognisphere-quant-")
+    try:
+        report = run(args, data_dir)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
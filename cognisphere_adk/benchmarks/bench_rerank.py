@@ -0,0 +1,91 @@
+"""
+# cognisphere_adk/benchmarks/bench_rerank.py
+Benchmark for the composite memory re-ranking stage.
+
+Run from the cognisphere_adk directory:
+    python -m benchmarks.bench_rerank --pool 500 --limit 5
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+from services.ranking import memory_columns, rerank
+
+# Same defaults as config.MEMORY_CONFIG (not imported to avoid needing an API key)
+DEFAULT_WEIGHTS = {
+    "emotional_decay_rate": 0.05,
+    "recency_weight": 0.4,
+    "emotional_weight": 0.3,
+    "semantic_weight": 0.3,
+    "self_reference_boost": 0.15,
+    "recency_half_life_days": 7.0
+}
+
+EMOTIONS = ["joy", "sadness", "anger", "fear", "surprise", "curiosity", "neutral"]
+
+
+def synthetic_pool(size, seed=42):
+    """Build a Chroma-shaped candidate pool (metadatas, documents, distances)."""
+    rng = random.Random(seed)
+    now = time.time()
+    metadatas, documents, distances = [], [], []
+    for i in range(size):
+        document = f"{'I' if rng.random() < 0.3 else 'The user'} mentioned topic {rng.randint(0, 999)}"
+        metadata = {
+            "id": f"memory-{i}",
+            "type": "explicit",
+            "emotion_type": rng.choice(EMOTIONS),
+            "emotion_score": rng.random(),
+            "created_at": now - rng.random() * 90 * 86400,
+            "self_reference": document.startswith("I ")
+        }
+        if rng.random() < 0.1:
+            # Legacy rows without the flat ranking fields
+            for key in ("created_at", "self_reference", "emotion_score"):
+                metadata.pop(key)
+        metadatas.append(metadata)
+        documents.append(document)
+        distances.append(rng.random() * 1.2)
+    return metadatas, documents, distances
+
+
+def run(pool_size, limit, iterations):
+    metadatas, documents, distances = synthetic_pool(pool_size)
+
+    timings_ms = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        columns = memory_columns(metadatas, documents, distances)
+        rerank(columns, limit, DEFAULT_WEIGHTS)
+        timings_ms.append((time.perf_counter() - started) * 1000.0)
+
+    timings_ms.sort()
+    return {
+        "benchmark": "rerank",
+        "pool_size": pool_size,
+        "limit": limit,
+        "iterations": iterations,
+        "mean_ms": statistics.mean(timings_ms),
+        "p50_ms": timings_ms[len(timings_ms) // 2],
+        "p99_ms": timings_ms[min(len(timings_ms) - 1, int(len(timings_ms) * 0.99))],
+        "budget_ms": 1.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark composite memory re-ranking")
+    parser.add_argument("--pool", type=int, default=500, help="Candidate pool size")
+    parser.add_argument("--limit", type=int, default=5, help="Memories returned")
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    result = run(args.pool, args.limit, args.iterations)
+    result["within_budget"] = result["p50_ms"] < result["budget_ms"]
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+# cognisphere_adk/benchmarks/bench_storage.py
+Micro-benchmarks for the storage and embedding hot paths.
+
+Measures EmbeddingService.encode / encode_batch and DatabaseService
+add_memory, add_memories, query_memories, query_memories_many, save_thread,
+get_thread, get_threads and get_all_threads at growing data sizes
+(synthetic data, see synthetic.py).
+
+Memory benchmarks run once per vector backend (--vector-backends), each in
+its own process, so the RSS and on-disk size recorded in "setup" compare
+the backends without sharing a heap.
+
+Run from the cognisphere_adk directory:
+    python -m benchmarks.bench_storage --output before.json
+    python -m benchmarks.bench_storage --memories 1000,10000,100000,1000000 --threads 100,1000,10000,50000
+    python -m benchmarks.bench_storage --vector-backends chroma,numpy --skip embedding,threads
+    python -m benchmarks.bench_storage --vector-backends numpy,sharded --shards 4 --memories 100000,1000000
+    python -m benchmarks.bench_storage --baseline before.json --threshold 0.1
+    python -m benchmarks.bench_storage --compare after.json --baseline before.json
+
+Results are JSON keyed by benchmark and scale, e.g.
+"db.query_memories[vector=chroma,memories=10000,n=5]". With --baseline, results are compared
+on --metric and the command exits with status 1 if any benchmark got slower
+by more than --threshold (a fraction).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.load_test import rss_mb
+from benchmarks.synthetic import SyntheticCorpus, EMOTIONS
+from services.database import DatabaseService
+
+POPULATE_BATCH = 5000
+
+# Items per add_memories / query_memories_many call
+BULK_SIZE = 64
+
+
+def measure(fn, iterations, budget_s=10.0, warmup=1):
+    """
+    Time fn(i) for i in range(iterations), stopping early once budget_s is spent.
+
+    Returns:
+        dict: iterations, mean/p50/p95/p99/min/max in ms and ops_per_s
+    """
+    for i in range(warmup):
+        fn(i)
+
+    timings = []
+    deadline = time.perf_counter() + budget_s
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(warmup + i)
+        timings.append(time.perf_counter() - started)
+        if time.perf_counter() > deadline:
+            break
+
+    timings_ms = np.sort(np.asarray(timings) * 1000.0)
+    return {
+        "iterations": len(timings_ms),
+        "mean_ms": float(timings_ms.mean()),
+        "p50_ms": float(np.percentile(timings_ms, 50)),
+        "p95_ms": float(np.percentile(timings_ms, 95)),
+        "p99_ms": float(np.percentile(timings_ms, 99)),
+        "min_ms": float(timings_ms[0]),
+        "max_ms": float(timings_ms[-1]),
+        "ops_per_s": float(1000.0 / timings_ms.mean()) if timings_ms.mean() > 0 else None
+    }
+
+
+def bench_embedding(args, results, setup):
+    """encode() on cache misses and hits, and encode_batch() of 32 new texts."""
+    try:
+        from services.embedding import EmbeddingService
+        service = EmbeddingService(model_name=args.embedding_model, batch_window_ms=0, cache_dir=None)
+        if not service.encode("warm up"):
+            raise RuntimeError("model returned no embedding")
+    except Exception as e:
+        print(f"Skipping embedding benchmarks: {e}", file=sys.stderr)
+        setup["embedding"] = {"skipped": str(e)}
+        return
+
+    run_id = random.Random().random()
+    results["embedding.encode[cache=miss]"] = measure(
+        lambda i: service.encode(f"benchmark sentence {run_id} {i} about my day"), args.ops
+    )
+    results["embedding.encode[cache=hit]"] = measure(
+        lambda i: service.encode("benchmark sentence about my day"), args.ops
+    )
+    results["embedding.encode_batch[size=32,cache=miss]"] = measure(
+        lambda i: service.encode_batch([f"batch {run_id} {i} sentence {j}" for j in range(32)]),
+        max(1, args.ops // 10)
+    )
+    setup["embedding"] = {"model": args.embedding_model, "stats": service.get_stats()}
+
+
+def directory_mb(path):
+    """Total size of the files under path in MiB."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / (1024.0 * 1024.0)
+
+
+def bench_memories_process(args, data_dir, vector_backend):
+    """Run bench_memories in a fresh process; returns (results, setup)."""
+    # Not a multiprocessing.Pool: its daemon workers can't start the sharded store's shard processes
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_bench_memories_child, args, data_dir, vector_backend).result()
+
+
+def _bench_memories_child(args, data_dir, vector_backend):
+    results, setup = {}, {}
+    bench_memories(args, results, setup, data_dir, vector_backend)
+    return results, setup
+
+
+def bench_memories(args, results, setup, data_dir, vector_backend="chroma"):
+    """Single and bulk adds and queries while the collection grows through args.memories."""
+    corpus = SyntheticCorpus(dim=args.dim, seed=args.seed)
+    db_path = os.path.join(data_dir, f"memories-{vector_backend}")
+    vector_options = {"shards": args.shards} if vector_backend == "sharded" else None
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    # Without the query cache, so every query reaches the vector store
+    db = DatabaseService(db_path=db_path, thread_backend="sqlite", query_cache_items=0,
+                         vector_backend=vector_backend, vector_options=vector_options)
+    setup[f"open_memories[vector={vector_backend}]"] = {
+        "seconds": time.perf_counter() - started, "rss_mb": rss_mb(), "rss_before_mb": rss_before
+    }
+    queries = corpus.queries(args.ops + 1).tolist()
+    extra = max(args.memories) + 1
+    stored = 0
+
+    for scale in sorted(args.memories):
+        started = time.perf_counter()
+        while stored < scale:
+            count = min(POPULATE_BATCH, scale - stored)
+            memories, vectors = corpus.memories(count, start=stored)
+            db.add_memories(memories, vectors.tolist())
+            stored += count
+        setup[f"populate_memories[vector={vector_backend},memories={scale}]"] = {
+            "seconds": time.perf_counter() - started, "rss_mb": rss_mb(), "disk_mb": directory_mb(db_path)
+        }
+
+        label = f"vector={vector_backend},memories={scale}"
+        results[f"db.query_memories[{label},n=5]"] = measure(
+            lambda i: db.query_memories(queries[i % len(queries)], n_results=5), args.ops
+        )
+        results[f"db.query_memories[{label},n=20,where=emotion]"] = measure(
+            lambda i: db.query_memories(queries[i % len(queries)], n_results=20,
+                                        where={"emotion_type": EMOTIONS[i % len(EMOTIONS)]}),
+            args.ops
+        )
+        bulk_queries = [[queries[(i * BULK_SIZE + j) % len(queries)] for j in range(BULK_SIZE)]
+                        for i in range(args.ops + 1)]
+        results[f"db.query_memories_many[{label},queries={BULK_SIZE},n=5]"] = measure(
+            lambda i: db.query_memories_many(bulk_queries[i], n_results=5), max(1, args.ops // 10)
+        )
+
+        new_memories, new_vectors = corpus.memories(args.ops + 1, start=extra)
+        new_vectors = new_vectors.tolist()
+        extra += args.ops + 1
+        results[f"db.add_memory[{label}]"] = measure(
+            lambda i: db.add_memory(new_memories[i], new_vectors[i]), args.ops
+        )
+        stored += results[f"db.add_memory[{label}]"]["iterations"] + 1
+
+        bulk_ops = max(1, args.ops // 10)
+        bulk_memories, bulk_vectors = corpus.memories((bulk_ops + 1) * BULK_SIZE, start=extra)
+        bulk_vectors = bulk_vectors.tolist()
+        extra += (bulk_ops + 1) * BULK_SIZE
+        results[f"db.add_memories[{label},batch={BULK_SIZE}]"] = measure(
+            lambda i: db.add_memories(bulk_memories[i * BULK_SIZE:(i + 1) * BULK_SIZE],
+                                      bulk_vectors[i * BULK_SIZE:(i + 1) * BULK_SIZE]),
+            bulk_ops
+        )
+        stored += (results[f"db.add_memories[{label},batch={BULK_SIZE}]"]["iterations"] + 1) * BULK_SIZE
+        setup[f"after_queries[{label}]"] = {"rss_mb": rss_mb(), "disk_mb": directory_mb(db_path)}
+
+    db.memory_store.close()
+    # Startup cost of an existing store (Chroma open, or NumPy snapshot load and log replay)
+    started = time.perf_counter()
+    reopened = DatabaseService(db_path=db_path, thread_backend="sqlite", query_cache_items=0,
+                               vector_backend=vector_backend, vector_options=vector_options)
+    setup[f"reopen_memories[vector={vector_backend},memories={reopened.memory_store.count()}]"] = {
+        "seconds": time.perf_counter() - started
+    }
+    reopened.memory_store.close()
+
+
+def bench_threads(args, results, setup, data_dir, backend):
+    """save_thread, get_thread, get_threads and get_all_threads while the store grows through args.threads."""
+    corpus = SyntheticCorpus(dim=args.dim, seed=args.seed)
+    db = DatabaseService(db_path=os.path.join(data_dir, f"threads-{backend}"), thread_backend=backend)
+    rng = random.Random(args.seed)
+    thread_ids = []
+
+    for scale in sorted(args.threads):
+        started = time.perf_counter()
+        for thread in corpus.threads(scale - len(thread_ids), start=len(thread_ids)):
+            db.save_thread(thread)
+            thread_ids.append(thread.id)
+        setup[f"populate_threads[backend={backend},threads={scale}]"] = {"seconds": time.perf_counter() - started}
+
+        label = f"backend={backend},threads={scale}"
+        lookups = [rng.choice(thread_ids) for _ in range(args.ops + 1)]
+        results[f"db.get_thread[{label}]"] = measure(lambda i: db.get_thread(lookups[i]), args.ops)
+        results[f"db.get_threads[{label},active,limit=5]"] = measure(
+            lambda i: db.get_threads(status="active", limit=5), args.ops
+        )
+        results[f"db.get_all_threads[{label}]"] = measure(
+            lambda i: db.get_all_threads(), max(3, args.ops // 20), budget_s=args.budget
+        )
+
+        # Updates of existing threads (new event appended in memory, whole thread saved)
+        updates = [db.get_thread(thread_id) for thread_id in lookups]
+
+        def save(i):
+            updates[i].add_event("benchmark update", impact=0.5)
+            db.save_thread(updates[i])
+
+        results[f"db.save_thread[{label}]"] = measure(save, args.ops)
+
+    close = getattr(db.thread_store, "close", None)
+    if close:
+        close()
+
+
+def environment():
+    import chromadb
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "chromadb": getattr(chromadb, "__version__", "unknown")
+    }
+
+
+def compare(current, baseline, metric="p50_ms", threshold=0.1):
+    """
+    Compare two result sets on one metric.
+
+    Returns:
+        dict: regressions, improvements (each with both values and the ratio),
+            unchanged count and benchmarks missing from either side
+    """
+    comparison = {"metric": metric, "threshold": threshold, "regressions": [], "improvements": [],
+                  "unchanged": 0, "only_in_current": [], "only_in_baseline": []}
+
+    for name in sorted(set(current) | set(baseline)):
+        if name not in baseline:
+            comparison["only_in_current"].append(name)
+            continue
+        if name not in current:
+            comparison["only_in_baseline"].append(name)
+            continue
+
+        before, after = baseline[name].get(metric), current[name].get(metric)
+        if not before or after is None:
+            continue
+        ratio = after / before
+        entry = {"benchmark": name, "baseline": before, "current": after, "ratio": ratio}
+        if ratio > 1.0 + threshold:
+            comparison["regressions"].append(entry)
+        elif ratio < 1.0 - threshold:
+            comparison["improvements"].append(entry)
+        else:
+            comparison["unchanged"] += 1
+
+    return comparison
+
+
+def print_comparison(comparison):
+    """Human-readable summary on stderr (stdout stays JSON)."""
+    print(f"Compared on {comparison['metric']} (threshold {comparison['threshold']:.0%}):", file=sys.stderr)
+    for label, entries in (("REGRESSION", comparison["regressions"]), ("improved", comparison["improvements"])):
+        for entry in entries:
+            print(f"  {label:10s} {entry['benchmark']}: {entry['baseline']:.3f} -> {entry['current']:.3f} ms "
+                  f"({entry['ratio'] - 1.0:+.1%})", file=sys.stderr)
+    print(f"  {comparison['unchanged']} unchanged", file=sys.stderr)
+
+
+def parse_sizes(value):
+    return [int(float(size)) for size in value.split(",") if size.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark storage and embedding hot paths")
+    parser.add_argument("--memories", type=parse_sizes, default=[1000, 10000],
+                        help="Comma-separated memory counts (e.g. 1000,10000,100000,1000000)")
+    parser.add_argument("--threads", type=parse_sizes, default=[100, 1000, 10000],
+                        help="Comma-separated thread counts (e.g. 100,1000,10000,50000)")
+    parser.add_argument("--thread-backends", default="sqlite,json", help="Thread stores to benchmark")
+    parser.add_argument("--vector-backends", default="chroma,numpy",
+                        help="Memory vector stores to benchmark: chroma,numpy,sharded")
+    parser.add_argument("--shards", type=int, default=4, help="Shard count of the sharded vector store")
+    parser.add_argument("--skip", default="", help="Comma-separated groups to skip: embedding,memories,threads")
+    parser.add_argument("--ops", type=int, default=200, help="Timed operations per benchmark")
+    parser.add_argument("--budget", type=float, default=10.0, help="Time budget per get_all_threads benchmark (s)")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension of the synthetic vectors")
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", help="Where to build the stores (default: temporary, removed afterwards)")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--baseline", help="Baseline JSON results to compare against")
+    parser.add_argument("--compare", help="Compare this results file with --baseline instead of running")
+    parser.add_argument("--metric", default="p50_ms", help="Metric used for the comparison")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            parser.error("--compare needs --baseline")
+        with open(args.compare) as f:
+            report = json.load(f)
+    else:
+        skip = {group.strip() for group in args.skip.split(",") if group.strip()}
+        data_dir = args.data_dir or tempfile.mkdtemp(prefix="cognisphere-bench-")
+        results, setup = {}, {}
+        started = time.time()
+        try:
+            if "embedding" not in skip:
+                bench_embedding(args, results, setup)
+            if "memories" not in skip:
+                for backend in (b.strip() for b in args.vector_backends.split(",") if b.strip()):
+                    backend_results, backend_setup = bench_memories_process(args, data_dir, backend)
+                    results.update(backend_results)
+                    setup.update(backend_setup)
+            if "threads" not in skip:
+                for backend in (b.strip() for b in args.thread_backends.split(",") if b.strip()):
+                    bench_threads(args, results, setup, data_dir, backend)
+        finally:
+            if not args.data_dir:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+        report = {
+            "suite": "storage",
+            "started_at": started,
+            "duration_s": time.time() - started,
+            "environment": environment(),
+            "parameters": {
+                "memories": args.memories, "threads": args.threads, "thread_backends": args.thread_backends,
+                "vector_backends": args.vector_backends, "shards": args.shards,
+                "ops": args.ops, "dim": args.dim, "seed": args.seed
+            },
+            "setup": setup,
+            "results": results
+        }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(report["results"], baseline["results"], args.metric, args.threshold)
+        print_comparison(report["comparison"])
+        exit_code = 1 if report["comparison"]["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
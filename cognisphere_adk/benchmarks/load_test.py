@@ -0,0 +1,339 @@
+"""
+# cognisphere_adk/benchmarks/load_test.py
+Concurrent load test for the chat and read endpoints.
+
+Each virtual user runs M sessions; every turn posts a chat message and then
+polls /api/memories and /api/narratives, like index.html does after each
+message. Reports throughput, p50/p95/p99 latency and error rate per endpoint,
+and the server's RSS over time.
+
+Run from the cognisphere_adk directory:
+    python -m benchmarks.load_test --users 20 --sessions 3 --turns 5
+    python -m benchmarks.load_test --url http://localhost:5000 --pid <server pid>
+
+Without --url the app is started in this process on a local port with the
+mock LLM backend (COGNISPHERE_LLM_BACKEND=mock) and a throwaway data
+directory, so no network access or API key is needed.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+# Messages mixing the intents the app handles: chit-chat, memory and narrative requests
+MESSAGES = [
+    "Hello there!",
+    "I had a long day at work today and I'm tired.",
+    "Please remember that my sister {name} lives in {city}.",
+    "Remember that I started learning {hobby} last month.",
+    "What do you remember about {name}?",
+    "What do you remember about my {hobby} lessons?",
+    "Tell me a story about my trip to {city}.",
+    "Show my narrative threads.",
+    "I'm excited about the concert in {city} this weekend!",
+    "I feel a bit anxious about tomorrow's meeting.",
+    "Goodbye!"
+]
+NAMES = ["Maria", "Ana", "Joao", "Alice", "Bruno", "Clara"]
+CITIES = ["Lisbon", "Porto", "Recife", "Berlin", "Tokyo", "Toronto"]
+HOBBIES = ["piano", "hiking", "painting", "surfing", "chess"]
+
+
+def rss_mb(pid=None):
+    """Resident set size of a process in MiB (Linux /proc; peak RSS of this process elsewhere)."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return None
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Collects request results from all virtual users."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.results = []
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, latency, ok, error=None):
+        with self._lock:
+            self.results.append((time.perf_counter() - self.started, endpoint, latency, ok, error))
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.results)
+
+
+def request_json(base_url, path, payload=None, timeout=120.0):
+    """Send a GET (or a POST with a JSON body) and return (status, decoded JSON or None)."""
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method="POST" if data else "GET",
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            status, body = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, body = e.code, e.read()
+    try:
+        return status, json.loads(body)
+    except ValueError:
+        return status, None
+
+
+def request_stream(base_url, payload, timeout=120.0):
+    """POST to /api/chat/stream and read it to the end; returns (status, first event latency, final payload)."""
+    started = time.perf_counter()
+    req = urllib.request.Request(base_url + "/api/chat/stream", data=json.dumps(payload).encode("utf-8"),
+                                 method="POST", headers={"Content-Type": "application/json"})
+    first_event, last = None, None
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            for raw_line in response:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                if first_event is None:
+                    first_event = time.perf_counter() - started
+                last = json.loads(line[5:])
+            return response.status, first_event, last
+    except urllib.error.HTTPError as e:
+        return e.code, first_event, None
+
+
+def chat_error(status, body):
+    """Describe a failed chat response (the app reports runner errors with status 200)."""
+    if status >= 400:
+        return f"HTTP {status}"
+    if not isinstance(body, dict):
+        return "invalid response"
+    if body.get("type") == "error" or body.get("error"):
+        return str(body.get("error"))[:200]
+    if str(body.get("response", "")).startswith("Error processing message"):
+        return body["response"][:200]
+    return None
+
+
+def virtual_user(user_index, args, base_url, recorder, start_delay):
+    rng = random.Random(args.seed * 1000003 + user_index)
+    time.sleep(start_delay)
+    user_id = f"load-user-{user_index}"
+
+    for session_index in range(args.sessions):
+        session_id = f"load-{args.run_id}-{user_index}-{session_index}"
+        query = "?" + urllib.parse.urlencode({"user_id": user_id, "session_id": session_id})
+
+        for _ in range(args.turns):
+            message = rng.choice(MESSAGES).format(
+                name=rng.choice(NAMES), city=rng.choice(CITIES), hobby=rng.choice(HOBBIES)
+            )
+            payload = {"message": message, "user_id": user_id, "session_id": session_id}
+
+            started = time.perf_counter()
+            try:
+                if args.stream:
+                    status, first_event, body = request_stream(base_url, payload, timeout=args.timeout)
+                    if first_event is not None:
+                        recorder.add("/api/chat/stream:first_event", first_event, True)
+                    endpoint = "/api/chat/stream"
+                else:
+                    status, body = request_json(base_url, "/api/chat", payload, timeout=args.timeout)
+                    endpoint = "/api/chat"
+                error = chat_error(status, body)
+            except Exception as e:
+                endpoint = "/api/chat/stream" if args.stream else "/api/chat"
+                error = f"{type(e).__name__}: {e}"
+            recorder.add(endpoint, time.perf_counter() - started, error is None, error)
+
+            for path in ("/api/memories", "/api/narratives"):
+                started = time.perf_counter()
+                try:
+                    status, body = request_json(base_url, path + query, timeout=args.timeout)
+                    error = None if status < 400 and isinstance(body, dict) and "error" not in body else \
+                        f"HTTP {status}"
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                recorder.add(path, time.perf_counter() - started, error is None, error)
+
+            if args.think_ms:
+                time.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000.0)
+
+
+def start_local_server(args):
+    """Import the app with the mock LLM backend and serve it on a free local port."""
+    os.environ.setdefault("COGNISPHERE_LLM_BACKEND", "mock")
+    os.environ.setdefault("COGNISPHERE_DB_PATH", args.data_dir or tempfile.mkdtemp(prefix="cognisphere-load-"))
+    os.environ.setdefault("COGNISPHERE_MOCK_LLM_MEAN_MS", str(args.llm_mean_ms))
+    os.environ.setdefault("COGNISPHERE_MOCK_LLM_STDDEV_MS", str(args.llm_stddev_ms))
+    os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+    from werkzeug.serving import make_server
+    import app as cognisphere_app
+
+    if not args.verbose:
+        # The app logs every LiteLLM call; keep the report readable
+        logging.disable(logging.WARNING)
+
+    server = make_server("127.0.0.1", 0, cognisphere_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def summarize(results, duration, rss_samples, args):
+    by_endpoint = defaultdict(list)
+    for _, endpoint, latency, ok, error in results:
+        by_endpoint[endpoint].append((latency, ok, error))
+
+    endpoints = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        latencies_ms = sorted(latency * 1000.0 for latency, _, _ in rows)
+        errors = [error for _, ok, error in rows if not ok]
+        endpoints[endpoint] = {
+            "requests": len(rows),
+            "throughput_rps": len(rows) / duration if duration else 0.0,
+            "errors": len(errors),
+            "error_rate": len(errors) / len(rows),
+            "sample_errors": sorted(set(errors))[:3],
+            "mean_ms": statistics.mean(latencies_ms),
+            "p50_ms": percentile(latencies_ms, 50),
+            "p95_ms": percentile(latencies_ms, 95),
+            "p99_ms": percentile(latencies_ms, 99),
+            "max_ms": latencies_ms[-1]
+        }
+
+    total = sum(1 for row in results if not row[1].endswith(":first_event"))
+    failed = sum(1 for row in results if not row[3])
+    rss_values = [rss for _, rss in rss_samples if rss is not None]
+    return {
+        "benchmark": "load_test",
+        "target": args.url or "in-process (mock LLM)",
+        "users": args.users,
+        "sessions_per_user": args.sessions,
+        "turns_per_session": args.turns,
+        "stream": args.stream,
+        "duration_s": duration,
+        "requests": total,
+        "throughput_rps": total / duration if duration else 0.0,
+        "error_rate": failed / total if total else 0.0,
+        "endpoints": endpoints,
+        "rss_mb": {
+            "start": rss_values[0] if rss_values else None,
+            "peak": max(rss_values) if rss_values else None,
+            "end": rss_values[-1] if rss_values else None,
+            "samples": [{"t_s": round(t, 2), "rss_mb": rss} for t, rss in rss_samples]
+        }
+    }
+
+
+def run(args):
+    server = None
+    base_url = args.url.rstrip("/") if args.url else None
+    if base_url is None:
+        server, base_url = start_local_server(args)
+        rss_pid = None
+    else:
+        rss_pid = args.pid
+
+    recorder = Recorder()
+    rss_samples = []
+    done = threading.Event()
+
+    def sample_rss():
+        while True:
+            rss_samples.append((time.perf_counter() - recorder.started, rss_mb(rss_pid)))
+            if done.wait(args.sample_interval):
+                rss_samples.append((time.perf_counter() - recorder.started, rss_mb(rss_pid)))
+                return
+
+    sampler = threading.Thread(target=sample_rss, name="rss-sampler", daemon=True)
+    sampler.start()
+
+    users = [
+        threading.Thread(
+            target=virtual_user, name=f"virtual-user-{i}",
+            args=(i, args, base_url, recorder, args.ramp_up * i / max(1, args.users)), daemon=True
+        )
+        for i in range(args.users)
+    ]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+
+    duration = time.perf_counter() - recorder.started
+    done.set()
+    sampler.join()
+    if server is not None:
+        server.shutdown()
+
+    return summarize(recorder.snapshot(), duration, rss_samples, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Cognisphere chat and read endpoints")
+    parser.add_argument("--url", help="Base URL of a running server (default: start the app in-process)")
+    parser.add_argument("--pid", type=int, help="PID of the server for RSS sampling (with --url)")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--sessions", type=int, default=2, help="Sessions per user")
+    parser.add_argument("--turns", type=int, default=5, help="Chat turns per session")
+    parser.add_argument("--stream", action="store_true", help="Chat through /api/chat/stream")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between turns")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which users start")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between RSS samples")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--run-id", default=None, help="Prefix for session IDs (default: timestamp)")
+    parser.add_argument("--data-dir", help="Data directory for the in-process app (default: temporary)")
+    parser.add_argument("--llm-mean-ms", type=float, default=400.0, help="Mock LLM mean latency (in-process)")
+    parser.add_argument("--llm-stddev-ms", type=float, default=150.0, help="Mock LLM latency stddev (in-process)")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's logging")
+    args = parser.parse_args()
+    args.run_id = args.run_id or str(int(time.time()))
+
+    real_stdout = sys.stdout
+    if not args.url and not args.verbose:
+        # The in-process app prints a line for every request
+        sys.stdout = open(os.devnull, "w")
+    try:
+        report = run(args)
+    finally:
+        if sys.stdout is not real_stdout:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
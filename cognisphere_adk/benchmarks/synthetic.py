@@ -0,0 +1,102 @@
+"""
+# cognisphere_adk/benchmarks/synthetic.py
+Synthetic data for the storage benchmarks.
+
+Memories get clustered unit vectors (topics), so nearest-neighbour search
+behaves more like real sentence embeddings than uniform noise would, plus
+realistic metadata (types, emotions, timestamps spread over 90 days).
+Everything is derived from a seed, so runs are reproducible.
+"""
+
+import datetime
+import random
+
+import numpy as np
+
+from data_models.memory import Memory
+from data_models.narrative import NarrativeThread
+
+MEMORY_TYPES = ["explicit", "emotional", "flashbulb", "procedural", "liminal"]
+EMOTIONS = ["joy", "sadness", "anger", "fear", "surprise", "curiosity", "neutral"]
+THEMES = ["work", "family", "travel", "health", "learning", "friendship", "general"]
+SUBJECTS = ["my sister", "the project", "a trip to Lisbon", "my piano lessons", "the new job",
+            "an old friend", "the marathon", "my grandmother", "the garden", "a rainy weekend"]
+VERBS = ["talked about", "remembered", "worried about", "celebrated", "planned", "wrote about"]
+
+
+class SyntheticCorpus:
+    """Reproducible generator of memories, query vectors and narrative threads."""
+
+    def __init__(self, dim=384, topics=256, noise=0.35, seed=42):
+        """
+        Args:
+            dim: Embedding dimension (384 matches all-MiniLM-L6-v2)
+            topics: Number of cluster centres vectors are drawn around
+            noise: Spread of vectors around their topic centre
+            seed: Seed for every generated value
+        """
+        self.dim = dim
+        self.noise = noise
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        centres = rng.standard_normal((topics, dim)).astype(np.float32)
+        self.centres = centres / np.linalg.norm(centres, axis=1, keepdims=True)
+
+    def vectors(self, count, start=0, stream=0):
+        """Unit vectors around random topic centres; each (stream, start) block is reproducible on its own."""
+        rng = np.random.default_rng((self.seed, stream, start, count))
+        topics = rng.integers(0, len(self.centres), size=count)
+        vectors = self.centres[topics] + self.noise * rng.standard_normal((count, self.dim)).astype(np.float32) \
+            / np.sqrt(self.dim)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def queries(self, count, salt=1):
+        """Query vectors drawn from the same topic distribution as the memories."""
+        return self.vectors(count, stream=salt)
+
+    def memories(self, count, start=0):
+        """
+        Build `count` memories with their embeddings.
+
+        Returns:
+            tuple: (list of Memory, float32 array of shape (count, dim))
+        """
+        rng = random.Random(self.seed * 7919 + start)
+        now = datetime.datetime.utcnow()
+        memories = []
+        for i in range(start, start + count):
+            emotion_type = rng.choice(EMOTIONS)
+            score = round(rng.random(), 3)
+            prefix = "I" if rng.random() < 0.3 else "The user"
+            memory = Memory(
+                content=f"{prefix} {rng.choice(VERBS)} {rng.choice(SUBJECTS)} (#{i})",
+                memory_type=rng.choice(MEMORY_TYPES),
+                emotion_data={
+                    "emotion_type": emotion_type,
+                    "score": score,
+                    "valence": round(rng.random(), 3),
+                    "arousal": round(rng.random(), 3)
+                },
+                source=rng.choice(["user", "system", "reflection"])
+            )
+            memory.creation_time = (now - datetime.timedelta(seconds=rng.random() * 90 * 86400)).isoformat()
+            memories.append(memory)
+        return memories, self.vectors(count, start=start)
+
+    def threads(self, count, events_per_thread=8, start=0):
+        """Build `count` narrative threads with a few events each."""
+        rng = random.Random(self.seed * 104729 + start)
+        threads = []
+        for i in range(start, start + count):
+            thread = NarrativeThread(
+                title=f"Thread {i}: {rng.choice(SUBJECTS)}",
+                theme=rng.choice(THEMES),
+                description=f"Synthetic thread {i}"
+            )
+            thread.status = rng.choices(["active", "dormant", "resolved"], weights=[6, 3, 1])[0]
+            thread.importance = round(rng.random(), 3)
+            for _ in range(rng.randint(0, 2 * events_per_thread)):
+                thread.add_event(f"{rng.choice(VERBS)} {rng.choice(SUBJECTS)}", emotion=rng.choice(EMOTIONS),
+                                 impact=round(rng.random(), 3))
+            threads.append(thread)
+        return threads
@@ -7,8 +7,20 @@ from google.adk.tools.base_tool import BaseTool
 from google.adk.tools.tool_context import ToolContext
 from google.genai import types
 from typing import Optional, Dict, Any
+import config
+from services.safety_matcher import SafetyMatcher
+from services.tracing import traced
 
+# Built once from SAFETY_CONFIG; verdicts are cached per message, so every
+# model call of a turn (and each sub-agent hop) reuses the same scan
+safety_matcher = SafetyMatcher(
+    blocked_keywords=config.SAFETY_CONFIG["blocked_keywords"],
+    sensitive_topics=config.SAFETY_CONFIG["sensitive_topics"],
+    detect_pii=config.SAFETY_CONFIG.get("detect_pii", True)
+)
 
+
+@traced("safety.content_filter_callback")
 def content_filter_callback(
         callback_context: CallbackContext, llm_request: LlmRequest
 ) -> Optional[LlmResponse]:
@@ -25,38 +37,39 @@ def content_filter_callback(
     agent_name = callback_context.agent_name
     print(f"--- Safety: Content filter running for {agent_name} ---")
 
-    # Get the last user message
+    # The user message that started this invocation (fall back to the last user turn in the request)
     last_user_message_text = ""
-    if llm_request.contents:
+    user_content = callback_context.user_content
+    if user_content and user_content.parts and user_content.parts[0].text:
+        last_user_message_text = user_content.parts[0].text
+    elif llm_request.contents:
         for content in reversed(llm_request.contents):
             if content.role == 'user' and content.parts:
                 if content.parts[0].text:
                     last_user_message_text = content.parts[0].text
                     break
 
-    # Define blocked keywords
-    blocked_keywords = ["extremely harmful", "illegal weapons", "explicit content"]
+    # One pass over the text for all blocked keywords (cached per message)
+    keyword = safety_matcher.scan(last_user_message_text).blocked_keyword
+    if keyword:
+        print(f"--- Safety: Blocked keyword '{keyword}' detected ---")
 
-    # Check for blocked keywords
-    for keyword in blocked_keywords:
-        if keyword.lower() in last_user_message_text.lower():
-            print(f"--- Safety: Blocked keyword '{keyword}' detected ---")
+        # Record in state
+        callback_context.state["safety_filter_triggered"] = True
 
-            # Record in state
-            callback_context.state["safety_filter_triggered"] = True
-
-            # Return a blocking response
-            return LlmResponse(
-                content=types.Content(
-                    role="model",
-                    parts=[types.Part(text="I cannot process this request due to safety concerns.")],
-                )
+        # Return a blocking response
+        return LlmResponse(
+            content=types.Content(
+                role="model",
+                parts=[types.Part(text="I cannot process this request due to safety concerns.")],
             )
+        )
 
     print(f"--- Safety: No safety issues detected for {agent_name} ---")
     return None  # Allow the request to proceed
 
 
+@traced("safety.tool_argument_validator")
 def tool_argument_validator(
         tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext
 ) -> Optional[Dict]:
@@ -79,21 +92,20 @@ def tool_argument_validator(
     if tool_name == "create_memory":
         content = args.get("content", "")
 
-        # Sensitive topics that shouldn't be stored in memory
-        sensitive_topics = [""]
+        # Sensitive topics (SAFETY_CONFIG) and PII such as card numbers shouldn't be stored in memory
+        verdict = safety_matcher.scan(content)
+        reason = verdict.sensitive_topic or (verdict.pii[0] if verdict.pii else None)
+        if reason:
+            print(f"--- Safety: Sensitive information '{reason}' detected in create_memory ---")
 
-        for topic in sensitive_topics:
-            if topic.lower() in content.lower():
-                print(f"--- Safety: Sensitive topic '{topic}' detected in create_memory ---")
-
-                # Record in state
-                tool_context.state["tool_safety_triggered"] = True
+            # Record in state
+            tool_context.state["tool_safety_triggered"] = True
 
-                # Return a blocking result
-                return {
-                    "status": "error",
-                    "message": f"Cannot store memory containing sensitive information ('{topic}')."
-                }
+            # Return a blocking result
+            return {
+                "status": "error",
+                "message": f"Cannot store memory containing sensitive information ('{reason}')."
+            }
 
     print(f"--- Safety: Tool arguments validated for {tool_name} ---")
     return None  # Allow the tool execution to proceed
\ No newline at end of file
@@ -11,6 +11,28 @@ from services.openrouter_config import openrouter_config
 # Database configuration
 DATABASE_CONFIG: Dict[str, Any] = {
     "path": os.environ.get("COGNISPHERE_DB_PATH", "./cognisphere_data"),
+    "thread_backend": os.environ.get("COGNISPHERE_THREAD_BACKEND", "sqlite"),  # sqlite or json
+    "lexical_index": os.environ.get("COGNISPHERE_LEXICAL_INDEX", "true").lower() == "true",  # BM25 index
+    "query_cache_items": int(os.environ.get("COGNISPHERE_QUERY_CACHE_ITEMS", 1024)),  # 0 disables it
+    "query_cache_ttl_s": float(os.environ.get("COGNISPHERE_QUERY_CACHE_TTL_S", 300)),
+    # Memories vector store: "chroma", "numpy" (memory-mapped matrix, see services/vector_store.py)
+    # or "sharded" (numpy shards searched in parallel worker processes, see services/sharded_store.py)
+    "vector_backend": os.environ.get("COGNISPHERE_VECTOR_BACKEND", "chroma").lower(),
+    "vector_options": {  # NumPy and sharded backends only
+        # "int8" scans per-dimension int8 codes (~4x less index memory) instead of float32 vectors
+        "quantization": os.environ.get("COGNISPHERE_VECTOR_QUANTIZATION", "none").lower(),
+        # int8/IVF-PQ: re-score k * rescore candidates with their float vectors (0 disables)
+        "rescore": int(os.environ.get("COGNISPHERE_VECTOR_RESCORE", 4)),
+        # "ivfpq" searches nprobe inverted lists of PQ codes once trained (python vector_admin.py retrain)
+        "index": os.environ.get("COGNISPHERE_VECTOR_INDEX", "flat").lower(),
+        "nprobe": int(os.environ.get("COGNISPHERE_VECTOR_NPROBE", 16)),
+        # > 0: flat searches scan PCA-reduced vectors once fitted (python vector_admin.py fit-pca)
+        "pca_dims": int(os.environ.get("COGNISPHERE_VECTOR_PCA_DIMS", 0)),
+        # Sharded: changing the shard count rebalances existing memories in the background
+        "shards": int(os.environ.get("COGNISPHERE_VECTOR_SHARDS", 4)),
+        # Sharded: "hash" (memory ID) or a metadata field (e.g. a user ID) that picks the shard
+        "shard_by": os.environ.get("COGNISPHERE_VECTOR_SHARD_BY", "hash")
+    },
     "collections": {
         "memories": "cognisphere_memories",
         "threads": "cognisphere_narrative_threads",
@@ -19,22 +41,78 @@ DATABASE_CONFIG: Dict[str, Any] = {
     }
 }
 
-# Model Configuration (dynamically sourced from OpenRouter)
-MODEL_CONFIG: Dict[str, str] = {
-    "orchestrator": openrouter_config.get_model_config("orchestrator"),
-    "memory": openrouter_config.get_model_config("memory"),
-    "narrative": openrouter_config.get_model_config("narrative"),
-    "embedding": openrouter_config.get_model_config("embedding"),
-    "greeting": openrouter_config.get_model_config("orchestrator")  # Use orchestrator model as default
+# Session Configuration ("sqlite" persists sessions; "memory" uses ADK's InMemorySessionService)
+SESSION_CONFIG: Dict[str, Any] = {
+    "backend": os.environ.get("COGNISPHERE_SESSION_BACKEND", "sqlite"),
+    "path": os.environ.get(
+        "COGNISPHERE_SESSION_DB",
+        os.path.join(DATABASE_CONFIG["path"], "sessions.sqlite3")
+    ),
+    "max_cached_sessions": int(os.environ.get("COGNISPHERE_SESSION_CACHE_SIZE", 1000)),
+    "max_cached_bytes": int(os.environ.get("COGNISPHERE_SESSION_CACHE_BYTES", 64 * 1024 * 1024))
+}
+
+# LLM backend: "openrouter" (default) or "mock" (offline, scripted; see services/mock_llm.py)
+LLM_BACKEND: str = os.environ.get("COGNISPHERE_LLM_BACKEND", "openrouter").lower()
+
+# Mock LLM Configuration (used when LLM_BACKEND is "mock")
+MOCK_LLM_CONFIG: Dict[str, Any] = {
+    "script_path": os.environ.get("COGNISPHERE_MOCK_LLM_SCRIPT", ""),
+    "seed": int(os.environ.get("COGNISPHERE_MOCK_LLM_SEED", 0)),
+    "latency": {
+        "distribution": os.environ.get("COGNISPHERE_MOCK_LLM_LATENCY", "lognormal"),
+        "mean_ms": float(os.environ.get("COGNISPHERE_MOCK_LLM_MEAN_MS", 400.0)),
+        "stddev_ms": float(os.environ.get("COGNISPHERE_MOCK_LLM_STDDEV_MS", 150.0)),
+        "min_ms": float(os.environ.get("COGNISPHERE_MOCK_LLM_MIN_MS", 0.0)),
+        "max_ms": float(os.environ["COGNISPHERE_MOCK_LLM_MAX_MS"]) if os.environ.get("COGNISPHERE_MOCK_LLM_MAX_MS") else None,
+        "token_ms": float(os.environ.get("COGNISPHERE_MOCK_LLM_TOKEN_MS", 15.0))
+    }
+}
+
+# Model Configuration (dynamically sourced from OpenRouter, or the mock provider)
+if LLM_BACKEND == "mock":
+    MODEL_CONFIG: Dict[str, str] = {
+        "orchestrator": "mock/orchestrator",
+        "memory": "mock/memory",
+        "narrative": "mock/narrative",
+        "embedding": "mock/embedding",
+        "greeting": "mock/orchestrator"
+    }
+else:
+    MODEL_CONFIG: Dict[str, str] = {
+        "orchestrator": openrouter_config.get_model_config("orchestrator"),
+        "memory": openrouter_config.get_model_config("memory"),
+        "narrative": openrouter_config.get_model_config("narrative"),
+        "embedding": openrouter_config.get_model_config("embedding"),
+        "greeting": openrouter_config.get_model_config("orchestrator")  # Use orchestrator model as default
+    }
+
+# Embedding Configuration (local SentenceTransformer)
+EMBEDDING_CONFIG: Dict[str, Any] = {
+    "model_name": os.environ.get("COGNISPHERE_EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+    "batch_window_ms": float(os.environ.get("COGNISPHERE_EMBEDDING_BATCH_WINDOW_MS", 5.0)),
+    "max_batch_size": int(os.environ.get("COGNISPHERE_EMBEDDING_MAX_BATCH_SIZE", 32)),
+    "cache_dir": os.environ.get(
+        "COGNISPHERE_EMBEDDING_CACHE_DIR",
+        os.path.join(DATABASE_CONFIG["path"], "embedding_cache")
+    ),
+    "cache_memory_items": int(os.environ.get("COGNISPHERE_EMBEDDING_CACHE_MEMORY_ITEMS", 10000)),
+    "cache_disk_items": int(os.environ.get("COGNISPHERE_EMBEDDING_CACHE_DISK_ITEMS", 1000000))
 }
 
 # Memory System Configuration
-MEMORY_CONFIG: Dict[str, float] = {
+MEMORY_CONFIG: Dict[str, Any] = {
     "emotional_decay_rate": float(os.environ.get("COGNISPHERE_EMOTIONAL_DECAY_RATE", 0.05)),
     "recency_weight": float(os.environ.get("COGNISPHERE_RECENCY_WEIGHT", 0.4)),
     "emotional_weight": float(os.environ.get("COGNISPHERE_EMOTIONAL_WEIGHT", 0.3)),
     "semantic_weight": float(os.environ.get("COGNISPHERE_SEMANTIC_WEIGHT", 0.3)),
-    "self_reference_boost": float(os.environ.get("COGNISPHERE_SELF_REFERENCE_BOOST", 0.15))
+    "self_reference_boost": float(os.environ.get("COGNISPHERE_SELF_REFERENCE_BOOST", 0.15)),
+    "recency_half_life_days": float(os.environ.get("COGNISPHERE_RECENCY_HALF_LIFE_DAYS", 7.0)),
+    "rerank_pool_factor": float(os.environ.get("COGNISPHERE_RERANK_POOL_FACTOR", 4.0)),
+    "rerank_max_pool": float(os.environ.get("COGNISPHERE_RERANK_MAX_POOL", 500)),
+    # "vector" or "hybrid" (vector + BM25 rankings fused with reciprocal rank fusion)
+    "recall_mode": os.environ.get("COGNISPHERE_RECALL_MODE", "hybrid").lower(),
+    "rrf_k": float(os.environ.get("COGNISPHERE_RRF_K", 60))
 }
 
 # Narrative System Configuration
@@ -61,7 +139,49 @@ SAFETY_CONFIG: Dict[str, Any] = {
             "COGNISPHERE_SENSITIVE_TOPICS",
             "password,credit card,social security,private key"
         ).split(",")
-    ]
+    ],
+    # Card numbers (Luhn-checked) and social security numbers are never stored in memory
+    "detect_pii": os.environ.get("COGNISPHERE_DETECT_PII", "true").lower() == "true"
+}
+
+# Tracing Configuration (per-request spans, see /api/debug/trace/<request_id>)
+TRACING_CONFIG: Dict[str, Any] = {
+    "enabled": os.environ.get("COGNISPHERE_TRACING", "false").lower() == "true",
+    "max_traces": int(os.environ.get("COGNISPHERE_TRACING_MAX_TRACES", 200))
+}
+
+# Intent Router Configuration (fast path in front of the orchestrator)
+ROUTER_CONFIG: Dict[str, Any] = {
+    "enabled": os.environ.get("COGNISPHERE_ROUTER", "true").lower() == "true",
+    "similarity_threshold": float(os.environ.get("COGNISPHERE_ROUTER_SIMILARITY_THRESHOLD", 0.8)),
+    "max_embedding_words": int(os.environ.get("COGNISPHERE_ROUTER_MAX_EMBEDDING_WORDS", 8))
+}
+
+# Emotion Analysis Configuration
+# classifier: "lexicon" (keyword lexicon) or "embedding" (prototype vectors, sharing
+# the sentence embedding with memory creation)
+EMOTION_CONFIG: Dict[str, Any] = {
+    "classifier": os.environ.get("COGNISPHERE_EMOTION_CLASSIFIER", "lexicon").lower(),
+    "temperature": float(os.environ.get("COGNISPHERE_EMOTION_TEMPERATURE", 0.05)),
+    "min_similarity": float(os.environ.get("COGNISPHERE_EMOTION_MIN_SIMILARITY", 0.2)),
+    "min_score": float(os.environ.get("COGNISPHERE_EMOTION_MIN_SCORE", 0.15)),
+    "turn_cache_items": int(os.environ.get("COGNISPHERE_EMOTION_TURN_CACHE_ITEMS", 256))
+}
+
+# Memory Ingestion Configuration (write-behind queue behind create_memory)
+# backpressure: "block" (wait, then write synchronously), "sync" or "reject" when the queue is full
+INGESTION_CONFIG: Dict[str, Any] = {
+    "enabled": os.environ.get("COGNISPHERE_INGESTION_ASYNC", "true").lower() == "true",
+    "max_pending": int(os.environ.get("COGNISPHERE_INGESTION_MAX_PENDING", 1000)),
+    "batch_size": int(os.environ.get("COGNISPHERE_INGESTION_BATCH_SIZE", 32)),
+    "flush_interval_ms": float(os.environ.get("COGNISPHERE_INGESTION_FLUSH_INTERVAL_MS", 50.0)),
+    "backpressure": os.environ.get("COGNISPHERE_INGESTION_BACKPRESSURE", "block").lower(),
+    "block_timeout_s": float(os.environ.get("COGNISPHERE_INGESTION_BLOCK_TIMEOUT_S", 2.0)),
+    "journal_path": os.environ.get(
+        "COGNISPHERE_INGESTION_JOURNAL",
+        os.path.join(DATABASE_CONFIG["path"], "ingestion_journal.jsonl")
+    ),
+    "fsync": os.environ.get("COGNISPHERE_INGESTION_FSYNC", "false").lower() == "true"
 }
 
 # Logging Configuration
@@ -87,10 +207,17 @@ def get_config(config_type: Optional[str] = None) -> Dict[str, Any]:
     """
     config_map = {
         "database": DATABASE_CONFIG,
+        "sessions": SESSION_CONFIG,
         "models": MODEL_CONFIG,
+        "embedding": EMBEDDING_CONFIG,
         "memory": MEMORY_CONFIG,
         "narrative": NARRATIVE_CONFIG,
         "safety": SAFETY_CONFIG,
+        "tracing": TRACING_CONFIG,
+        "router": ROUTER_CONFIG,
+        "emotion": EMOTION_CONFIG,
+        "ingestion": INGESTION_CONFIG,
+        "mock_llm": MOCK_LLM_CONFIG,
         "logging": LOGGING_CONFIG
     }
 
@@ -99,10 +226,17 @@ def get_config(config_type: Optional[str] = None) -> Dict[str, Any]:
 
     return {
         "database": DATABASE_CONFIG,
+        "sessions": SESSION_CONFIG,
         "models": MODEL_CONFIG,
+        "embedding": EMBEDDING_CONFIG,
         "memory": MEMORY_CONFIG,
         "narrative": NARRATIVE_CONFIG,
         "safety": SAFETY_CONFIG,
+        "tracing": TRACING_CONFIG,
+        "router": ROUTER_CONFIG,
+        "emotion": EMOTION_CONFIG,
+        "ingestion": INGESTION_CONFIG,
+        "mock_llm": MOCK_LLM_CONFIG,
         "logging": LOGGING_CONFIG
     }
 
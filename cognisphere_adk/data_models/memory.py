@@ -9,7 +9,7 @@ class Memory:
         self.id = str(uuid.uuid4())
         self.content = content
         self.type = memory_type  # explicit, emotional, flashbulb, etc.
-        self.creation_time = datetime.time().isoformat()
+        self.creation_time = datetime.datetime.utcnow().isoformat()
         self.emotion_data = emotion_data or {
             'emotion_type': 'neutral',
             'score': 0.5,
@@ -10,21 +10,26 @@ class NarrativeThread:
         self.title = title
         self.theme = theme
         self.description = description
-        self.creation_time = datetime.utcnow().isoformat()
+        self.creation_time = datetime.datetime.utcnow().isoformat()
         self.last_updated = self.creation_time
         self.events = []
         self.status = "active"  # active, resolved, dormant
         self.importance = 0.5
 
-    def add_event(self, content, emotion="neutral", impact=0.5):
-        """Add an event to this thread."""
-        event = {
+    @staticmethod
+    def create_event(content, emotion="neutral", impact=0.5):
+        """Build an event dict without attaching it to a thread."""
+        return {
             "id": str(uuid.uuid4()),
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.datetime.utcnow().isoformat(),
             "content": content,
             "emotion": emotion,
             "impact": impact
         }
+
+    def add_event(self, content, emotion="neutral", impact=0.5):
+        """Add an event to this thread."""
+        event = self.create_event(content, emotion, impact)
         self.events.append(event)
         self.last_updated = event["timestamp"]
         return event["id"]
@@ -1,13 +1,26 @@
 #cognisphere/services/database.py
-import chromadb
 import json
 import os
+import threading
+import time
 
-from data_models.narrative import NarrativeThread
+import numpy as np
+
+from services.lexical_index import BM25Index
+from services.query_cache import QueryResultCache, query_key
+from services.ranking import is_self_referential, parse_timestamp
+from services.thread_store import create_thread_store
+from services.tracing import traced
+from services.vector_store import create_vector_store
+
+# Bump when the flat metadata layout of the "memories" collection changes
+MEMORY_METADATA_VERSION = 1
 
 
 class DatabaseService:
-    def __init__(self, db_path="./cognisphere_data"): # Adjusted default path
+    def __init__(self, db_path="./cognisphere_data", thread_backend="sqlite", lexical_index=True,
+                 query_cache_items=1024, query_cache_ttl_s=300.0, vector_backend="chroma",
+                 vector_options=None): # Adjusted default path
         # No lock needed, initialize directly
         self.db_path = db_path
         os.makedirs(db_path, exist_ok=True)
@@ -16,114 +29,516 @@ class DatabaseService:
         chroma_db_path = os.path.join(db_path) # Chroma persists directly in the given path
         os.makedirs(chroma_db_path, exist_ok=True)
         
-        self.client = chromadb.PersistentClient(path=chroma_db_path)
+        # Memories live in a vector store: the Chroma collection or the local "numpy" store
+        self.vector_backend = vector_backend
+        self.memory_store, self.client = create_vector_store(chroma_db_path, backend=vector_backend,
+                                                              **(vector_options or {}))
         self.collections = {}
-        self.ensure_collection("memories")
-        self.ensure_collection("narrative_threads")
-        self.ensure_collection("entities")
+        if self.client is not None:
+            self.collections["memories"] = self.memory_store.collection
+            self.ensure_collection("narrative_threads")
+            self.ensure_collection("entities")
+        self.migrate_memory_metadata()
+
+        # Query results are cached per store generation, bumped on every memory write
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        self.query_cache = QueryResultCache(query_cache_items, query_cache_ttl_s) if query_cache_items else None
+
+        # BM25 index over memory content, next to the Chroma collection (hybrid recall)
+        self.lexical_index = None
+        if lexical_index:
+            self.lexical_index = BM25Index(os.path.join(db_path, "lexical_index.sqlite3"))
+            self.sync_lexical_index()
+
+        # Narrative threads live outside Chroma ("sqlite" or the original "json" files)
+        self.thread_store = create_thread_store(db_path, backend=thread_backend)
         self.initialized = True # Mark as initialized
 
     def ensure_collection(self, name):
-        """Ensure a collection exists."""
+        """Ensure a collection exists (Chroma backend only)."""
+        if self.client is None:
+            raise RuntimeError(f"Collection '{name}' needs the chroma vector backend")
         try:
             self.collections[name] = self.client.get_collection(name=name)
         except:
             self.collections[name] = self.client.create_collection(name=name)
         return self.collections[name]
 
-    def add_memory(self, memory, embedding):
-        """Add a memory to the database."""
-        collection = self.collections["memories"]
+    @staticmethod
+    def flatten_emotion_data(emotion_data):
+        """
+        Flatten emotion data into typed metadata fields Chroma can filter on.
+
+        Args:
+            emotion_data: Emotion dict (emotion_type, score, valence, arousal)
+
+        Returns:
+            dict: emotion_type (str) and emotion_score/valence/arousal (float)
+        """
+        emotion_data = emotion_data or {}
+        return {
+            "emotion_type": str(emotion_data.get("emotion_type", "neutral")),
+            "emotion_score": float(emotion_data.get("score", 0.5)),
+            "emotion_valence": float(emotion_data.get("valence", 0.5)),
+            "emotion_arousal": float(emotion_data.get("arousal", 0.5))
+        }
+
+    @classmethod
+    def memory_metadata(cls, memory):
+        """
+        Build the Chroma metadata stored for a memory.
 
+        Args:
+            memory: Memory object
+
+        Returns:
+            dict: Memory fields plus the flat emotion and ranking fields
+        """
         # Obter o dicionário de memória
         memory_dict = memory.to_dict()
 
-        # Serializar dados emocionais para JSON se for um dicionário
+        # Campos emocionais planos (filtráveis pelo Chroma) + JSON para compatibilidade
         if "emotion_data" in memory_dict and isinstance(memory_dict["emotion_data"], dict):
-            import json
+            memory_dict.update(cls.flatten_emotion_data(memory_dict["emotion_data"]))
             memory_dict["emotion_data"] = json.dumps(memory_dict["emotion_data"])
 
+        # Campos usados no re-ranking (recência e auto-referência)
+        memory_dict["created_at"] = parse_timestamp(memory.creation_time) or time.time()
+        memory_dict["self_reference"] = is_self_referential(memory.content)
+        return memory_dict
+
+    @traced("db.add_memory")
+    def add_memory(self, memory, embedding):
+        """Add a memory to the database."""
+        collection = self.memory_store
+
         collection.add(
             ids=[memory.id],
             embeddings=[embedding],
             documents=[memory.content],
-            metadatas=[memory_dict]
+            metadatas=[self.memory_metadata(memory)]
         )
+        if self.lexical_index is not None:
+            self.lexical_index.add(memory.id, memory.content)
+        self._bump_generation()
 
         return memory.id
 
-    def query_memories(self, query_embedding, n_results=5):
-        """Query memories by embedding similarity."""
-        collection = self.collections["memories"]
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
-            include=["metadatas", "documents", "distances"]
-        )
+    @traced("db.add_memories")
+    def add_memories(self, memories, embeddings, metadatas=None):
+        """
+        Add many memories with one collection call.
+
+        Items are validated first (missing or mismatched embedding, duplicate
+        ID, metadata that can't be built); invalid items are reported and
+        the rest are inserted together. Batches larger than the vector store's
+        maximum are split.
+
+        Args:
+            memories: List of Memory objects
+            embeddings: One embedding per memory
+            metadatas: Metadata already built with memory_metadata() (optional)
+
+        Returns:
+            dict: "added" (IDs stored) and "errors" (list of {"index", "id", "error"})
+        """
+        memories, embeddings = list(memories), list(embeddings)
+        if len(memories) != len(embeddings):
+            raise ValueError(f"Got {len(memories)} memories but {len(embeddings)} embeddings")
+        prebuilt = list(metadatas) if metadatas is not None else [None] * len(memories)
 
-        # Desserializar dados de emoção - com verificação melhor de tipos
-        import json
-
-        # Verificar a estrutura de dados retornada
-        metadatas = results.get("metadatas", [])
-        if metadatas and isinstance(metadatas, list):
-            # Se for uma lista direta de metadados
-            if metadatas and all(isinstance(m, dict) for m in metadatas):
-                for metadata in metadatas:
-                    if "emotion_data" in metadata and isinstance(metadata["emotion_data"], str):
-                        try:
-                            metadata["emotion_data"] = json.loads(metadata["emotion_data"])
-                        except json.JSONDecodeError:
-                            pass
-            # Se for uma lista de listas (formato esperado)
-            elif metadatas and isinstance(metadatas[0], list):
-                for metadata_list in metadatas:
-                    for metadata in metadata_list:
-                        if isinstance(metadata, dict) and "emotion_data" in metadata and isinstance(
-                                metadata["emotion_data"], str):
-                            try:
-                                metadata["emotion_data"] = json.loads(metadata["emotion_data"])
-                            except json.JSONDecodeError:
-                                pass
+        ids, vectors, documents, metadatas, indexes = [], [], [], [], []
+        errors = []
+        seen = set()
+        dim = None
+        for index, (memory, embedding, metadata) in enumerate(zip(memories, embeddings, prebuilt)):
+            memory_id = getattr(memory, "id", None)
+            try:
+                if embedding is None or len(embedding) == 0:
+                    raise ValueError("missing embedding")
+                if dim is None:
+                    dim = len(embedding)
+                elif len(embedding) != dim:
+                    raise ValueError(f"embedding has dimension {len(embedding)}, expected {dim}")
+                if memory_id in seen:
+                    raise ValueError("duplicate memory ID in batch")
+                if metadata is None:
+                    metadata = self.memory_metadata(memory)
+            except Exception as e:
+                errors.append({"index": index, "id": memory_id, "error": str(e)})
+                continue
+            seen.add(memory_id)
+            ids.append(memory_id)
+            vectors.append(embedding.tolist() if hasattr(embedding, "tolist") else embedding)
+            documents.append(memory.content)
+            metadatas.append(metadata)
+            indexes.append(index)
 
+        collection = self.memory_store
+        added = []
+        step = self._max_batch_size()
+        for start in range(0, len(ids), step):
+            end = start + step
+            try:
+                collection.add(ids=ids[start:end], embeddings=vectors[start:end],
+                               documents=documents[start:end], metadatas=metadatas[start:end])
+                added.extend(ids[start:end])
+                if self.lexical_index is not None:
+                    self.lexical_index.add_many(zip(ids[start:end], documents[start:end]))
+            except Exception as e:
+                errors.extend({"index": index, "id": memory_id, "error": str(e)}
+                              for index, memory_id in zip(indexes[start:end], ids[start:end]))
+
+        if added:
+            self._bump_generation()
+        errors.sort(key=lambda error: error["index"])
+        return {"added": added, "errors": errors}
+
+    @traced("db.delete_memories")
+    def delete_memories(self, memory_ids):
+        """
+        Delete memories from the collection and the lexical index.
+
+        Args:
+            memory_ids: IDs of the memories to delete
+        """
+        memory_ids = list(memory_ids)
+        if not memory_ids:
+            return
+        self.memory_store.delete(ids=memory_ids)
+        if self.lexical_index is not None:
+            self.lexical_index.remove(memory_ids)
+        self._bump_generation()
+
+    def _bump_generation(self):
+        """Invalidate cached query results after a write."""
+        with self._generation_lock:
+            self.generation += 1
+
+    def _cached_query(self, key, run):
+        """Return the cached result for key at the current generation, or run() and cache it."""
+        if self.query_cache is None:
+            return run()
+        # Read before running: a write during the query makes the entry stale
+        generation = self.generation
+        results = self.query_cache.get(key, generation)
+        if results is None:
+            results = run()
+            self.query_cache.put(key, generation, results)
         return results
 
-    def save_thread(self, thread):
-        """Save a narrative thread."""
-        # Save thread data to a JSON file
-        threads_dir = os.path.join(self.db_path, "threads")
-        os.makedirs(threads_dir, exist_ok=True)
+    def _max_batch_size(self):
+        return self.memory_store.max_batch_size
+
+    @traced("db.query_memories")
+    def query_memories(self, query_embedding, n_results=5, where=None):
+        """
+        Query memories by embedding similarity.
+
+        Args:
+            query_embedding: Embedding of the query text
+            n_results: Maximum number of results
+            where: Optional Chroma metadata filter evaluated during the search,
+                e.g. {"emotion_type": "joy"}
+
+        Returns:
+            dict: Chroma query results (lists of lists), served from the
+                query cache while no memory was written
+        """
+        def run():
+            query_args = {
+                "query_embeddings": [query_embedding],
+                "n_results": n_results,
+                "include": ["metadatas", "documents", "distances"]
+            }
+            if where:
+                query_args["where"] = where
+            results = self.memory_store.query(**query_args)
+            self._decode_legacy_metadatas(results)
+            return results
+
+        return self._cached_query(query_key("vector", query_embedding, n_results=n_results, where=where), run)
+
+    @traced("db.query_memories_many")
+    def query_memories_many(self, query_embeddings, n_results=5, where=None):
+        """
+        Query memories for several embeddings with one collection call.
+
+        Args:
+            query_embeddings: List of query embeddings
+            n_results: Maximum number of results per query
+            where: Optional Chroma metadata filter applied to every query
+
+        Returns:
+            dict: Chroma query results with one list per query embedding (in
+                input order; empty lists for invalid queries) and "errors"
+                (list of {"index", "error"})
+        """
+        query_embeddings = list(query_embeddings)
+        keys = ("ids", "documents", "metadatas", "distances")
+        results = {key: [[] for _ in query_embeddings] for key in keys}
+        results["errors"] = []
+
+        valid, vectors = [], []
+        dim = None
+        for index, embedding in enumerate(query_embeddings):
+            if embedding is None or len(embedding) == 0:
+                results["errors"].append({"index": index, "error": "missing embedding"})
+                continue
+            if dim is None:
+                dim = len(embedding)
+            elif len(embedding) != dim:
+                results["errors"].append(
+                    {"index": index, "error": f"embedding has dimension {len(embedding)}, expected {dim}"})
+                continue
+            valid.append(index)
+            vectors.append(embedding.tolist() if hasattr(embedding, "tolist") else embedding)
+        if not vectors:
+            return results
+
+        query_args = {
+            "query_embeddings": vectors,
+            "n_results": n_results,
+            "include": ["metadatas", "documents", "distances"]
+        }
+        if where:
+            query_args["where"] = where
+        try:
+            found = self.memory_store.query(**query_args)
+        except Exception as e:
+            results["errors"].extend({"index": index, "error": str(e)} for index in valid)
+            results["errors"].sort(key=lambda error: error["index"])
+            return results
+
+        self._decode_legacy_metadatas(found)
+        for key in keys:
+            for index, values in zip(valid, found.get(key) or []):
+                results[key][index] = values or []
+        results["errors"].sort(key=lambda error: error["index"])
+        return results
 
-        file_path = os.path.join(threads_dir, f"{thread.id}.json")
-        with open(file_path, "w") as f:
-            json.dump(thread.to_dict(), f, indent=2)
+    @traced("db.query_memories_lexical")
+    def query_memories_lexical(self, query_text, n_results=5, where=None, query_embedding=None):
+        """
+        Query memories with the BM25 index.
 
-        return thread.id
+        Args:
+            query_text: Text of the query
+            n_results: Maximum number of results
+            where: Optional Chroma metadata filter applied to the lexical hits
+            query_embedding: If given, distances to it are computed (squared L2,
+                like the collection) so the hits can be re-ranked with vector hits
 
+        Returns:
+            dict: Chroma-style results for one query in BM25 order, plus
+                "scores" (BM25); distances are None without query_embedding
+        """
+        empty = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]], "scores": [[]]}
+        if self.lexical_index is None or not query_text:
+            return empty
+
+        key = query_key("lexical", query_text, n_results=n_results, where=where,
+                        embedding=query_key("embedding", query_embedding).hex())
+        return self._cached_query(key, lambda: self._query_lexical(query_text, n_results, where, query_embedding))
+
+    def _query_lexical(self, query_text, n_results, where, query_embedding):
+        empty = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]], "scores": [[]]}
+
+        # Over-fetch when filtering, the filter is applied after the BM25 ranking
+        hits = self.lexical_index.search(query_text, n_results * 4 if where else n_results)
+        if not hits:
+            return empty
+
+        get_args = {"ids": [memory_id for memory_id, _ in hits], "include": ["documents", "metadatas"]}
+        if query_embedding is not None:
+            get_args["include"].append("embeddings")
+        if where:
+            get_args["where"] = where
+        found = self.memory_store.get(**get_args)
+
+        embeddings = found.get("embeddings")
+        by_id = {
+            memory_id: (document, metadata, embeddings[i] if embeddings is not None else None)
+            for i, (memory_id, document, metadata) in enumerate(
+                zip(found.get("ids") or [], found.get("documents") or [], found.get("metadatas") or []))
+        }
+        ranked = [(memory_id, score) for memory_id, score in hits if memory_id in by_id][:n_results]
+
+        distances = [None] * len(ranked)
+        if query_embedding is not None and ranked:
+            matrix = np.asarray([by_id[memory_id][2] for memory_id, _ in ranked], dtype=np.float32)
+            query = np.asarray(query_embedding, dtype=np.float32)
+            if self.memory_store.normalized:
+                query = query / max(float(np.linalg.norm(query)), 1e-12)
+            distances = ((matrix - query) ** 2).sum(axis=1).tolist()
+
+        results = {
+            "ids": [[memory_id for memory_id, _ in ranked]],
+            "documents": [[by_id[memory_id][0] for memory_id, _ in ranked]],
+            "metadatas": [[by_id[memory_id][1] for memory_id, _ in ranked]],
+            "distances": [distances],
+            "scores": [[score for _, score in ranked]]
+        }
+        self._decode_legacy_metadatas(results)
+        return results
+
+    def sync_lexical_index(self, batch_size=1000):
+        """
+        Bring the BM25 index in line with the memories collection.
+
+        Indexes memories stored before the index existed (or missed by a crash
+        between the two writes) and drops entries no longer in the collection.
+        Cheap when both already hold the same number of memories. Then
+        compacts the postings of terms with many deleted documents.
+
+        Returns:
+            int: Number of memories indexed
+        """
+        collection = self.memory_store
+        if self.lexical_index is None:
+            return 0
+        if len(self.lexical_index) == collection.count():
+            self.lexical_index.compact()
+            return 0
+
+        indexed = self.lexical_index.memory_ids()
+        stored = set()
+        added = 0
+        offset = 0
+        while True:
+            page = collection.get(include=["documents"], limit=batch_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            stored.update(ids)
+            missing = [(memory_id, document) for memory_id, document in zip(ids, page.get("documents") or [])
+                       if memory_id not in indexed]
+            if missing:
+                self.lexical_index.add_many(missing)
+                added += len(missing)
+            offset += len(ids)
+
+        stale = indexed - stored
+        if stale:
+            self.lexical_index.remove(stale)
+        if added or stale:
+            self._bump_generation()
+        if added:
+            print(f"Indexed {added} memories in the lexical index")
+        self.lexical_index.compact()
+        return added
+
+    def _decode_legacy_metadatas(self, results):
+        """Only legacy rows without flat emotion fields need their JSON decoded."""
+        for metadata_list in results.get("metadatas") or []:
+            for metadata in metadata_list or []:
+                if isinstance(metadata, dict) and "emotion_type" not in metadata:
+                    self._decode_emotion_data(metadata)
+
+    @staticmethod
+    def _decode_emotion_data(metadata):
+        """Decode the JSON emotion_data of a legacy metadata dict in place."""
+        if isinstance(metadata.get("emotion_data"), str):
+            try:
+                metadata["emotion_data"] = json.loads(metadata["emotion_data"])
+            except json.JSONDecodeError:
+                pass
+
+    def migrate_memory_metadata(self, batch_size=500):
+        """
+        One-shot migration adding flat emotion fields to existing memories.
+
+        Runs once per database; progress is recorded in a marker file so
+        later startups skip it.
+
+        Returns:
+            int: Number of memories migrated
+        """
+        marker_path = os.path.join(self.db_path, "memories_metadata_version")
+        try:
+            with open(marker_path, "r") as f:
+                if int(f.read().strip() or 0) >= MEMORY_METADATA_VERSION:
+                    return 0
+        except (OSError, ValueError):
+            pass
+
+        collection = self.memory_store
+        migrated = 0
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+
+            update_ids = []
+            update_metadatas = []
+            for memory_id, metadata in zip(ids, page.get("metadatas") or []):
+                if not isinstance(metadata, dict) or "emotion_type" in metadata:
+                    continue
+                metadata = dict(metadata)
+                self._decode_emotion_data(metadata)
+                emotion_data = metadata.get("emotion_data")
+                metadata.update(self.flatten_emotion_data(
+                    emotion_data if isinstance(emotion_data, dict) else None))
+                if isinstance(emotion_data, dict):
+                    metadata["emotion_data"] = json.dumps(emotion_data)
+                update_ids.append(memory_id)
+                update_metadatas.append(metadata)
+
+            if update_ids:
+                collection.update(ids=update_ids, metadatas=update_metadatas)
+                migrated += len(update_ids)
+            offset += len(ids)
+
+        with open(marker_path, "w") as f:
+            f.write(str(MEMORY_METADATA_VERSION))
+
+        if migrated:
+            print(f"Migrated emotion metadata for {migrated} memories")
+        return migrated
+
+    @traced("db.save_thread")
+    def save_thread(self, thread):
+        """Save a narrative thread."""
+        return self.thread_store.save_thread(thread)
+
+    @traced("db.get_thread")
     def get_thread(self, thread_id):
         """Get a narrative thread by ID."""
-        file_path = os.path.join(self.db_path, "threads", f"{thread_id}.json")
-        try:
-            with open(file_path, "r") as f:
-                data = json.load(f)
-                return NarrativeThread.from_dict(data)
-        except:
-            return None
+        return self.thread_store.get_thread(thread_id)
+
+    @traced("db.append_thread_event")
+    def append_thread_event(self, thread_id, event):
+        """
+        Append an event to a narrative thread without rewriting the thread.
+
+        Args:
+            thread_id: ID of the thread
+            event: Event dict (see NarrativeThread.create_event)
 
+        Returns:
+            bool: False if the thread does not exist
+        """
+        return self.thread_store.append_event(thread_id, event)
+
+    @traced("db.get_all_threads")
     def get_all_threads(self):
         """Get all narrative threads."""
-        threads_dir = os.path.join(self.db_path, "threads")
-        os.makedirs(threads_dir, exist_ok=True)
-
-        threads = []
-        for filename in os.listdir(threads_dir):
-            if filename.endswith(".json"):
-                file_path = os.path.join(threads_dir, filename)
-                try:
-                    with open(file_path, "r") as f:
-                        data = json.load(f)
-                        threads.append(NarrativeThread.from_dict(data))
-                except:
-                    continue
+        return self.thread_store.get_all_threads()
+
+    @traced("db.get_threads")
+    def get_threads(self, status=None, limit=None, order_by="importance"):
+        """
+        Get narrative threads filtered by status.
+
+        Args:
+            status: Optional status to filter on (active, resolved, dormant)
+            limit: Optional maximum number of threads
+            order_by: "importance" (default) or "last_updated", both descending
 
-        return threads
+        Returns:
+            list: NarrativeThread objects
+        """
+        return self.thread_store.get_threads(status=status, limit=limit, order_by=order_by)
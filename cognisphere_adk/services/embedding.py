@@ -1,16 +1,46 @@
 #cognisphere/services/embedding.py
 
+import threading
+import time
+
 from sentence_transformers import SentenceTransformer
 
+from services.embedding_cache import EmbeddingCache
+from services.tracing import traced
+
+
+class _EncodeRequest:
+    """A single encode() call waiting to be served by the batching worker."""
+
+    __slots__ = ("text", "enqueued_at", "done", "result")
 
+    def __init__(self, text):
+        self.text = text
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
 
 
 class EmbeddingService:
     """Provides embedding generation for text."""
 
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        """Initialize with a specific model."""
+    def __init__(self, model_name="all-MiniLM-L6-v2", batch_window_ms=5.0, max_batch_size=32,
+                 cache_dir=None, cache_memory_items=10000, cache_disk_items=1000000):
+        """
+        Initialize with a specific model.
+
+        Args:
+            model_name: SentenceTransformer model to load
+            batch_window_ms: How long encode() waits to gather concurrent requests
+                into one batch. 0 disables micro-batching.
+            max_batch_size: Maximum number of texts per forward pass
+            cache_dir: Directory for the persistent embedding cache (None keeps it in memory only)
+            cache_memory_items: Capacity of the in-memory LRU cache (0 disables caching)
+            cache_disk_items: Capacity of the on-disk cache
+        """
         self.model_name = model_name
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max(1, int(max_batch_size))
         try:
             self.model = SentenceTransformer(model_name)
             self.available = True
@@ -19,13 +49,182 @@ class EmbeddingService:
             self.available = False
             print(f"Warning: Embedding model {model_name} could not be initialized")
 
+        self.cache = None
+        if self.available and cache_memory_items:
+            try:
+                self.cache = EmbeddingCache(
+                    model_name=model_name,
+                    dim=self.model.get_sentence_embedding_dimension(),
+                    cache_dir=cache_dir,
+                    max_memory_items=cache_memory_items,
+                    max_disk_items=cache_disk_items
+                )
+            except Exception as e:
+                print(f"Warning: Embedding cache could not be initialized: {e}")
+
+        # Micro-batching state, the worker thread is started lazily
+        self._pending = []
+        self._pending_cond = threading.Condition()
+        self._worker = None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "max_batch_size": 0,
+            "total_queue_wait_ms": 0.0,
+            "max_queue_wait_ms": 0.0,
+            "total_encode_ms": 0.0
+        }
+
+    @traced("embedding.encode")
     def encode(self, text):
-        """Generate embedding for text."""
+        """
+        Generate embedding for text.
+
+        Concurrent callers are coalesced into a single forward pass when
+        micro-batching is enabled.
+        """
         if not self.available:
             return None
 
+        if self.cache:
+            cached = self.cache.get(text)
+            if cached is not None:
+                return cached
+
+        if not self.batch_window_ms or self.batch_window_ms <= 0:
+            return self._encode_and_cache([text])[0]
+
+        request = _EncodeRequest(text)
+        with self._pending_cond:
+            self._ensure_worker()
+            self._pending.append(request)
+            self._pending_cond.notify()
+
+        request.done.wait()
+        return request.result
+
+    @traced("embedding.encode_batch")
+    def encode_batch(self, texts):
+        """
+        Generate embeddings for several texts in one forward pass.
+
+        Texts already in the cache skip the forward pass.
+
+        Args:
+            texts: List of strings to embed
+
+        Returns:
+            list: One embedding (list of floats) per text, None where it failed
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        if not self.available:
+            return [None] * len(texts)
+
+        if not self.cache:
+            return self._encode_and_cache(texts)
+
+        results = [self.cache.get(text) for text in texts]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            vectors = self._encode_and_cache([texts[i] for i in missing])
+            for i, vector in zip(missing, vectors):
+                results[i] = vector
+        return results
+
+    def _encode_and_cache(self, texts):
+        """Run the forward pass for texts (deduplicated) and store the results in the cache."""
+        unique_texts = list(dict.fromkeys(texts))
         try:
-            return self.model.encode(text).tolist()
+            vectors = self.model.encode(unique_texts, batch_size=self.max_batch_size)
+            by_text = {text: vector.tolist() for text, vector in zip(unique_texts, vectors)}
         except Exception as e:
-            print(f"Error generating embedding: {e}")
-            return None
\ No newline at end of file
+            print(f"Error generating embeddings: {e}")
+            return [None] * len(texts)
+
+        if self.cache:
+            for text, vector in by_text.items():
+                self.cache.put(text, vector)
+        return [by_text[text] for text in texts]
+
+    def get_stats(self):
+        """Return micro-batching statistics (batch sizes and queue wait)."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        batches = stats["batches"]
+        requests = stats["requests"]
+        return {
+            "model_name": self.model_name,
+            "batch_window_ms": self.batch_window_ms,
+            "requests": requests,
+            "batches": batches,
+            "avg_batch_size": requests / batches if batches else 0.0,
+            "max_batch_size": stats["max_batch_size"],
+            "avg_queue_wait_ms": stats["total_queue_wait_ms"] / requests if requests else 0.0,
+            "max_queue_wait_ms": stats["max_queue_wait_ms"],
+            "avg_encode_ms": stats["total_encode_ms"] / batches if batches else 0.0,
+            "pending": len(self._pending),
+            "cache": self.cache.get_stats() if self.cache else None
+        }
+
+    def _ensure_worker(self):
+        """Start the batching worker thread (caller holds _pending_cond)."""
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._batch_loop,
+                name="embedding-batcher",
+                daemon=True
+            )
+            self._worker.start()
+
+    def _next_batch(self):
+        """Block until a batch is ready: the window expired or the batch is full."""
+        window = self.batch_window_ms / 1000.0
+        with self._pending_cond:
+            while not self._pending:
+                self._pending_cond.wait()
+
+            deadline = self._pending[0].enqueued_at + window
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._pending_cond.wait(remaining)
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+        return batch
+
+    def _batch_loop(self):
+        """Worker loop: gather pending requests and encode them together."""
+        while True:
+            batch = self._next_batch()
+
+            started = time.perf_counter()
+            try:
+                vectors = self._encode_and_cache([request.text for request in batch])
+            except Exception as e:
+                print(f"Error in embedding batch: {e}")
+                vectors = [None] * len(batch)
+            finished = time.perf_counter()
+
+            self._record_batch(batch, started, finished)
+
+            for request, vector in zip(batch, vectors):
+                request.result = vector
+                request.done.set()
+
+    def _record_batch(self, batch, started, finished):
+        """Update batch-size and queue-wait counters."""
+        waits_ms = [(started - request.enqueued_at) * 1000.0 for request in batch]
+        with self._stats_lock:
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+            self._stats["total_queue_wait_ms"] += sum(waits_ms)
+            self._stats["max_queue_wait_ms"] = max(self._stats["max_queue_wait_ms"], max(waits_ms))
+            self._stats["total_encode_ms"] += (finished - started) * 1000.0
@@ -0,0 +1,244 @@
+# cognisphere_adk/services/embedding_cache.py
+"""
+Content-addressed cache for text embeddings.
+
+Entries are keyed by (model_name, sha256(text)). Lookups go through an
+in-memory LRU tier first and then a memory-mapped on-disk tier made of
+fixed-width float32 rows, which survives restarts.
+
+The disk tier is a ring: once full, the oldest row is overwritten. Every row
+carries the sequence number of its write, so the ring position is recovered
+from the files themselves after a crash (meta.json may be stale).
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DIGEST_SIZE = 32  # sha256
+INITIAL_DISK_CAPACITY = 1024
+
+
+class EmbeddingCache:
+    """Two-tier (LRU memory + memory-mapped disk) embedding cache."""
+
+    def __init__(self, model_name, dim, cache_dir=None, max_memory_items=10000, max_disk_items=1000000):
+        """
+        Initialize the cache.
+
+        Args:
+            model_name: Name of the embedding model, part of every key
+            dim: Embedding dimension (row width of the disk tier)
+            cache_dir: Directory for the on-disk tier. None disables it.
+            max_memory_items: Capacity of the in-memory LRU tier
+            max_disk_items: Capacity of the on-disk tier (oldest rows are overwritten)
+        """
+        self.model_name = model_name
+        self.dim = int(dim)
+        self.max_memory_items = max(0, int(max_memory_items))
+        self.max_disk_items = max(0, int(max_disk_items))
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0
+        }
+
+        # Disk tier state
+        self.disk_dir = None
+        self._vectors = None
+        self._keys = None
+        self._slots = {}
+        self._sequence = None
+        self._capacity = 0
+        self._next_slot = 0
+        self._writes = 0
+
+        if cache_dir and self.max_disk_items > 0:
+            safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+            self.disk_dir = os.path.join(cache_dir, f"{safe_name}-{self.dim}")
+            try:
+                self._open_disk_tier()
+                atexit.register(self.flush)
+            except Exception as e:
+                print(f"Warning: Embedding disk cache at {self.disk_dir} could not be opened: {e}")
+                self.disk_dir = None
+                self._vectors = None
+                self._keys = None
+                self._sequence = None
+                self._slots = {}
+
+    def key(self, text):
+        """Return the content-addressed key for text."""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def get(self, text):
+        """Return the cached embedding for text as a list, or None."""
+        key = self.key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return vector.tolist()
+
+            slot = self._slots.get(key)
+            if slot is not None:
+                vector = np.array(self._vectors[slot], dtype=np.float32)
+                self._stats["disk_hits"] += 1
+                self._remember(key, vector)
+                return vector.tolist()
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, text, embedding):
+        """Store an embedding for text in both tiers."""
+        if embedding is None:
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.dim,):
+            return
+
+        key = self.key(text)
+        with self._lock:
+            self._remember(key, vector)
+            if self._vectors is not None and key not in self._slots:
+                self._write_disk(key, vector)
+
+    def flush(self):
+        """Flush the disk tier to its files."""
+        with self._lock:
+            if self._vectors is None:
+                return
+            self._vectors.flush()
+            self._keys.flush()
+            self._sequence.flush()
+            self._write_meta()
+
+    def get_stats(self):
+        """Return hit/miss/eviction counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+            stats["disk_items"] = len(self._slots)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    # --- Memory tier ---
+
+    def _remember(self, key, vector):
+        """Insert into the LRU tier (caller holds the lock)."""
+        if self.max_memory_items <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self._stats["memory_evictions"] += 1
+
+    # --- Disk tier ---
+
+    def _paths(self):
+        return (
+            os.path.join(self.disk_dir, "vectors.f32"),
+            os.path.join(self.disk_dir, "keys.bin"),
+            os.path.join(self.disk_dir, "sequence.u64"),
+            os.path.join(self.disk_dir, "meta.json")
+        )
+
+    def _open_disk_tier(self):
+        """Open (or create) the memory-mapped files and rebuild the key index."""
+        os.makedirs(self.disk_dir, exist_ok=True)
+        vectors_path, keys_path, _, meta_path = self._paths()
+
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+
+        capacity = 0
+        if os.path.exists(vectors_path) and os.path.exists(keys_path):
+            capacity = min(
+                os.path.getsize(vectors_path) // (self.dim * 4),
+                os.path.getsize(keys_path) // DIGEST_SIZE
+            )
+
+        if capacity == 0:
+            capacity = min(INITIAL_DISK_CAPACITY, self.max_disk_items)
+            meta = {}
+        self._map_files(capacity)
+
+        filled = np.flatnonzero(self._keys.any(axis=1))
+        self._slots = {bytes(self._keys[slot]): int(slot) for slot in filled}
+        last = int(np.argmax(self._sequence)) if len(filled) else 0
+        if self._sequence[last]:
+            # The row after the last one written is the next to (over)write
+            self._writes = int(self._sequence[last])
+            self._next_slot = last + 1
+        else:
+            # Cache written before rows carried sequence numbers
+            self._next_slot = min(int(meta.get("next_slot", len(filled))), self._capacity)
+        self._write_meta()
+
+    def _map_files(self, capacity):
+        """(Re)map the vectors, keys and sequence files with room for capacity rows."""
+        vectors_path, keys_path, sequence_path, _ = self._paths()
+        for path, row_bytes in ((vectors_path, self.dim * 4), (keys_path, DIGEST_SIZE), (sequence_path, 8)):
+            with open(path, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._keys.flush()
+            self._sequence.flush()
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._keys = np.memmap(keys_path, dtype=np.uint8, mode="r+", shape=(capacity, DIGEST_SIZE))
+        self._sequence = np.memmap(sequence_path, dtype=np.uint64, mode="r+", shape=(capacity,))
+        self._capacity = capacity
+
+    def _write_disk(self, key, vector):
+        """Write one row, growing the files or overwriting the oldest row (caller holds the lock)."""
+        if self._next_slot >= self._capacity:
+            if self._capacity < self.max_disk_items:
+                self._map_files(min(self._capacity * 2, self.max_disk_items))
+                self._write_meta()
+            else:
+                self._next_slot = 0
+
+        slot = self._next_slot
+        if self._keys[slot].any():
+            del self._slots[bytes(self._keys[slot])]
+            self._stats["disk_evictions"] += 1
+
+        self._vectors[slot] = vector
+        self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+        self._writes += 1
+        self._sequence[slot] = self._writes
+        self._slots[key] = slot
+        self._next_slot = slot + 1
+
+    def _write_meta(self):
+        """Persist the disk tier header."""
+        meta_path = self._paths()[-1]
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "model_name": self.model_name,
+                "dim": self.dim,
+                "capacity": self._capacity,
+                "next_slot": self._next_slot
+            }, f)
+        os.replace(tmp_path, meta_path)
@@ -0,0 +1,229 @@
+# cognisphere_adk/services/emotion_classifier.py
+"""
+Emotion classification in embedding space.
+
+Each emotion has a prototype vector: the normalized mean embedding of a few
+example sentences, encoded once with the EmbeddingService. A message is
+classified with the sentence embedding it needs anyway for memory storage:
+one matrix-vector product against the prototype matrix scores every emotion
+at once.
+
+Results are kept in a small per-turn cache keyed by text, so when the same
+message is stored as a memory right after being classified, create_memory
+reuses the vector instead of running the model again.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+NEUTRAL = "neutral"
+
+# A few typical sentences per emotion; their mean embedding is the prototype
+EMOTION_PROTOTYPES = {
+    "joy": [
+        "I am so happy today",
+        "This is wonderful news, I'm delighted",
+        "I had a great time and feel cheerful",
+        "I'm thrilled and excited about it"
+    ],
+    "sadness": [
+        "I feel sad and lonely",
+        "I'm heartbroken about what happened",
+        "It was a disappointing and depressing day",
+        "I miss them and feel down"
+    ],
+    "anger": [
+        "I am furious about this",
+        "This makes me so angry",
+        "I'm annoyed and irritated with them",
+        "That was outrageous and unfair"
+    ],
+    "fear": [
+        "I'm scared of what might happen",
+        "I feel anxious and worried",
+        "I'm afraid and nervous about tomorrow",
+        "That was terrifying"
+    ],
+    "surprise": [
+        "I can't believe it, what a surprise",
+        "I was shocked by the news",
+        "That was completely unexpected",
+        "I'm amazed and astonished"
+    ],
+    "curiosity": [
+        "I wonder how this works",
+        "I'm curious to learn more about it",
+        "That's fascinating, tell me more",
+        "I'm interested in how they did that"
+    ],
+    NEUTRAL: [
+        "I went to the store",
+        "The meeting is at three o'clock",
+        "Please list my narrative threads",
+        "It is a regular day"
+    ]
+}
+
+
+class EmotionClassifier:
+    """Scores all emotions of a text with one product against prototype embeddings."""
+
+    def __init__(self, embedding_service, temperature=0.05, min_similarity=0.2, min_score=0.15,
+                 turn_cache_items=256):
+        """
+        Args:
+            embedding_service: EmbeddingService used for texts and prototypes
+            temperature: Softmax temperature turning cosine similarities into scores
+            min_similarity: Below this cosine to the best prototype the text is neutral
+            min_score: Emotions scoring less than this are left out of detected_emotions
+            turn_cache_items: Number of recent (text -> scores, embedding) results kept
+        """
+        self.embedding_service = embedding_service
+        self.temperature = max(float(temperature), 1e-3)
+        self.min_similarity = min_similarity
+        self.min_score = min_score
+        self.turn_cache_items = turn_cache_items
+
+        self._labels = list(EMOTION_PROTOTYPES)
+        self._prototype_matrix = None
+        self._prototype_lock = threading.Lock()
+
+        self._turn_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"classified": 0, "turn_cache_hits": 0, "embeddings_reused": 0, "embeddings_encoded": 0}
+
+    @property
+    def available(self):
+        return self._prototypes() is not None
+
+    def _prototypes(self):
+        """Encode the prototype sentences once (lazily, on first use)."""
+        if self._prototype_matrix is not None:
+            return self._prototype_matrix
+        if self.embedding_service is None:
+            return None
+
+        with self._prototype_lock:
+            if self._prototype_matrix is None:
+                phrases = [phrase for label in self._labels for phrase in EMOTION_PROTOTYPES[label]]
+                vectors = self.embedding_service.encode_batch(phrases)
+                if not vectors or any(not vector for vector in vectors):
+                    print("Warning: could not encode emotion prototypes; using the lexicon")
+                    self.embedding_service = None
+                    return None
+
+                vectors = np.asarray(vectors, dtype=np.float32)
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                rows, start = [], 0
+                for label in self._labels:
+                    count = len(EMOTION_PROTOTYPES[label])
+                    rows.append(vectors[start:start + count].mean(axis=0))
+                    start += count
+                matrix = np.stack(rows)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                self._prototype_matrix = matrix
+        return self._prototype_matrix
+
+    def classify(self, text):
+        """
+        Score the emotions of one text.
+
+        Returns:
+            tuple: (detected_emotions dict, embedding list), or (None, None)
+                if the text could not be embedded
+        """
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts):
+        """
+        Score many texts: one forward pass for the uncached texts and one
+        matrix product for all of them.
+
+        Returns:
+            list: (detected_emotions, embedding) per text, (None, None) where it failed
+        """
+        texts = list(texts)
+        prototypes = self._prototypes()
+        if prototypes is None:
+            return [(None, None)] * len(texts)
+
+        results = [self._cached(text) for text in texts]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            vectors = self.embedding_service.encode_batch([texts[i] for i in missing])
+            valid = [(i, vector) for i, vector in zip(missing, vectors) if vector]
+            if valid:
+                matrix = np.asarray([vector for _, vector in valid], dtype=np.float32)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                for (i, vector), similarities in zip(valid, matrix @ prototypes.T):
+                    results[i] = (self._scores(similarities), vector)
+                    self._remember(texts[i], results[i])
+            with self._lock:
+                self._stats["classified"] += len(valid)
+                self._stats["embeddings_encoded"] += len(valid)
+
+        return [result if result is not None else (None, None) for result in results]
+
+    def embedding_for(self, text):
+        """
+        Embedding of text, reused from this turn's classification when available.
+        """
+        cached = self.cached_embedding(text)
+        if cached is not None:
+            return cached
+
+        if self.embedding_service is None:
+            return None
+        with self._lock:
+            self._stats["embeddings_encoded"] += 1
+        return self.embedding_service.encode(text)
+
+    def cached_embedding(self, text):
+        """Embedding of text if it was classified recently, else None (never encodes)."""
+        cached = self._cached(text, count_hit=False)
+        if cached is None:
+            return None
+        with self._lock:
+            self._stats["embeddings_reused"] += 1
+        return cached[1]
+
+    def _scores(self, similarities):
+        """Turn cosine similarities to the prototypes into detected emotion scores."""
+        best = int(np.argmax(similarities))
+        if self._labels[best] == NEUTRAL or similarities[best] < self.min_similarity:
+            return {}
+
+        weights = np.exp((similarities - similarities[best]) / self.temperature)
+        weights /= weights.sum()
+        return {
+            label: round(float(weight), 3)
+            for i, (label, weight) in enumerate(zip(self._labels, weights.tolist()))
+            if i == best or (label != NEUTRAL and weight >= self.min_score)
+        }
+
+    def _cached(self, text, count_hit=True):
+        with self._lock:
+            result = self._turn_cache.get(text)
+            if result is not None:
+                self._turn_cache.move_to_end(text)
+                if count_hit:
+                    self._stats["turn_cache_hits"] += 1
+            return result
+
+    def _remember(self, text, result):
+        if not self.turn_cache_items:
+            return
+        with self._lock:
+            self._turn_cache[text] = result
+            self._turn_cache.move_to_end(text)
+            while len(self._turn_cache) > self.turn_cache_items:
+                self._turn_cache.popitem(last=False)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["turn_cache_items"] = len(self._turn_cache)
+        stats["prototypes_ready"] = self._prototype_matrix is not None
+        return stats
@@ -0,0 +1,506 @@
+# cognisphere_adk/services/ingestion.py
+"""
+Write-behind ingestion of memories.
+
+create_memory hands memories to a bounded queue and returns as soon as they
+are recorded in an append-only journal. A background worker embeds them in
+batches (one forward pass per batch) and inserts each batch into the
+memories collection with one call.
+
+Reads stay consistent: query_pending() searches the memories that are still
+queued, and recall_memories merges them with the vector store results, so
+a memory is visible to recall as soon as create_memory returns.
+
+On startup, memories left in the journal by a crash are stored. close()
+drains the queue before the process exits. A memory is marked done in the
+journal only once it is in the vector store; memories that could not be
+stored stay in the journal and are retried on the next startup.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from data_models.memory import Memory
+from services.database import DatabaseService
+from services.tracing import traced
+
+BACKPRESSURE_POLICIES = ("block", "sync", "reject")
+
+
+class QueueFullError(Exception):
+    """Raised by submit() when the queue is full and the policy is "reject"."""
+
+
+class _PendingMemory:
+    __slots__ = ("memory", "embedding", "metadata", "enqueued_at")
+
+    def __init__(self, memory, embedding=None):
+        self.memory = memory
+        self.embedding = embedding
+        self.metadata = DatabaseService.memory_metadata(memory)
+        self.enqueued_at = time.perf_counter()
+
+
+def matches_where(metadata, where):
+    """
+    Evaluate a Chroma-style metadata filter on one metadata dict.
+
+    Supports field equality, $eq/$ne/$in/$nin/$gt/$gte/$lt/$lte and $and/$or.
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+                if operator in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if operator == "$gt" and not value > operand:
+                        return False
+                    if operator == "$gte" and not value >= operand:
+                        return False
+                    if operator == "$lt" and not value < operand:
+                        return False
+                    if operator == "$lte" and not value <= operand:
+                        return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def merge_results(results, pending, n_results):
+    """
+    Merge query_pending() results into vector store results for one query.
+
+    Memories present in both (written while the query ran) are kept once.
+
+    Returns:
+        dict: Chroma-style results with at most n_results items, nearest first
+    """
+    def rows(result):
+        columns = [(result.get(key) or [[]])[0] or [] for key in ("ids", "documents", "metadatas", "distances")]
+        return list(zip(*columns))
+
+    merged = {}
+    for row in rows(results) + rows(pending):
+        merged.setdefault(row[0], row)
+    top = sorted(merged.values(), key=lambda row: row[3])[:n_results]
+    return {
+        "ids": [[row[0] for row in top]],
+        "documents": [[row[1] for row in top]],
+        "metadatas": [[row[2] for row in top]],
+        "distances": [[row[3] for row in top]]
+    }
+
+
+class MemoryIngestionQueue:
+    """Bounded write-behind queue embedding and storing memories in batches."""
+
+    def __init__(self, db_service, embedding_service, max_pending=1000, batch_size=32, flush_interval_ms=50.0,
+                 backpressure="block", block_timeout_s=2.0, journal_path=None, fsync=False):
+        """
+        Args:
+            db_service: DatabaseService the memories are written to
+            embedding_service: EmbeddingService used for the batch forward passes
+            max_pending: Queue capacity (memories not yet stored)
+            batch_size: Maximum memories embedded and inserted together
+            flush_interval_ms: How long the worker waits to fill a batch
+            backpressure: What submit() does when the queue is full:
+                "block" waits up to block_timeout_s, then writes synchronously;
+                "sync" writes synchronously right away; "reject" raises QueueFullError
+            block_timeout_s: Maximum wait of the "block" policy
+            journal_path: Append-only journal making queued memories survive a crash
+                (None disables it)
+            fsync: fsync the journal on every submit (slower, survives power loss)
+        """
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy '{backpressure}' (use one of {BACKPRESSURE_POLICIES})")
+
+        self.db_service = db_service
+        self.embedding_service = embedding_service
+        self.max_pending = max(1, int(max_pending))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_ms = flush_interval_ms
+        self.backpressure = backpressure
+        self.block_timeout_s = block_timeout_s
+        self.journal_path = journal_path
+        self.fsync = fsync
+
+        # Memórias pendentes por ID (em ordem de chegada) e as que o worker está gravando
+        self._pending = {}
+        self._in_flight = {}
+        # Memórias que não puderam ser gravadas: ficam no diário até o próximo início
+        self._failed = {}
+        self._cond = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._journal = None
+        self._closed = False
+        self._worker = None
+
+        self._stats = {
+            "queued": 0, "written": 0, "batches": 0, "batched": 0, "failed": 0, "rejected": 0,
+            "sync_writes": 0, "replayed": 0, "pending_queries": 0, "pending_hits": 0,
+            "max_pending_seen": 0, "total_queue_wait_ms": 0.0, "total_batch_ms": 0.0
+        }
+
+        if journal_path:
+            self._replay_journal()
+
+    # --- Journal ---
+
+    def _open_journal(self):
+        if self._journal is None and self.journal_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        return self._journal
+
+    def _journal_write(self, record, sync=False):
+        if not self.journal_path:
+            return
+        with self._journal_lock:
+            journal = self._open_journal()
+            journal.write(json.dumps(record) + "\n")
+            journal.flush()
+            if sync:
+                os.fsync(journal.fileno())
+
+    def _journal_truncate(self):
+        """
+        Start a new journal once nothing is pending or in flight (caller holds _cond).
+
+        Memories that failed to store are carried over into it, so they are
+        retried on the next startup.
+        """
+        if not self.journal_path or self._pending or self._in_flight:
+            return
+        with self._journal_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if not self._failed:
+                open(self.journal_path, "w").close()
+                return
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for memory in self._failed.values():
+                    f.write(json.dumps({"memory": memory.to_dict()}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+
+    def _settle(self, batch, stored):
+        """
+        Record the outcome of a written batch: journal the stored memories as done
+        and keep the others for the next startup.
+        """
+        stored = set(stored)
+        done = [item.memory.id for item in batch if item.memory.id in stored]
+        if done:
+            self._journal_write({"done": done})
+        with self._cond:
+            for item in batch:
+                if item.memory.id in stored:
+                    self._failed.pop(item.memory.id, None)
+                else:
+                    self._failed[item.memory.id] = item.memory
+
+    def _replay_journal(self):
+        """Store the memories a previous process journaled but didn't write."""
+        if not os.path.exists(self.journal_path):
+            return
+
+        queued, done = {}, set()
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Última linha incompleta (crash durante a escrita)
+                if "memory" in record:
+                    queued[record["memory"]["id"]] = record["memory"]
+                done.update(record.get("done", ()))
+
+        memories = [Memory.from_dict(data) for memory_id, data in queued.items() if memory_id not in done]
+        if memories:
+            print(f"Replaying {len(memories)} memories from the ingestion journal")
+            # Grava de forma síncrona: a fila ainda não aceita escritas
+            for start in range(0, len(memories), self.batch_size):
+                batch = [_PendingMemory(memory) for memory in memories[start:start + self.batch_size]]
+                self._settle(batch, self._write_batch(batch))
+            self._stats["replayed"] = len(memories)
+            if self._failed:
+                print(f"Warning: {len(self._failed)} journaled memories still could not be stored; "
+                      f"they stay in the journal")
+
+        with self._cond:
+            self._journal_truncate()
+
+    # --- Producer side ---
+
+    @traced("ingestion.submit")
+    def submit(self, memory, embedding=None):
+        """
+        Queue a memory for storage.
+
+        Args:
+            memory: Memory object
+            embedding: Its embedding if already known (skips the forward pass)
+
+        Returns:
+            str: "queued", or "written" if it was stored synchronously (backpressure
+                policy, or the queue is already closed)
+
+        Raises:
+            QueueFullError: The queue is full and the policy is "reject"
+        """
+        item = _PendingMemory(memory, embedding)
+
+        with self._cond:
+            if len(self._pending) >= self.max_pending and not self._closed:
+                if self.backpressure == "reject":
+                    self._stats["rejected"] += 1
+                    raise QueueFullError(f"Ingestion queue full ({self.max_pending} pending memories)")
+                if self.backpressure == "block":
+                    deadline = time.monotonic() + self.block_timeout_s
+                    while len(self._pending) >= self.max_pending and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+
+            if len(self._pending) < self.max_pending and not self._closed:
+                self._journal_write({"memory": memory.to_dict()}, sync=self.fsync)
+                self._pending[memory.id] = item
+                self._stats["queued"] += 1
+                self._stats["max_pending_seen"] = max(self._stats["max_pending_seen"], len(self._pending))
+                self._ensure_worker()
+                self._cond.notify_all()
+                return "queued"
+
+        # Fila cheia (ou já encerrada): o chamador paga a escrita
+        stored = self._write_batch([item])
+        with self._cond:
+            self._stats["sync_writes"] += 1
+            if not stored:
+                # Journaled so the memory is retried on the next startup; kept in _failed under
+                # _cond first, so a journal truncation by the worker carries it over
+                self._failed[memory.id] = memory
+                self._journal_write({"memory": memory.to_dict()}, sync=self.fsync)
+        return "written"
+
+    # --- Read-your-writes ---
+
+    @traced("ingestion.query_pending")
+    def query_pending(self, query_embedding, n_results=5, where=None):
+        """
+        Search the memories not yet in the vector store.
+
+        Pending memories without an embedding are embedded here (one batch);
+        the worker reuses those vectors. Distances are squared L2, like the
+        memories collection.
+
+        Returns:
+            dict: Chroma-style results for one query (ids, documents,
+                metadatas, distances as lists of lists)
+        """
+        empty = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        with self._cond:
+            items = [item for item in list(self._in_flight.values()) + list(self._pending.values())
+                     if matches_where(item.metadata, where)]
+            self._stats["pending_queries"] += 1
+        if not items or query_embedding is None:
+            return empty
+
+        missing = [item for item in items if item.embedding is None]
+        if missing:
+            vectors = self.embedding_service.encode_batch([item.memory.content for item in missing])
+            for item, vector in zip(missing, vectors):
+                item.embedding = vector
+            items = [item for item in items if item.embedding is not None]
+            if not items:
+                return empty
+
+        matrix = np.asarray([item.embedding for item in items], dtype=np.float32)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        distances = ((matrix - query) ** 2).sum(axis=1)
+        order = np.argsort(distances)[:n_results]
+
+        with self._cond:
+            self._stats["pending_hits"] += len(order)
+        return {
+            "ids": [[items[i].memory.id for i in order]],
+            "documents": [[items[i].memory.content for i in order]],
+            "metadatas": [[dict(items[i].metadata) for i in order]],
+            "distances": [[float(distances[i]) for i in order]]
+        }
+
+    # --- Worker ---
+
+    def _ensure_worker(self):
+        """Start the ingestion worker (caller holds _cond)."""
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="memory-ingestion", daemon=True)
+            self._worker.start()
+
+    def _next_batch(self):
+        """Block until a batch is ready; returns [] once closed and drained."""
+        window = self.flush_interval_ms / 1000.0
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return []
+
+            deadline = next(iter(self._pending.values())).enqueued_at + window
+            while len(self._pending) < self.batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            ids = list(self._pending)[:self.batch_size]
+            batch = [self._pending.pop(memory_id) for memory_id in ids]
+            self._in_flight.update((item.memory.id, item) for item in batch)
+            self._cond.notify_all()  # Há espaço na fila para quem está bloqueado
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            started = time.perf_counter()
+            stored = self._write_batch(batch)
+            finished = time.perf_counter()
+
+            self._settle(batch, stored)
+            with self._cond:
+                for item in batch:
+                    self._in_flight.pop(item.memory.id, None)
+                self._stats["batches"] += 1
+                self._stats["batched"] += len(batch)
+                self._stats["total_batch_ms"] += (finished - started) * 1000.0
+                self._stats["total_queue_wait_ms"] += sum((started - item.enqueued_at) * 1000.0 for item in batch)
+                self._journal_truncate()
+                self._cond.notify_all()
+
+    @traced("ingestion.write_batch")
+    def _write_batch(self, batch):
+        """
+        Embed the batch (one forward pass) and insert it with add_memories (one collection call).
+
+        Returns:
+            list: IDs of the memories actually stored
+        """
+        stored = []
+        try:
+            missing = [item for item in batch if item.embedding is None]
+            if missing:
+                vectors = self.embedding_service.encode_batch([item.memory.content for item in missing])
+                for item, vector in zip(missing, vectors):
+                    item.embedding = vector
+
+            ready = [item for item in batch if item.embedding is not None and len(item.embedding)]
+            if len(ready) < len(batch):
+                print(f"Warning: could not embed {len(batch) - len(ready)} queued memories; "
+                      f"they stay in the journal")
+            if ready:
+                result = self.db_service.add_memories(
+                    [item.memory for item in ready],
+                    [item.embedding for item in ready],
+                    metadatas=[item.metadata for item in ready]
+                )
+                stored = list(result["added"])
+                for error in result["errors"]:
+                    print(f"Error storing memory {error['id']}: {error['error']}")
+        except Exception as e:
+            print(f"Error storing {len(batch)} queued memories: {e}")
+
+        with self._cond:
+            self._stats["written"] += len(stored)
+            self._stats["failed"] += len(batch) - len(stored)
+        return stored
+
+    # --- Lifecycle ---
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued memory is stored.
+
+        Returns:
+            bool: True if the queue drained before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                if self._worker is None or not self._worker.is_alive():
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 0.1)
+            # Sem worker (p.ex. já encerrado): grava aqui o que sobrou, inclusive o lote
+            # que um worker morto deixou em andamento
+            leftover = list(self._in_flight.values()) + list(self._pending.values())
+            self._in_flight.update((item.memory.id, item) for item in leftover)
+            self._pending.clear()
+
+        for start in range(0, len(leftover), self.batch_size):
+            batch = leftover[start:start + self.batch_size]
+            self._settle(batch, self._write_batch(batch))
+        if leftover:
+            with self._cond:
+                for item in leftover:
+                    self._in_flight.pop(item.memory.id, None)
+                self._journal_truncate()
+        return True
+
+    def close(self, timeout=30.0):
+        """Stop accepting memories, store everything queued and stop the worker."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout)
+        self.flush(timeout)
+        with self._journal_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending) + len(self._in_flight)
+            stats["unstored"] = len(self._failed)
+        batches, batched, queued = stats["batches"], stats.pop("batched"), stats["queued"]
+        batch_ms, queue_wait_ms = stats.pop("total_batch_ms"), stats.pop("total_queue_wait_ms")
+        stats["avg_batch_size"] = batched / batches if batches else 0.0
+        stats["avg_batch_ms"] = batch_ms / batches if batches else 0.0
+        stats["avg_queue_wait_ms"] = queue_wait_ms / batched if batched else 0.0
+        stats["max_pending"] = self.max_pending
+        stats["backpressure"] = self.backpressure
+        return stats
@@ -0,0 +1,238 @@
+# cognisphere_adk/services/intent_router.py
+"""
+Fast-path intent routing in front of the orchestrator.
+
+Simple messages (greetings, farewells, "remember X", "what do you remember
+about Y", thread listing) don't need the orchestrator LLM to decide what to
+do. The router recognises them with compiled patterns first and, for short
+messages the patterns miss, with the nearest intent prototype in embedding
+space. Everything else falls back to the orchestrator.
+
+A route either runs a tool directly (target DIRECT) or names the sub-agent
+that should handle the message without the orchestrator hop.
+"""
+
+import re
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+DIRECT = "direct"
+
+# intent: what was recognised; target: DIRECT or a sub-agent name;
+# argument: text captured by the pattern (None for embedding matches);
+# method: "pattern" or "embedding"; confidence: 1.0 for patterns, cosine otherwise
+RouteDecision = namedtuple("RouteDecision", ["intent", "target", "argument", "method", "confidence"])
+
+_END = r"\s*[.!?]*\s*$"
+
+# Ordered: the first matching pattern wins
+INTENT_PATTERNS = [
+    ("greeting", DIRECT, re.compile(
+        r"^\s*(?:hi|hello|hey|hiya|howdy|greetings|good\s+(?:morning|afternoon|evening)|ol[aá]|oi)"
+        r"(?:\s+(?:there|everyone|cognisphere))?[\s,!.]*"
+        r"(?:(?:i'?m|i\s+am|my\s+name\s+is)\s+(?P<argument>[\w-]+))?" + _END, re.IGNORECASE)),
+    ("farewell", DIRECT, re.compile(
+        r"^\s*(?:(?:ok(?:ay)?|thanks|thank\s+you)[\s,!.]+)?"
+        r"(?:bye(?:\s+bye)?|good\s*bye|see\s+(?:you|ya)(?:\s+(?:later|soon|tomorrow))?|farewell|"
+        r"good\s+night|talk\s+to\s+you\s+later|tchau|adeus)" + _END, re.IGNORECASE)),
+    ("recall", DIRECT, re.compile(
+        r"^\s*(?:what|which\s+things)\s+do\s+you\s+(?:remember|recall|know)\s+about\s+(?P<argument>.+?)" + _END,
+        re.IGNORECASE)),
+    ("recall", DIRECT, re.compile(
+        r"^\s*(?:do\s+you\s+remember\s+anything|(?:recall|search)\s+(?:my\s+|your\s+)?memories)\s+"
+        r"(?:about|of|for)\s+(?P<argument>.+?)" + _END, re.IGNORECASE)),
+    ("remember", DIRECT, re.compile(
+        r"^\s*(?!.*\?\s*$)(?:please\s+)?(?:remember|memorize|don'?t\s+forget)\s+(?:that\s+)?"
+        r"(?!(?:what|when|where|who|how|why|if|whether|me|this|it|to|the\s+time)\b)(?P<argument>.{3,}?)" + _END,
+        re.IGNORECASE | re.DOTALL)),
+    ("list_threads", DIRECT, re.compile(
+        r"^\s*(?:(?:please\s+)?(?:list|show)(?:\s+me)?(?:\s+all)?(?:\s+(?:my|the))?|what\s+are(?:\s+(?:my|the))?)"
+        r"(?:\s+active)?(?:\s+narrative)?\s+(?:threads|narratives|stories)(?:\s+are\s+active)?" + _END,
+        re.IGNORECASE)),
+]
+
+# "remember" messages that are not facts to store: questions ("remember the time
+# we...?"), reminders ("remember to call mom") and reminiscing. They go to the
+# orchestrator, never to the remember fast path or its prototypes.
+NOT_A_FACT = re.compile(
+    r"^\s*(?:please\s+)?(?:remember|memorize|don'?t\s+forget)\b(?:.*\?\s*$|\s+(?:to|the\s+time)\b)",
+    re.IGNORECASE | re.DOTALL)
+
+# Prototypes for the embedding fallback. remember/recall carry no argument
+# when matched this way, so they go to the memory agent instead of a tool.
+INTENT_PROTOTYPES = {
+    ("greeting", DIRECT): [
+        "hello", "hi there", "hey, how are you", "good morning", "hello, nice to meet you"
+    ],
+    ("farewell", DIRECT): [
+        "goodbye", "bye, see you later", "I have to go now, bye", "talk to you later",
+        "thanks, that's all for today"
+    ],
+    ("remember", "memory_agent"): [
+        "please remember this for me", "save this as a memory", "store this in your memory",
+        "don't forget what I just told you"
+    ],
+    ("recall", "memory_agent"): [
+        "what do you remember about me", "what do you know about my family",
+        "do you recall what I told you yesterday", "search your memories"
+    ],
+    ("list_threads", DIRECT): [
+        "show my narrative threads", "what stories are we following", "list the active threads",
+        "which narratives are active"
+    ],
+}
+
+
+class IntentRouter:
+    """Classifies messages into fast-path intents and keeps routing statistics."""
+
+    def __init__(self, embedding_service=None, similarity_threshold=0.8, max_embedding_words=8):
+        """
+        Args:
+            embedding_service: EmbeddingService for prototype matching (patterns only if None)
+            similarity_threshold: Minimum cosine similarity for an embedding match
+            max_embedding_words: Longer messages skip the embedding check and fall back
+        """
+        self.embedding_service = embedding_service
+        self.similarity_threshold = similarity_threshold
+        self.max_embedding_words = max_embedding_words
+
+        self._prototype_matrix = None
+        self._prototype_labels = []
+        self._prototype_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "messages": 0,
+            "routed": 0,
+            "fallback": 0,
+            "by_intent": {},
+            "by_method": {"pattern": 0, "embedding": 0},
+            "routed_time": 0.0,
+            "fallback_time": 0.0
+        }
+
+    def route(self, message):
+        """
+        Classify a message.
+
+        Returns:
+            RouteDecision, or None if the message should go to the orchestrator
+        """
+        text = (message or "").strip()
+        if not text or NOT_A_FACT.match(text):
+            return None
+
+        for intent, target, pattern in INTENT_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                return RouteDecision(intent, target, match.groupdict().get("argument"), "pattern", 1.0)
+
+        if self.embedding_service is None or len(text.split()) > self.max_embedding_words:
+            return None
+        return self._nearest_prototype(text)
+
+    def _nearest_prototype(self, text):
+        prototypes = self._prototypes()
+        if prototypes is None:
+            return None
+
+        vector = self.embedding_service.encode(text)
+        if not vector:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+
+        similarities = prototypes @ (vector / norm)
+        best = int(np.argmax(similarities))
+        confidence = float(similarities[best])
+        if confidence < self.similarity_threshold:
+            return None
+        intent, target = self._prototype_labels[best]
+        return RouteDecision(intent, target, None, "embedding", confidence)
+
+    def _prototypes(self):
+        """Encode the prototype phrases once (lazily, on first use)."""
+        if self._prototype_matrix is not None:
+            return self._prototype_matrix
+
+        with self._prototype_lock:
+            if self._prototype_matrix is None:
+                labels, phrases = [], []
+                for label, examples in INTENT_PROTOTYPES.items():
+                    labels.extend([label] * len(examples))
+                    phrases.extend(examples)
+
+                vectors = self.embedding_service.encode_batch(phrases)
+                if not vectors or any(not vector for vector in vectors):
+                    print("Warning: could not encode intent prototypes; using patterns only")
+                    self.embedding_service = None
+                    return None
+
+                matrix = np.asarray(vectors, dtype=np.float32)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                self._prototype_labels = labels
+                self._prototype_matrix = matrix
+        return self._prototype_matrix
+
+    def record(self, decision, elapsed):
+        """
+        Record how a message was handled.
+
+        Args:
+            decision: The RouteDecision used, or None for the orchestrator fallback
+            elapsed: Seconds spent handling the message
+        """
+        with self._lock:
+            self._stats["messages"] += 1
+            if decision is None:
+                self._stats["fallback"] += 1
+                self._stats["fallback_time"] += elapsed
+                return
+
+            self._stats["routed"] += 1
+            self._stats["routed_time"] += elapsed
+            self._stats["by_method"][decision.method] += 1
+            intent_stats = self._stats["by_intent"].setdefault(
+                decision.intent, {"count": 0, "total_time": 0.0}
+            )
+            intent_stats["count"] += 1
+            intent_stats["total_time"] += elapsed
+
+    def get_stats(self):
+        """
+        Hit rate and latency figures.
+
+        The latency saved is an estimate: each routed message is assumed to
+        have cost the mean latency of messages that went to the orchestrator.
+        """
+        with self._lock:
+            stats = {
+                "messages": self._stats["messages"],
+                "routed": self._stats["routed"],
+                "fallback": self._stats["fallback"],
+                "by_method": dict(self._stats["by_method"]),
+                "by_intent": {
+                    intent: {
+                        "count": values["count"],
+                        "avg_ms": values["total_time"] * 1000.0 / values["count"]
+                    }
+                    for intent, values in self._stats["by_intent"].items()
+                }
+            }
+            routed_time = self._stats["routed_time"]
+            fallback_time = self._stats["fallback_time"]
+
+        routed, fallback = stats["routed"], stats["fallback"]
+        stats["hit_rate"] = routed / stats["messages"] if stats["messages"] else 0.0
+        stats["avg_routed_ms"] = routed_time * 1000.0 / routed if routed else 0.0
+        stats["avg_fallback_ms"] = fallback_time * 1000.0 / fallback if fallback else None
+        if fallback:
+            stats["estimated_saved_ms"] = max(0.0, routed * stats["avg_fallback_ms"] - routed_time * 1000.0)
+        else:
+            stats["estimated_saved_ms"] = None
+        return stats
@@ -0,0 +1,433 @@
+# cognisphere_adk/services/lexical_index.py
+"""
+BM25 inverted index over memory content.
+
+Kept next to the Chroma "memories" collection (one SQLite file in the
+database directory) so exact names, IDs and rare words can be found even
+when their embeddings rank poorly.
+
+Postings are stored compactly: for each term, blocks of up to BLOCK_SIZE
+(document delta, term frequency) pairs encoded as varints. Adding a
+document only rewrites the last block of each of its terms, so the index
+is updated incrementally on every add. Document lengths and term
+statistics are kept in memory; postings are read from disk per query term.
+
+Removing (or re-indexing) a document takes it out of the document frequency
+of its terms right away, but its postings stay in their blocks and are
+skipped at query time. A term is compacted (its blocks rewritten without
+them) once the deleted share of its postings exceeds COMPACT_RATIO.
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+
+import numpy as np
+
+BLOCK_SIZE = 128
+# Deleted share of a term's postings above which its blocks are rewritten
+COMPACT_RATIO = 0.2
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by for from had has have he her his i if in into is it its me my
+of on or our she so than that the their them then there these they this to too was we were what
+when where which who will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords."""
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if token not in STOPWORDS]
+
+
+def encode_varints(values):
+    """Encode non-negative integers as LEB128 varints."""
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_varints(data):
+    """Decode a varint byte string into an int64 array (vectorized)."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if raw.size == 0:
+        return np.empty(0, dtype=np.int64)
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = (np.arange(raw.size) - starts[group]) * 7
+    return np.add.reduceat((raw & 0x7F).astype(np.int64) << shifts, starts)
+
+
+class BM25Index:
+    """Incremental BM25 index persisted in SQLite."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS docs (
+            doc_num INTEGER PRIMARY KEY,
+            memory_id TEXT UNIQUE,
+            length INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            terms TEXT
+        );
+        CREATE TABLE IF NOT EXISTS terms (
+            term TEXT PRIMARY KEY,
+            df INTEGER NOT NULL,
+            blocks INTEGER NOT NULL,
+            last_count INTEGER NOT NULL,
+            last_doc INTEGER NOT NULL,
+            dead INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            block INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (term, block)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_file, k1=1.2, b=0.75):
+        """
+        Args:
+            db_file: SQLite file holding the index
+            k1: BM25 term-frequency saturation
+            b: BM25 document-length normalization
+        """
+        self.db_file = db_file
+        self.k1 = k1
+        self.b = b
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._migrate()
+        self._load_state()
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            self._record_terms()
+        self.queries = 0
+
+    def _migrate(self):
+        """Add the columns of documents' terms and terms' dead postings to older indexes."""
+        for table, column, definition in (("docs", "terms", "TEXT"),
+                                          ("terms", "dead", "INTEGER NOT NULL DEFAULT 0")):
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _record_terms(self):
+        """
+        One-off upgrade of an index built before documents' terms were recorded.
+
+        Rebuilds the terms of live documents and the df and dead counts of every
+        term from the postings, then compacts.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                deleted = np.frombuffer(self._deleted, dtype=np.uint8)
+                doc_terms = {}
+                for term, state in self._terms.items():
+                    data = b"".join(row[0] for row in self._conn.execute(
+                        "SELECT data FROM postings WHERE term = ? ORDER BY block", (term,)))
+                    doc_nums = np.cumsum(decode_varints(data)[0::2])
+                    dead = int(deleted[doc_nums].sum())
+                    for doc_num in doc_nums[deleted[doc_nums] == 0].tolist():
+                        doc_terms.setdefault(doc_num, []).append(term)
+                    self._save_term(term, [len(doc_nums) - dead, state[1], state[2], state[3], dead])
+                self._conn.executemany("UPDATE docs SET terms = ? WHERE doc_num = ?",
+                                       ((" ".join(terms), doc_num) for doc_num, terms in doc_terms.items()))
+                for term in [term for term, state in self._terms.items()
+                             if state[4] > COMPACT_RATIO * (state[0] + state[4])]:
+                    self._compact_term(term)
+                self._conn.execute("PRAGMA user_version = 1")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._load_state()
+                raise
+
+    def _load_state(self):
+        """Load term statistics and document lengths from disk."""
+        # term -> [df, blocks, last_count, last_doc, dead]
+        self._terms = {
+            term: [df, blocks, last_count, last_doc, dead]
+            for term, df, blocks, last_count, last_doc, dead in self._conn.execute(
+                "SELECT term, df, blocks, last_count, last_doc, dead FROM terms")
+        }
+        # Comprimento e remoção por doc_num (doc_num são sequenciais a partir de 0)
+        self._lengths = array("I")
+        self._deleted = bytearray()
+        for length, deleted in self._conn.execute("SELECT length, deleted FROM docs ORDER BY doc_num"):
+            self._lengths.append(length)
+            self._deleted.append(deleted)
+        self._live_docs = len(self._deleted) - sum(self._deleted)
+        self._total_length = sum(length for length, deleted in zip(self._lengths, self._deleted) if not deleted)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        return self._live_docs
+
+    def add(self, memory_id, text):
+        """Index (or re-index) one memory."""
+        self.add_many([(memory_id, text)])
+
+    def add_many(self, items):
+        """
+        Index several memories in one transaction.
+
+        Args:
+            items: Iterable of (memory_id, text); memories already indexed are replaced
+        """
+        items = list(dict(items).items())
+        if not items:
+            return
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._remove_locked([memory_id for memory_id, _ in items])
+
+                new_postings = {}
+                for memory_id, text in items:
+                    tokens = tokenize(text)
+                    counts = Counter(tokens)
+                    doc_num = len(self._lengths)
+                    # Distinct terms are kept so removing the document can update their df
+                    self._conn.execute("INSERT INTO docs (doc_num, memory_id, length, terms) VALUES (?, ?, ?, ?)",
+                                       (doc_num, memory_id, len(tokens), " ".join(counts)))
+                    self._lengths.append(len(tokens))
+                    self._deleted.append(0)
+                    self._live_docs += 1
+                    self._total_length += len(tokens)
+                    for term, tf in counts.items():
+                        new_postings.setdefault(term, []).append((doc_num, tf))
+
+                for term, postings in new_postings.items():
+                    self._append_postings(term, postings)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._load_state()
+                raise
+
+    def _append_postings(self, term, postings):
+        """Append (doc_num, tf) pairs to a term, filling its last block first (caller holds the lock)."""
+        state = self._terms.get(term) or [0, 0, 0, 0, 0]
+        df, blocks, last_count, last_doc, dead = state
+
+        # Deltas continue across blocks, so the blocks of a term decode as one stream
+        pairs = []
+        for doc_num, tf in postings:
+            pairs.append((doc_num - last_doc, tf))
+            last_doc = doc_num
+
+        start = 0
+        if blocks and last_count < BLOCK_SIZE:
+            take = min(BLOCK_SIZE - last_count, len(pairs))
+            (data,) = self._conn.execute("SELECT data FROM postings WHERE term = ? AND block = ?",
+                                         (term, blocks - 1)).fetchone()
+            data += encode_varints(value for pair in pairs[:take] for value in pair)
+            self._conn.execute("UPDATE postings SET data = ? WHERE term = ? AND block = ?",
+                               (data, term, blocks - 1))
+            last_count += take
+            start = take
+
+        while start < len(pairs):
+            chunk = pairs[start:start + BLOCK_SIZE]
+            self._conn.execute("INSERT INTO postings (term, block, data) VALUES (?, ?, ?)",
+                               (term, blocks, encode_varints(value for pair in chunk for value in pair)))
+            blocks += 1
+            last_count = len(chunk)
+            start += len(chunk)
+
+        state = [df + len(postings), blocks, last_count, last_doc, dead]
+        self._save_term(term, state)
+
+    def _save_term(self, term, state):
+        self._terms[term] = state
+        self._conn.execute("INSERT OR REPLACE INTO terms (term, df, blocks, last_count, last_doc, dead) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", (term, *state))
+
+    def remove(self, memory_ids):
+        """Remove memories from the index (their postings are skipped from then on)."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._remove_locked(memory_ids)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._load_state()
+                raise
+
+    def _remove_locked(self, memory_ids):
+        memory_ids = list(memory_ids)
+        removed_terms = Counter()
+        for start in range(0, len(memory_ids), 500):
+            chunk = memory_ids[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT doc_num, terms FROM docs WHERE memory_id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for doc_num, terms in rows:
+                if not self._deleted[doc_num]:
+                    self._deleted[doc_num] = 1
+                    self._live_docs -= 1
+                    self._total_length -= self._lengths[doc_num]
+                    removed_terms.update((terms or "").split())
+            if rows:
+                self._conn.executemany("UPDATE docs SET deleted = 1, memory_id = NULL, terms = NULL "
+                                       "WHERE doc_num = ?", [(doc_num,) for doc_num, _ in rows])
+
+        for term, count in removed_terms.items():
+            state = self._terms.get(term)
+            if state is None:
+                continue
+            df, blocks, last_count, last_doc, dead = state
+            state = [max(df - count, 0), blocks, last_count, last_doc, dead + count]
+            if state[4] > COMPACT_RATIO * (state[0] + state[4]):
+                self._compact_term(term)
+            else:
+                self._save_term(term, state)
+
+    def compact(self, ratio=COMPACT_RATIO):
+        """
+        Rewrite the postings of terms whose deleted share exceeds ratio.
+
+        Terms are also compacted as they cross COMPACT_RATIO on removal; a
+        lower ratio here (0 rewrites every term with deleted postings)
+        reclaims the rest.
+
+        Returns:
+            int: Number of terms rewritten
+        """
+        with self._lock:
+            candidates = [term for term, state in self._terms.items()
+                          if state[4] and state[4] > ratio * (state[0] + state[4])]
+            if not candidates:
+                return 0
+            self._conn.execute("BEGIN")
+            try:
+                rewritten = sum(self._compact_term(term) for term in candidates)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._load_state()
+                raise
+            return rewritten
+
+    def _compact_term(self, term):
+        """
+        Rewrite a term's blocks without the postings of deleted documents (caller holds the lock).
+
+        Returns:
+            int: 1 if the term's postings changed, else 0
+        """
+        data = b"".join(row[0] for row in self._conn.execute(
+            "SELECT data FROM postings WHERE term = ? ORDER BY block", (term,)))
+        values = decode_varints(data)
+        doc_nums = np.cumsum(values[0::2])
+        tf = values[1::2]
+        live = np.frombuffer(self._deleted, dtype=np.uint8)[doc_nums] == 0
+        if live.all():
+            state = self._terms[term]
+            if state[0] != len(doc_nums) or state[4]:
+                self._save_term(term, [len(doc_nums), state[1], state[2], state[3], 0])
+            return 0
+
+        self._conn.execute("DELETE FROM postings WHERE term = ?", (term,))
+        doc_nums, tf = doc_nums[live], tf[live]
+        if not len(doc_nums):
+            del self._terms[term]
+            self._conn.execute("DELETE FROM terms WHERE term = ?", (term,))
+            return 1
+
+        deltas = np.diff(doc_nums, prepend=0)
+        pairs = np.column_stack((deltas, tf)).tolist()
+        blocks = 0
+        for start in range(0, len(pairs), BLOCK_SIZE):
+            chunk = pairs[start:start + BLOCK_SIZE]
+            self._conn.execute("INSERT INTO postings (term, block, data) VALUES (?, ?, ?)",
+                               (term, blocks, encode_varints(value for pair in chunk for value in pair)))
+            blocks += 1
+        self._save_term(term, [len(doc_nums), blocks, len(pairs) - (blocks - 1) * BLOCK_SIZE,
+                               int(doc_nums[-1]), 0])
+        return 1
+
+    def memory_ids(self):
+        """Set of indexed memory IDs."""
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT memory_id FROM docs WHERE deleted = 0")}
+
+    def search(self, query, n_results=10):
+        """
+        Rank memories for a query with BM25.
+
+        Returns:
+            list: (memory_id, score) pairs, best first
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            self.queries += 1
+            known = [term for term in terms if term in self._terms]
+            if not known or not self._live_docs:
+                return []
+
+            docs_parts, score_parts = [], []
+            avg_length = self._total_length / self._live_docs or 1.0
+            for term in known:
+                df = self._terms[term][0]
+                data = b"".join(row[0] for row in self._conn.execute(
+                    "SELECT data FROM postings WHERE term = ? ORDER BY block", (term,)))
+                values = decode_varints(data)
+                doc_nums = np.cumsum(values[0::2])
+                tf = values[1::2].astype(np.float64)
+                idf = math.log(1.0 + (self._live_docs - df + 0.5) / (df + 0.5))
+                lengths = np.frombuffer(self._lengths, dtype=np.uint32)[doc_nums]
+                norm = self.k1 * (1.0 - self.b + self.b * lengths / avg_length)
+                docs_parts.append(doc_nums)
+                score_parts.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+
+            doc_nums, inverse = np.unique(np.concatenate(docs_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+            live = np.frombuffer(self._deleted, dtype=np.uint8)[doc_nums] == 0
+            doc_nums, scores = doc_nums[live], scores[live]
+
+            k = min(n_results, len(scores))
+            if k <= 0:
+                return []
+            best = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            best = best[np.argsort(-scores[best], kind="stable")]
+
+            top = doc_nums[best].tolist()
+            rows = dict(self._conn.execute(
+                f"SELECT doc_num, memory_id FROM docs WHERE doc_num IN ({','.join('?' * len(top))})", top))
+        return [(rows[doc_num], float(score)) for doc_num, score in zip(top, scores[best].tolist())]
+
+    def get_stats(self):
+        with self._lock:
+            (postings_bytes,) = self._conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM postings").fetchone()
+            return {
+                "documents": self._live_docs,
+                "terms": len(self._terms),
+                "deleted_postings": sum(state[4] for state in self._terms.values()),
+                "postings_bytes": postings_bytes,
+                "avg_doc_length": self._total_length / self._live_docs if self._live_docs else 0.0,
+                "queries": self.queries
+            }
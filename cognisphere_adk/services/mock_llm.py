@@ -0,0 +1,399 @@
+# cognisphere_adk/services/mock_llm.py
+"""
+Offline stand-in for the LLM backend.
+
+Registered with LiteLLM as the custom provider "mock", so agents built with
+LiteLlm(model="mock/<agent>") (see config.MODEL_CONFIG with
+COGNISPHERE_LLM_BACKEND=mock) run the whole pipeline without network access.
+
+Responses are deterministic: the same conversation always produces the same
+reply and the same simulated latency. They come from a script of rules
+matched against the latest user message (or the latest tool result); the
+built-in script drives the orchestrator, memory and narrative agents through
+their tools. A JSON script file can add rules and per-agent latency:
+
+    {
+      "latency": {"default": {"distribution": "lognormal", "mean_ms": 400, "stddev_ms": 150},
+                  "memory": {"distribution": "constant", "mean_ms": 100}},
+      "rules": [
+        {"agent": "memory", "match": "(?i)^note (?P<content>.+)",
+         "tool_call": {"name": "create_memory", "args": {"content": "{content}", "memory_type": "explicit"}}},
+        {"agent": "*", "on": "tool_result", "tool": "create_memory", "text": "Saved as {memory_id}."}
+      ]
+    }
+
+"match" and "unless" are regexes searched in the user message. Templates
+can use {message}, the rule's named groups and, for tool results,
+{tool_name}, {tool_result} and the top-level keys of the result.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from string import Formatter
+
+import litellm
+from litellm import CustomLLM
+from litellm.types.utils import ChatCompletionMessageToolCall, Choices, Function, Message, ModelResponse, Usage
+
+PROVIDER = "mock"
+CONTEXT_PREFIX = "For context:"
+
+MEMORY_WORDS = r"(?i)\b(remember|recall|memor(?:y|ies|ize)|forget)\b"
+NARRATIVE_WORDS = r"(?i)\b(story|stories|narratives?|threads?)\b"
+
+# Rules are tried in order after any scripted ones; the first that applies wins
+DEFAULT_RULES = [
+    # Orchestrator: delegate memory and narrative requests, otherwise read the emotion
+    {"agent": "orchestrator", "match": MEMORY_WORDS,
+     "tool_call": {"name": "transfer_to_agent", "args": {"agent_name": "memory_agent"}}},
+    {"agent": "orchestrator", "match": NARRATIVE_WORDS,
+     "tool_call": {"name": "transfer_to_agent", "args": {"agent_name": "narrative_agent"}}},
+    {"agent": "orchestrator", "tool_call": {"name": "analyze_emotion", "args": {"text": "{message}"}}},
+    {"agent": "orchestrator", "on": "tool_result", "tool": "analyze_emotion",
+     "text": "Thanks for sharing that. I sense {emotion_type} in what you said. How can I help?"},
+
+    # Sub-agents hand unrelated requests back to the orchestrator
+    {"agent": "memory", "unless": MEMORY_WORDS,
+     "tool_call": {"name": "transfer_to_agent", "args": {"agent_name": "cognisphere_orchestrator"}}},
+    {"agent": "narrative", "unless": NARRATIVE_WORDS,
+     "tool_call": {"name": "transfer_to_agent", "args": {"agent_name": "cognisphere_orchestrator"}}},
+
+    # Memory agent: store explicit "remember ..." requests, recall for everything else
+    {"agent": "memory", "match": r"(?i)^\s*(?:please\s+)?(?:remember|memorize)\s+(?:that\s+)?(?P<content>.+?)[.!]*$",
+     "tool_call": {"name": "create_memory", "args": {"content": "{content}", "memory_type": "explicit"}}},
+    {"agent": "memory", "tool_call": {"name": "recall_memories", "args": {"query": "{message}"}}},
+    {"agent": "memory", "on": "tool_result", "tool": "create_memory", "text": "I've stored that memory for you."},
+    {"agent": "memory", "on": "tool_result", "tool": "recall_memories", "text": "I found {count} related memories."},
+
+    # Narrative agent: list threads when asked, otherwise open a thread for the message
+    {"agent": "narrative", "match": r"(?i)\b(list|show|active|which)\b",
+     "tool_call": {"name": "get_active_threads", "args": {}}},
+    {"agent": "narrative", "tool_call": {"name": "create_narrative_thread",
+                                         "args": {"title": "{message:.60}", "theme": "general"}}},
+    {"agent": "narrative", "on": "tool_result", "tool": "create_narrative_thread",
+     "text": "I've started a new narrative thread ({thread_id})."},
+    {"agent": "narrative", "on": "tool_result", "tool": "get_active_threads",
+     "text": "There are {count} active narrative threads."},
+
+    # Anything else
+    {"agent": "*", "on": "tool_result", "text": "Done."},
+    {"agent": "*", "text": "I understand."}
+]
+
+
+class LatencyModel:
+    """Simulated time to first token plus a per-token delay for streaming."""
+
+    def __init__(self, distribution="lognormal", mean_ms=400.0, stddev_ms=150.0, min_ms=0.0, max_ms=None,
+                 token_ms=15.0):
+        """
+        Args:
+            distribution: constant, uniform (min_ms..max_ms), normal or lognormal
+            mean_ms: Mean time to first token
+            stddev_ms: Standard deviation (normal, lognormal)
+            min_ms: Lower bound for every sample
+            max_ms: Upper bound (optional; required for uniform)
+            token_ms: Delay between streamed tokens
+        """
+        if distribution not in ("constant", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        if distribution == "uniform" and max_ms is None:
+            raise ValueError("Uniform latency needs max_ms")
+        self.distribution = distribution
+        self.mean_ms = float(mean_ms)
+        self.stddev_ms = float(stddev_ms)
+        self.min_ms = float(min_ms)
+        self.max_ms = None if max_ms is None else float(max_ms)
+        self.token_ms = float(token_ms)
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**values)
+
+    def sample(self, rng):
+        """Return a first-token latency in seconds drawn with rng."""
+        if self.distribution == "constant":
+            value = self.mean_ms
+        elif self.distribution == "uniform":
+            value = rng.uniform(self.min_ms, self.max_ms)
+        elif self.distribution == "normal":
+            value = rng.gauss(self.mean_ms, self.stddev_ms)
+        else:
+            # Parameters of the underlying normal, so the samples have the requested mean and stddev
+            mean = max(self.mean_ms, 1e-6)
+            sigma2 = math.log(1.0 + (self.stddev_ms / mean) ** 2)
+            value = rng.lognormvariate(math.log(mean) - sigma2 / 2.0, math.sqrt(sigma2))
+
+        value = max(self.min_ms, value)
+        if self.max_ms is not None:
+            value = min(self.max_ms, value)
+        return value / 1000.0
+
+
+class _TemplateValues(dict):
+    """Leaves unknown {placeholders} empty instead of raising."""
+
+    def __missing__(self, key):
+        return ""
+
+
+def _render(template, values):
+    if isinstance(template, str):
+        try:
+            return Formatter().vformat(template, (), values)
+        except (ValueError, IndexError):
+            return template
+    if isinstance(template, dict):
+        return {key: _render(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_render(value, values) for value in template]
+    return template
+
+
+def _message_text(message):
+    content = message.get("content")
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+class MockLLM(CustomLLM):
+    """Scripted, deterministic LiteLLM provider."""
+
+    def __init__(self, rules=None, latency=None, seed=0, use_default_rules=True):
+        """
+        Args:
+            rules: Scripted rules, tried before the built-in ones
+            latency: Dict of agent name (or "default") -> LatencyModel or its kwargs
+            seed: Changes every simulated latency and call ID
+            use_default_rules: Fall back to DEFAULT_RULES when no scripted rule applies
+        """
+        super().__init__()
+        self.seed = seed
+        self.rules = [self._compile_rule(rule) for rule in (rules or [])]
+        if use_default_rules:
+            self.rules += [self._compile_rule(rule) for rule in DEFAULT_RULES]
+
+        latency = dict(latency or {})
+        latency.setdefault("default", LatencyModel())
+        self.latency = {
+            agent: model if isinstance(model, LatencyModel) else LatencyModel.from_dict(model)
+            for agent, model in latency.items()
+        }
+        self.calls = 0
+
+    @classmethod
+    def from_script(cls, path, **kwargs):
+        """Build a MockLLM from a JSON script file (rules and latency)."""
+        with open(path, "r", encoding="utf-8") as f:
+            script = json.load(f)
+        latency = dict(kwargs.pop("latency", None) or {})
+        latency.update(script.get("latency", {}))
+        return cls(rules=script.get("rules", []), latency=latency, **kwargs)
+
+    @staticmethod
+    def _compile_rule(rule):
+        if ("text" in rule) == ("tool_call" in rule):
+            raise ValueError(f"Mock LLM rule needs exactly one of 'text' or 'tool_call': {rule}")
+        compiled = dict(rule)
+        compiled.setdefault("agent", "*")
+        compiled.setdefault("on", "user")
+        compiled["pattern"] = re.compile(rule["match"]) if rule.get("match") else None
+        compiled["exclude"] = re.compile(rule["unless"]) if rule.get("unless") else None
+        return compiled
+
+    # --- Script evaluation ---
+
+    def respond(self, model, messages, tools=None):
+        """
+        Decide the reply for a conversation.
+
+        Returns:
+            tuple: (text or None, tool call dict {"id", "name", "args"} or None)
+        """
+        agent = model.split("/", 1)[-1]
+        offered = {tool["function"]["name"] for tool in (tools or []) if tool.get("function")}
+
+        # Latest real user message (context notes about other agents are also sent as user messages)
+        user_index, user_text = -1, ""
+        for index in range(len(messages) - 1, -1, -1):
+            message = messages[index]
+            if message.get("role") == "user" and not _message_text(message).startswith(CONTEXT_PREFIX):
+                user_index, user_text = index, _message_text(message).strip()
+                break
+
+        values = _TemplateValues(message=user_text)
+        event = "user"
+        if messages and messages[-1].get("role") == "tool" and len(messages) - 1 > user_index:
+            event = "tool_result"
+            values.update(self._tool_result_values(messages))
+
+        for rule in self.rules:
+            if rule["on"] != event or rule["agent"] not in ("*", agent):
+                continue
+            if event == "tool_result" and rule.get("tool") not in (None, values["tool_name"]):
+                continue
+            groups = {}
+            if rule["pattern"] is not None:
+                match = rule["pattern"].search(user_text)
+                if not match:
+                    continue
+                groups = {key: value for key, value in match.groupdict().items() if value is not None}
+            if rule["exclude"] is not None and rule["exclude"].search(user_text):
+                continue
+            if "tool_call" in rule and rule["tool_call"]["name"] not in offered:
+                continue
+
+            rule_values = _TemplateValues(values, **groups)
+            if "text" in rule:
+                return _render(rule["text"], rule_values), None
+            call = rule["tool_call"]
+            return None, {
+                "id": "call_" + self._digest(model, messages, "call")[:24],
+                "name": call["name"],
+                "args": _render(call.get("args", {}), rule_values)
+            }
+
+        return "", None
+
+    @staticmethod
+    def _tool_result_values(messages):
+        result_message = messages[-1]
+        tool_name = ""
+        for message in reversed(messages):
+            for call in message.get("tool_calls") or []:
+                call_id = call.get("id") if isinstance(call, dict) else call.id
+                if call_id == result_message.get("tool_call_id"):
+                    function = call.get("function") if isinstance(call, dict) else call.function
+                    tool_name = function.get("name") if isinstance(function, dict) else function.name
+                    break
+            if tool_name:
+                break
+
+        raw = _message_text(result_message)
+        values = {"tool_name": tool_name, "tool_result": raw[:500]}
+        try:
+            result = json.loads(raw)
+        except (TypeError, ValueError):
+            result = None
+        if isinstance(result, dict):
+            values.update({key: value for key, value in result.items() if isinstance(key, str)})
+        return values
+
+    def _digest(self, model, messages, salt=""):
+        payload = json.dumps([self.seed, model, salt, [(m.get("role"), _message_text(m)) for m in messages]],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _latency_model(self, model):
+        return self.latency.get(model.split("/", 1)[-1], self.latency["default"])
+
+    def _plan(self, model, messages, optional_params):
+        """Reply, usage and simulated delays for one call."""
+        self.calls += 1
+        text, tool_call = self.respond(model, messages, optional_params.get("tools"))
+        latency = self._latency_model(model)
+        rng = random.Random(int(self._digest(model, messages, "latency")[:16], 16))
+
+        prompt_tokens = sum(len(_message_text(message).split()) for message in messages)
+        completion_tokens = len(text.split()) if text else len(json.dumps(tool_call["args"]).split())
+        usage = Usage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                      total_tokens=prompt_tokens + completion_tokens)
+        return text, tool_call, usage, latency.sample(rng), latency.token_ms / 1000.0
+
+    # --- LiteLLM CustomLLM interface ---
+
+    def _model_response(self, model, text, tool_call, usage):
+        tool_calls = None
+        if tool_call:
+            tool_calls = [ChatCompletionMessageToolCall(
+                id=tool_call["id"], type="function",
+                function=Function(name=tool_call["name"], arguments=json.dumps(tool_call["args"]))
+            )]
+        return ModelResponse(
+            model=model,
+            choices=[Choices(
+                index=0,
+                finish_reason="tool_calls" if tool_call else "stop",
+                message=Message(role="assistant", content=text or None, tool_calls=tool_calls)
+            )],
+            usage=usage
+        )
+
+    @staticmethod
+    def _chunks(text, tool_call, usage):
+        """GenericStreamingChunk dicts: one per word of text, or a single tool call."""
+        if tool_call:
+            yield {
+                "text": "",
+                "tool_use": {
+                    "id": tool_call["id"], "type": "function", "index": 0,
+                    "function": {"name": tool_call["name"], "arguments": json.dumps(tool_call["args"])}
+                },
+                "is_finished": True, "finish_reason": "tool_calls", "usage": usage.model_dump(), "index": 0
+            }
+            return
+
+        tokens = re.findall(r"\S+\s*", text) or [""]
+        for i, token in enumerate(tokens):
+            last = i == len(tokens) - 1
+            yield {
+                "text": token, "tool_use": None, "is_finished": last,
+                "finish_reason": "stop" if last else "", "usage": usage.model_dump() if last else None, "index": 0
+            }
+
+    def completion(self, model, messages, *args, optional_params=None, **kwargs):
+        text, tool_call, usage, delay, _ = self._plan(model, messages, optional_params or kwargs)
+        time.sleep(delay)
+        return self._model_response(model, text, tool_call, usage)
+
+    async def acompletion(self, model, messages, *args, optional_params=None, **kwargs):
+        text, tool_call, usage, delay, _ = self._plan(model, messages, optional_params or kwargs)
+        await asyncio.sleep(delay)
+        return self._model_response(model, text, tool_call, usage)
+
+    def streaming(self, model, messages, *args, optional_params=None, **kwargs):
+        text, tool_call, usage, delay, token_delay = self._plan(model, messages, optional_params or kwargs)
+        time.sleep(delay)
+        for i, chunk in enumerate(self._chunks(text, tool_call, usage)):
+            if i:
+                time.sleep(token_delay)
+            yield chunk
+
+    async def astreaming(self, model, messages, *args, optional_params=None, **kwargs):
+        text, tool_call, usage, delay, token_delay = self._plan(model, messages, optional_params or kwargs)
+        await asyncio.sleep(delay)
+        for i, chunk in enumerate(self._chunks(text, tool_call, usage)):
+            if i:
+                await asyncio.sleep(token_delay)
+            yield chunk
+
+
+def register_mock_llm(script_path=None, latency=None, seed=0):
+    """
+    Register the mock provider with LiteLLM (models "mock/<agent>").
+
+    Args:
+        script_path: Optional JSON script with extra rules and per-agent latency
+        latency: Default LatencyModel kwargs (used for agents the script doesn't set)
+        seed: Seed for simulated latencies and call IDs
+
+    Returns:
+        MockLLM: The registered handler
+    """
+    latency = {"default": latency} if latency else None
+    if script_path:
+        handler = MockLLM.from_script(script_path, latency=latency, seed=seed)
+    else:
+        handler = MockLLM(latency=latency, seed=seed)
+
+    litellm.custom_provider_map = [
+        item for item in litellm.custom_provider_map if item.get("provider") != PROVIDER
+    ] + [{"provider": PROVIDER, "custom_handler": handler}]
+    litellm.utils.custom_llm_setup()
+    return handler
@@ -37,8 +37,10 @@ class OpenRouterConfig:
                     dotenv.load_dotenv(path)
                     break
 
-        # API Key Configuration
-        self.api_key = self._get_api_key()
+        # API Key Configuration (not needed with the offline mock backend)
+        self.api_key = self._get_api_key(
+            required=os.environ.get("COGNISPHERE_LLM_BACKEND", "openrouter").lower() != "mock"
+        )
 
         # Default Model Configurations
         self.default_models: Dict[str, str] = {
@@ -69,10 +71,13 @@ class OpenRouterConfig:
             "top_p": float(os.environ.get("OPENROUTER_TOP_P", 0.9))
         }
 
-    def _get_api_key(self) -> str:
+    def _get_api_key(self, required: bool = True) -> str:
         """
         Retrieve OpenRouter API key with multiple fallback methods
 
+        Args:
+            required: Raise if no key is found (otherwise return "")
+
         Returns:
             OpenRouter API key or raises ValueError
         """
@@ -88,6 +93,9 @@ class OpenRouterConfig:
             if key and key.strip():
                 return key
 
+        if not required:
+            return ""
+
         raise ValueError(
             "No OpenRouter API key found. "
             "Set OPENROUTER_API_KEY in environment variables."
@@ -111,8 +111,9 @@ class OpenRouterIntegration:
             logger.error(f"Async connection test failed for {model}: {e}")
             return error_result
 
-# Initialize on import
+# Initialize on import (skipped with the offline mock backend)
 try:
-    OpenRouterIntegration.configure_openrouter()
+    if os.getenv("COGNISPHERE_LLM_BACKEND", "openrouter").lower() != "mock":
+        OpenRouterIntegration.configure_openrouter()
 except Exception as e:
     logger.error(f"Initialization error: {e}")
\ No newline at end of file
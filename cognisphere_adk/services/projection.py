@@ -0,0 +1,73 @@
+# cognisphere_adk/services/projection.py
+"""
+PCA projection of memory embeddings for the NumPy vector store.
+
+A projection is fitted on a sample of stored (unit) vectors: their mean and
+the top principal directions W. Stored vectors are kept as y = W^T (x - mean)
+and a query q as z = W^T q, so
+
+    q . x = q . mean + q . (x - mean) ~ q . mean + z . y
+
+scores every row with a product in the reduced dimension while staying on
+the same cosine scale as the full vectors (distances remain comparable).
+"""
+
+import numpy as np
+
+
+class PCAProjection:
+    """Mean and principal components fitted on a sample of vectors."""
+
+    def __init__(self, mean=None, components=None, explained_variance=0.0, fitted_rows=0, version=0):
+        self.mean = mean
+        # (dim, dims): columns are the principal directions
+        self.components = components
+        self.explained_variance = explained_variance
+        self.fitted_rows = fitted_rows
+        self.version = version
+
+    @property
+    def dims(self):
+        return self.components.shape[1]
+
+    def fit(self, sample, dims):
+        """
+        Args:
+            sample: Sample of stored vectors (rows)
+            dims: Output dimension (capped at the input dimension)
+        """
+        sample = np.asarray(sample, dtype=np.float64)
+        dims = min(dims, sample.shape[1])
+        self.mean = sample.mean(axis=0)
+        covariance = np.cov(sample - self.mean, rowvar=False)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1]
+        self.components = eigenvectors[:, order[:dims]].astype(np.float32)
+        total = eigenvalues.clip(min=0).sum()
+        self.explained_variance = float(eigenvalues[order[:dims]].clip(min=0).sum() / total) if total else 1.0
+        self.mean = self.mean.astype(np.float32)
+        self.fitted_rows = len(sample)
+        return self
+
+    def transform(self, vectors):
+        """Reduced stored vectors (rows)."""
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components
+
+    def transform_queries(self, queries):
+        """
+        Returns:
+            tuple: (reduced queries, per-query offset q . mean to add to the reduced scores)
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        return queries @ self.components, queries @ self.mean
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, mean=self.mean, components=self.components, explained_variance=self.explained_variance,
+                     fitted_rows=self.fitted_rows, version=self.version)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["mean"], data["components"], float(data["explained_variance"]),
+                       int(data["fitted_rows"]), int(data["version"]))
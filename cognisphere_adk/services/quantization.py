@@ -0,0 +1,320 @@
+# cognisphere_adk/services/quantization.py
+"""
+Compressed embedding codes for the NumPy vector store.
+
+ScalarQuantizer maps every dimension to int8 with its own scale and offset,
+calibrated on a sample of stored vectors (x ~ offset + scale * code). A
+query is scored against the codes directly: the scale is folded into the
+query once, so a dot product is q . offset + (q * scale) . code, computed on
+blocks of codes that are widened in cache. Only 1 byte per dimension is read
+from the memory-mapped code file instead of 4.
+
+IVFPQ is for stores that outgrow RAM even at 1 byte per dimension. Vectors
+are assigned to the nearest of nlist coarse centroids (inverted lists) and
+their residual to that centroid is product-quantized: split into m
+sub-vectors, each replaced by the index of its nearest codeword (1 byte per
+sub-vector). A query only visits the nprobe lists whose centroids score
+highest, and scores their codes with asymmetric distance computation: one
+(m, 256) table of query/codeword dot products per query, then a table
+lookup and sum per code. Both are trained offline with k-means on a sample.
+"""
+
+import numpy as np
+
+# Rows of codes widened to float32 at a time when scoring; small enough for the
+# widened block to stay in cache (larger blocks make the scan slower than float32)
+BLOCK_ROWS = 1024
+
+
+def recall_at_k(truth, found, k):
+    """
+    Mean fraction of the true top-k found in the approximate top-k.
+
+    Args:
+        truth: Per query, row numbers of the exact top-k
+        found: Per query, row numbers returned by the approximate search
+        k: Cut-off
+
+    Returns:
+        float: recall@k in [0, 1]
+    """
+    hits, total = 0, 0
+    for exact, approximate in zip(truth, found):
+        exact = list(exact)[:k]
+        hits += len(set(exact) & set(list(approximate)[:k]))
+        total += len(exact)
+    return hits / total if total else 1.0
+
+
+class ScalarQuantizer:
+    """Per-dimension int8 scalar quantization."""
+
+    LEVELS = 127
+
+    def __init__(self, offset=None, scale=None, trained_rows=0):
+        self.offset = offset
+        self.scale = scale
+        self.trained_rows = trained_rows
+
+    @property
+    def trained(self):
+        return self.offset is not None
+
+    def fit(self, vectors, quantile=0.001):
+        """
+        Calibrate scale and offset per dimension.
+
+        Args:
+            vectors: Sample of stored vectors (rows)
+            quantile: Fraction of values clipped at each end of a dimension's range,
+                so a few outliers don't stretch the step of every other value
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) > 1 and quantile:
+            low, high = np.quantile(vectors, [quantile, 1.0 - quantile], axis=0)
+        else:
+            low, high = vectors.min(axis=0), vectors.max(axis=0)
+        self.offset = ((high + low) / 2.0).astype(np.float32)
+        self.scale = np.maximum((high - low) / (2.0 * self.LEVELS), 1e-6).astype(np.float32)
+        self.trained_rows = len(vectors)
+        return self
+
+    def encode(self, vectors):
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.offset) / self.scale)
+        return np.clip(codes, -self.LEVELS, self.LEVELS).astype(np.int8)
+
+    def decode(self, codes):
+        return self.offset + self.scale * np.asarray(codes, dtype=np.float32)
+
+    def scores(self, codes, queries, rows=None):
+        """
+        Approximate dot products between queries and encoded rows.
+
+        Args:
+            codes: int8 code matrix (may be a memmap)
+            queries: Query vectors (m, dim)
+            rows: Row numbers to score (None: all rows of codes)
+
+        Returns:
+            np.ndarray: (rows, m) float32 scores
+        """
+        folded = (queries * self.scale).T.astype(np.float32)
+        base = queries @ self.offset
+        count = len(codes) if rows is None else len(rows)
+        out = np.empty((count, len(queries)), dtype=np.float32)
+        buffer = np.empty((min(BLOCK_ROWS, count), codes.shape[1]), dtype=np.float32)
+        for start in range(0, count, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, count)
+            block = buffer[:end - start]
+            np.copyto(block, codes[start:end] if rows is None else codes[rows[start:end]], casting="unsafe")
+            np.matmul(block, folded, out=out[start:end])
+        out += base
+        return out
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, offset=self.offset, scale=self.scale, trained_rows=self.trained_rows)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["offset"], data["scale"], int(data["trained_rows"]))
+
+
+def nearest_centroids(vectors, centroids, chunk_rows=8192):
+    """Index of the nearest centroid (L2) for every row."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    squared_norms = (centroids ** 2).sum(axis=1)
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_rows):
+        chunk = vectors[start:start + chunk_rows]
+        labels[start:start + len(chunk)] = np.argmin(squared_norms - 2.0 * (chunk @ centroids.T), axis=1)
+    return labels
+
+
+def kmeans(vectors, k, iterations=20, seed=0):
+    """
+    Lloyd's k-means.
+
+    Args:
+        vectors: Training rows
+        k: Number of centroids (capped at the number of rows)
+        iterations: Assignment/update rounds
+        seed: Seed for the initial centroids and for re-seeding empty clusters
+
+    Returns:
+        np.ndarray: (k, dim) float32 centroids
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest_centroids(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        present = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[present]
+        centroids[present] = np.add.reduceat(vectors[order], starts, axis=0) / counts[present, None]
+        if not present.all():
+            centroids[~present] = vectors[rng.choice(len(vectors), int((~present).sum()))]
+    return centroids
+
+
+class ProductQuantizer:
+    """m sub-quantizers of 256 codewords each: one uint8 code per sub-vector."""
+
+    CODEWORDS = 256
+
+    def __init__(self, codebooks=None):
+        # (m, 256, dim // m)
+        self.codebooks = codebooks
+
+    @property
+    def subquantizers(self):
+        return self.codebooks.shape[0]
+
+    def fit(self, vectors, subquantizers, iterations=20, seed=0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[1] % subquantizers:
+            raise ValueError(f"Dimension {vectors.shape[1]} is not divisible by {subquantizers} sub-quantizers")
+        width = vectors.shape[1] // subquantizers
+        codebooks = np.zeros((subquantizers, self.CODEWORDS, width), dtype=np.float32)
+        for j in range(subquantizers):
+            centroids = kmeans(vectors[:, j * width:(j + 1) * width], self.CODEWORDS, iterations, seed + j)
+            codebooks[j, :len(centroids)] = centroids
+        self.codebooks = codebooks
+        return self
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        m, _, width = self.codebooks.shape
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for j in range(m):
+            codes[:, j] = nearest_centroids(vectors[:, j * width:(j + 1) * width], self.codebooks[j])
+        return codes
+
+    def decode(self, codes):
+        m = self.codebooks.shape[0]
+        return np.concatenate([self.codebooks[j][codes[:, j]] for j in range(m)], axis=1)
+
+    def tables(self, query):
+        """Flat (m * 256) table of dot products between the query's sub-vectors and every codeword."""
+        m, _, width = self.codebooks.shape
+        return np.einsum("jkd,jd->jk", self.codebooks, query.reshape(m, width)).ravel()
+
+    def scores(self, table, codes):
+        """Approximate dot products of the table's query with encoded vectors (ADC)."""
+        offsets = np.arange(codes.shape[1], dtype=np.intp) * self.CODEWORDS
+        return table[codes.astype(np.intp) + offsets].sum(axis=1)
+
+
+class IVFPQ:
+    """Inverted lists over coarse centroids, with product-quantized residuals."""
+
+    def __init__(self, coarse=None, pq=None, trained_rows=0, version=0):
+        self.coarse = coarse
+        self.pq = pq
+        self.trained_rows = trained_rows
+        self.version = version
+        self._lists = []
+
+    @property
+    def trained(self):
+        return self.coarse is not None
+
+    @property
+    def nlist(self):
+        return len(self.coarse)
+
+    def train(self, sample, nlist=1024, subquantizers=48, iterations=20, seed=0):
+        """
+        Fit coarse centroids and sub-quantizer codebooks on a sample of vectors.
+
+        nlist is capped so every list gets at least ~39 training vectors.
+        """
+        sample = np.asarray(sample, dtype=np.float32)
+        nlist = max(1, min(nlist, len(sample) // 39))
+        self.coarse = kmeans(sample, nlist, iterations, seed)
+        residuals = sample - self.coarse[nearest_centroids(sample, self.coarse)]
+        self.pq = ProductQuantizer().fit(residuals, subquantizers, iterations, seed)
+        self.trained_rows = len(sample)
+        self._lists = [[] for _ in range(self.nlist)]
+        return self
+
+    def encode(self, vectors):
+        """
+        Returns:
+            tuple: (list number per vector, (n, m) uint8 residual codes)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        lists = nearest_centroids(vectors, self.coarse)
+        return lists, self.pq.encode(vectors - self.coarse[lists])
+
+    def build_lists(self, assignments):
+        """Rebuild the inverted lists from the list number of every row (-1: not indexed)."""
+        assignments = np.asarray(assignments)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments[assignments >= 0], minlength=self.nlist)
+        bounds = np.concatenate(([0], np.cumsum(counts))) + int((assignments < 0).sum())
+        self._lists = [[order[bounds[i]:bounds[i + 1]]] for i in range(self.nlist)]
+
+    def add_to_lists(self, rows, lists):
+        """Append new rows to their inverted lists (no retraining)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        order = np.argsort(lists, kind="stable")
+        rows, lists = rows[order], np.asarray(lists)[order]
+        bounds = np.flatnonzero(np.diff(lists)) + 1
+        for chunk, label in zip(np.split(rows, bounds), lists[np.concatenate(([0], bounds))]):
+            parts = self._lists[label]
+            parts.append(chunk)
+            if len(parts) > 16:
+                parts[:] = [np.concatenate(parts)]
+
+    def search(self, codes, query, nprobe, mask=None):
+        """
+        Score the rows of the nprobe best lists for one query.
+
+        Args:
+            codes: (rows, m) uint8 code matrix (may be a memmap)
+            query: Normalized query vector
+            nprobe: Number of inverted lists visited
+            mask: Optional boolean array of rows that may be returned
+
+        Returns:
+            tuple: (rows, approximate dot products)
+        """
+        coarse_scores = self.coarse @ query
+        probe = np.argpartition(-coarse_scores, min(nprobe, self.nlist) - 1)[:nprobe]
+        rows_parts, base_parts = [], []
+        for label in probe:
+            parts = self._lists[label]
+            if len(parts) > 1:
+                parts[:] = [np.concatenate(parts)]
+            if parts and len(parts[0]):
+                rows_parts.append(parts[0])
+                base_parts.append(np.full(len(parts[0]), coarse_scores[label], dtype=np.float32))
+        if not rows_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        rows = np.concatenate(rows_parts)
+        base = np.concatenate(base_parts)
+        if mask is not None:
+            keep = mask[rows]
+            rows, base = rows[keep], base[keep]
+        order = np.argsort(rows)  # Sequential reads of the code file
+        rows, base = rows[order], base[order]
+        return rows, base + self.pq.scores(self.pq.tables(query), codes[rows])
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, coarse=self.coarse, codebooks=self.pq.codebooks, trained_rows=self.trained_rows,
+                     version=self.version)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["coarse"], ProductQuantizer(data["codebooks"]), int(data["trained_rows"]),
+                       int(data["version"]))
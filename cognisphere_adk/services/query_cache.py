@@ -0,0 +1,109 @@
+# cognisphere_adk/services/query_cache.py
+"""
+Result cache for memory queries.
+
+Entries are keyed by a hash of the query (embedding bytes or text) and its
+parameters, and tagged with the store generation they were computed at.
+DatabaseService bumps its generation on every write (add or delete), so an
+entry from an older generation is never served; it is dropped on lookup.
+Entries also expire after a TTL, and the least recently used ones are
+evicted beyond max_items.
+"""
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def query_key(kind, query, **params):
+    """
+    Hash a query and its parameters into a cache key.
+
+    Args:
+        kind: Query kind (e.g. "vector", "lexical")
+        query: Query embedding (list/array of floats) or query text
+        params: Other parameters (n_results, where, ...), JSON-serializable
+
+    Returns:
+        bytes: 16-byte digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(kind.encode("utf-8"))
+    if isinstance(query, str):
+        digest.update(b"t" + query.encode("utf-8"))
+    elif query is not None:
+        digest.update(b"v" + np.asarray(query, dtype=np.float32).tobytes())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return digest.digest()
+
+
+class QueryResultCache:
+    """LRU cache of query results tagged with a store generation."""
+
+    def __init__(self, max_items=1024, ttl_s=300.0):
+        """
+        Args:
+            max_items: Maximum number of cached results (0 disables the cache)
+            ttl_s: Seconds an entry stays valid (0 or None: no expiry)
+        """
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "expired": 0, "evictions": 0}
+
+    def get(self, key, generation):
+        """Return a copy of the cached result, or None if missing, stale or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            entry_generation, stored_at, value = entry
+            if entry_generation != generation:
+                del self._entries[key]
+                self._stats["stale"] += 1
+                self._stats["misses"] += 1
+                return None
+            if self.ttl_s and time.monotonic() - stored_at > self.ttl_s:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        # Callers may modify the results (e.g. decoding metadata), so never hand out the cached object
+        return copy.deepcopy(value)
+
+    def put(self, key, generation, value):
+        """Store a result computed at the given generation."""
+        if not self.max_items:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["items"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["max_items"] = self.max_items
+        stats["ttl_s"] = self.ttl_s
+        return stats
@@ -0,0 +1,179 @@
+# cognisphere_adk/services/ranking.py
+"""
+Composite re-ranking of recalled memories.
+
+Candidates over-fetched from the vector store are scored in one vectorized
+pass over columnar arrays:
+
+    score = semantic_weight  * similarity
+          + recency_weight   * recency
+          + emotional_weight * emotional intensity (decayed with age)
+          + self_reference_boost * self_reference
+
+Hybrid recall fuses the vector and lexical (BM25) rankings with reciprocal
+rank fusion before re-ranking.
+"""
+
+import datetime
+import math
+import re
+import time
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400.0
+
+# First-person references mark memories about the self
+SELF_REFERENCE_PATTERN = re.compile(r"\b(i|i'm|i've|i'd|i'll|me|my|mine|myself)\b", re.IGNORECASE)
+
+
+def is_self_referential(text):
+    """Return True if text refers to the self (first-person pronouns)."""
+    return bool(text) and SELF_REFERENCE_PATTERN.search(text) is not None
+
+
+def parse_timestamp(value):
+    """Convert an ISO timestamp (or epoch number) to epoch seconds, None if unknown."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def memory_columns(metadatas, documents, distances):
+    """
+    Build columnar arrays from one Chroma result list.
+
+    Memories stored before the flat metadata fields existed get neutral
+    values: unknown age, score 0.5, self-reference detected from the text.
+
+    Returns:
+        dict: similarity, created_at (NaN if unknown), emotion_score and
+            self_reference arrays, all of length len(metadatas)
+    """
+    count = len(metadatas)
+    created_at = np.full(count, np.nan)
+    emotion_score = np.full(count, 0.5)
+    self_reference = np.zeros(count, dtype=bool)
+
+    for i, (metadata, document) in enumerate(zip(metadatas, documents)):
+        timestamp = metadata.get("created_at")
+        if timestamp is not None:
+            created_at[i] = timestamp
+        score = metadata.get("emotion_score")
+        if score is None and isinstance(metadata.get("emotion_data"), dict):
+            score = metadata["emotion_data"].get("score")
+        if score is not None:
+            emotion_score[i] = score
+        flag = metadata.get("self_reference")
+        self_reference[i] = flag if flag is not None else is_self_referential(document)
+
+    return {
+        "similarity": 1.0 - np.minimum(1.0, np.asarray(distances, dtype=np.float64)),
+        "created_at": created_at,
+        "emotion_score": emotion_score,
+        "self_reference": self_reference
+    }
+
+
+def composite_scores(columns, weights, now=None):
+    """
+    Score candidates with the MEMORY_CONFIG weights.
+
+    Args:
+        columns: Output of memory_columns()
+        weights: Dict with semantic_weight, recency_weight, emotional_weight,
+            self_reference_boost, emotional_decay_rate (per day) and
+            recency_half_life_days
+        now: Reference epoch time (defaults to time.time())
+
+    Returns:
+        numpy.ndarray: One score per candidate
+    """
+    now = time.time() if now is None else now
+    age_days = np.maximum(0.0, (now - columns["created_at"]) / SECONDS_PER_DAY)
+    known_age = ~np.isnan(age_days)
+    age_days = np.where(known_age, age_days, 0.0)
+
+    half_life = weights.get("recency_half_life_days", 7.0) or 7.0
+    recency = np.where(known_age, np.exp(-math.log(2.0) * age_days / half_life), 0.5)
+    emotional = columns["emotion_score"] * np.exp(-weights.get("emotional_decay_rate", 0.0) * age_days)
+
+    return (
+        weights.get("semantic_weight", 1.0) * np.clip(columns["similarity"], 0.0, 1.0)
+        + weights.get("recency_weight", 0.0) * recency
+        + weights.get("emotional_weight", 0.0) * emotional
+        + weights.get("self_reference_boost", 0.0) * columns["self_reference"]
+    )
+
+
+def top_k(scores, k):
+    """Return the indices of the k highest scores, best first."""
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def rerank(columns, limit, weights, now=None):
+    """
+    Re-rank a candidate pool and keep the best `limit`.
+
+    Returns:
+        tuple: (indices into the candidate pool, their composite scores)
+    """
+    scores = composite_scores(columns, weights, now=now)
+    order = top_k(scores, limit)
+    return order, scores[order]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse ranked ID lists: each list contributes 1 / (k + rank) per ID (rank from 1).
+
+    Returns:
+        list: (id, fused score) pairs, best first
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def fuse_results(result_sets, n_results, k=60):
+    """
+    Fuse Chroma-style results of one query (e.g. vector and lexical) with RRF.
+
+    Returns:
+        dict: Chroma-style results with the best n_results in fused order,
+            plus "fused_scores" normalized to [0, 1] (1 = ranked first everywhere)
+    """
+    rows, rankings = {}, []
+    for results in result_sets:
+        columns = [(results.get(key) or [[]])[0] or [] for key in ("ids", "documents", "metadatas", "distances")]
+        ranking = []
+        for row in zip(*columns):
+            rows.setdefault(row[0], row)
+            ranking.append(row[0])
+        rankings.append(ranking)
+
+    best_possible = len(result_sets) / (k + 1.0)
+    top = reciprocal_rank_fusion(rankings, k=k)[:n_results]
+    return {
+        "ids": [[item_id for item_id, _ in top]],
+        "documents": [[rows[item_id][1] for item_id, _ in top]],
+        "metadatas": [[rows[item_id][2] for item_id, _ in top]],
+        "distances": [[rows[item_id][3] for item_id, _ in top]],
+        "fused_scores": [[score / best_possible for _, score in top]]
+    }
@@ -0,0 +1,147 @@
+# cognisphere_adk/services/safety_matcher.py
+"""
+Single-pass safety scanning for the safety callbacks.
+
+All blocked keywords and sensitive topics are compiled into one regular
+expression alternation with word boundaries, so a message is scanned once
+whatever the number of keywords. PII detectors (Luhn-checked card numbers,
+US social security numbers) run on the same text. Verdicts are cached per
+message hash, so the repeated model calls of one turn (tool results,
+sub-agent hops) don't rescan the same input.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+# blocked_keyword / sensitive_topic: first match of each kind (None if none)
+# pii: tuple of detected PII kinds ("card_number", "ssn")
+SafetyVerdict = namedtuple("SafetyVerdict", ["blocked_keyword", "sensitive_topic", "pii"])
+
+CLEAN_VERDICT = SafetyVerdict(None, None, ())
+
+# 13-19 digits, optionally grouped with spaces or dashes
+CARD_NUMBER_PATTERN = re.compile(r"(?<![\d-])\d(?:[ -]?\d){12,18}(?![\d-])")
+SSN_PATTERN = re.compile(r"(?<![\d-])(?!000|666|9\d\d)\d{3}-(?!00)\d{2}-(?!0000)\d{4}(?![\d-])")
+
+
+def luhn_valid(digits):
+    """Return True if a digit string passes the Luhn checksum."""
+    total = 0
+    for i, char in enumerate(reversed(digits)):
+        value = ord(char) - 48
+        if i % 2:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return total % 10 == 0
+
+
+def _normalize(keyword):
+    return " ".join(keyword.lower().split())
+
+
+def compile_keywords(keywords):
+    """
+    Compile keywords into one case-insensitive alternation matching whole words.
+
+    Multi-word keywords match across any run of whitespace. Empty keywords
+    are ignored; returns None if nothing is left.
+    """
+    normalized = sorted({_normalize(keyword) for keyword in keywords if keyword and keyword.strip()},
+                        key=len, reverse=True)
+    if not normalized:
+        return None
+    alternation = "|".join(r"\s+".join(re.escape(word) for word in keyword.split()) for keyword in normalized)
+    return re.compile(r"(?<!\w)(?:" + alternation + r")(?!\w)", re.IGNORECASE)
+
+
+class SafetyMatcher:
+    """Scans text for blocked keywords, sensitive topics and PII in one pass."""
+
+    def __init__(self, blocked_keywords=(), sensitive_topics=(), detect_pii=True, cache_size=4096):
+        """
+        Args:
+            blocked_keywords: Keywords that block the request
+            sensitive_topics: Topics that must not be stored in memory
+            detect_pii: Also look for card numbers and social security numbers
+            cache_size: Number of verdicts kept (by message hash)
+        """
+        self._categories = {}
+        for keyword in sensitive_topics:
+            if keyword and keyword.strip():
+                self._categories[_normalize(keyword)] = "sensitive_topic"
+        for keyword in blocked_keywords:
+            if keyword and keyword.strip():
+                self._categories[_normalize(keyword)] = "blocked_keyword"
+        self._pattern = compile_keywords(self._categories)
+        self.detect_pii = detect_pii
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def scan(self, text):
+        """
+        Return the SafetyVerdict for a text (cached by its hash).
+        """
+        if not text:
+            return CLEAN_VERDICT
+
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            verdict = self._cache.get(key)
+            if verdict is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return verdict
+            self.misses += 1
+
+        verdict = self._scan(text)
+
+        with self._lock:
+            self._cache[key] = verdict
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return verdict
+
+    def _scan(self, text):
+        found = {}
+        if self._pattern is not None:
+            for match in self._pattern.finditer(text):
+                category = self._categories[_normalize(match.group(0))]
+                found.setdefault(category, _normalize(match.group(0)))
+                if len(found) == 2:
+                    break
+
+        pii = self.find_pii(text) if self.detect_pii else ()
+        if not found and not pii:
+            return CLEAN_VERDICT
+        return SafetyVerdict(found.get("blocked_keyword"), found.get("sensitive_topic"), pii)
+
+    @staticmethod
+    def find_pii(text):
+        """Return the kinds of PII found in text, e.g. ("card_number",)."""
+        kinds = []
+        if any(char.isdigit() for char in text):
+            for match in CARD_NUMBER_PATTERN.finditer(text):
+                if luhn_valid(re.sub(r"[ -]", "", match.group(0))):
+                    kinds.append("card_number")
+                    break
+            if SSN_PATTERN.search(text):
+                kinds.append("ssn")
+        return tuple(kinds)
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "cache_items": len(self._cache),
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,358 @@
+# cognisphere_adk/services/session_store.py
+"""
+Persistent, bounded session service for the ADK runner.
+
+Sessions, their events and app/user state are written through to a local
+SQLite file, so they survive restarts. Only recently used sessions are kept
+in RAM, in an LRU bounded by a session count and an approximate byte budget;
+evicted sessions are reloaded lazily from disk on their next access.
+"""
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional
+
+from google.adk.events.event import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListEventsResponse, ListSessionsResponse
+from google.adk.sessions.state import State
+
+
+def _dumps(value):
+    """Serialize state to JSON; values JSON can't express are stored as strings."""
+    return json.dumps(value, default=str)
+
+
+class PersistentSessionService(BaseSessionService):
+    """SQLite-backed session service with an LRU of hot sessions."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            last_update_time REAL NOT NULL,
+            event_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (app_name, user_id, session_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS session_events (
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            PRIMARY KEY (app_name, user_id, session_id, seq)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS app_states (
+            app_name TEXT PRIMARY KEY,
+            state TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS user_states (
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            PRIMARY KEY (app_name, user_id)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_file, max_cached_sessions=1000, max_cached_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            db_file: SQLite file holding sessions and events
+            max_cached_sessions: Maximum number of sessions kept in RAM
+            max_cached_bytes: Approximate byte budget for sessions kept in RAM
+        """
+        self.db_file = db_file
+        self.max_cached_sessions = max(1, int(max_cached_sessions))
+        self.max_cached_bytes = max(0, int(max_cached_bytes))
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+        # (app_name, user_id, session_id) -> [Session, approximate size in bytes, size of its state JSON]
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._user_states = OrderedDict()
+        self._app_states = {}
+        self._stats = {"hits": 0, "loads": 0, "misses": 0, "evictions": 0}
+
+    # --- BaseSessionService API ---
+
+    def create_session(
+            self,
+            *,
+            app_name: str,
+            user_id: str,
+            state: Optional[dict[str, Any]] = None,
+            session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        session = Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=state or {},
+            last_update_time=time.time()
+        )
+        state_json = _dumps(session.state)
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                key = (app_name, user_id, session_id)
+                self._conn.execute(
+                    "DELETE FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessions "
+                    "(app_name, user_id, session_id, state, last_update_time, event_count) "
+                    "VALUES (?, ?, ?, ?, ?, 0)",
+                    key + (state_json, session.last_update_time)
+                )
+                self._conn.execute("COMMIT")
+            except:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._cache_put(key, session, len(state_json), len(state_json))
+            return self._copy_for_caller(session)
+
+    def get_session(
+            self,
+            *,
+            app_name: str,
+            user_id: str,
+            session_id: str,
+            config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        with self._lock:
+            session = self._get_storage_session((app_name, user_id, session_id))
+            if session is None:
+                return None
+            return self._copy_for_caller(session, config)
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id, last_update_time FROM sessions WHERE app_name = ? AND user_id = ?",
+                (app_name, user_id)
+            ).fetchall()
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=user_id, id=session_id, state={}, last_update_time=last_update_time)
+            for session_id, last_update_time in rows
+        ])
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "DELETE FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+                self._conn.execute(
+                    "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+                self._conn.execute("COMMIT")
+            except:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._cache_drop(key)
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        with self._lock:
+            events = self._load_events((app_name, user_id, session_id))
+        return ListEventsResponse(events=events)
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+
+        # Update the caller's session object
+        super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+
+        key = (session.app_name, session.user_id, session.id)
+        event_json = event.model_dump_json(exclude_none=True)
+
+        with self._lock:
+            storage_session = self._get_storage_session(key)
+            if storage_session is None:
+                return event
+
+            if storage_session is not session:
+                super().append_event(session=storage_session, event=event)
+            storage_session.last_update_time = event.timestamp
+            state_json = _dumps(storage_session.state)
+
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    "SELECT event_count FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                    key
+                ).fetchone()
+                seq = row[0] if row else 0
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO session_events (app_name, user_id, session_id, seq, event) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    key + (seq, event_json)
+                )
+                self._conn.execute(
+                    "UPDATE sessions SET state = ?, last_update_time = ?, event_count = ? "
+                    "WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                    (state_json, event.timestamp, seq + 1) + key
+                )
+                if event.actions and event.actions.state_delta:
+                    self._persist_scoped_state(session.app_name, session.user_id, event.actions.state_delta)
+                self._conn.execute("COMMIT")
+            except:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._resize(key, entry[1] - entry[2] + len(event_json) + len(state_json), len(state_json))
+        return event
+
+    # --- Stats ---
+
+    def get_stats(self):
+        """Return cache occupancy and hit/load/eviction counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_sessions"] = len(self._cache)
+            stats["cached_bytes"] = self._cached_bytes
+            stats["max_cached_sessions"] = self.max_cached_sessions
+            stats["max_cached_bytes"] = self.max_cached_bytes
+        return stats
+
+    # --- Internals (caller holds the lock) ---
+
+    def _get_storage_session(self, key):
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._cache.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+        row = self._conn.execute(
+            "SELECT state, last_update_time FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?",
+            key
+        ).fetchone()
+        if row is None:
+            self._stats["misses"] += 1
+            return None
+
+        state_json, last_update_time = row
+        events = self._load_events(key)
+        session = Session(
+            app_name=key[0],
+            user_id=key[1],
+            id=key[2],
+            state=json.loads(state_json),
+            events=events,
+            last_update_time=last_update_time
+        )
+        self._stats["loads"] += 1
+        size = len(state_json) + sum(len(event.model_dump_json(exclude_none=True)) for event in events)
+        self._cache_put(key, session, size, len(state_json))
+        return session
+
+    def _load_events(self, key):
+        rows = self._conn.execute(
+            "SELECT event FROM session_events WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq",
+            key
+        ).fetchall()
+        return [Event.model_validate_json(row[0]) for row in rows]
+
+    def _copy_for_caller(self, session, config=None):
+        """Copy a storage session: state is deep-copied, event objects are shared."""
+        events = session.events
+        if config:
+            if config.num_recent_events:
+                events = events[-config.num_recent_events:]
+            elif config.after_timestamp:
+                i = len(events) - 1
+                while i >= 0 and events[i].timestamp >= config.after_timestamp:
+                    i -= 1
+                if i >= 0:
+                    events = events[i:]
+        copied = session.model_copy(update={"state": copy.deepcopy(session.state), "events": list(events)})
+        return self._merge_state(copied)
+
+    def _merge_state(self, copied_session):
+        app_state = self._get_scoped_state("app", copied_session.app_name, None)
+        for key, value in app_state.items():
+            copied_session.state[State.APP_PREFIX + key] = value
+        user_state = self._get_scoped_state("user", copied_session.app_name, copied_session.user_id)
+        for key, value in user_state.items():
+            copied_session.state[State.USER_PREFIX + key] = value
+        return copied_session
+
+    def _get_scoped_state(self, scope, app_name, user_id):
+        if scope == "app":
+            if app_name not in self._app_states:
+                row = self._conn.execute("SELECT state FROM app_states WHERE app_name = ?", (app_name,)).fetchone()
+                self._app_states[app_name] = json.loads(row[0]) if row else {}
+            return self._app_states[app_name]
+
+        key = (app_name, user_id)
+        state = self._user_states.get(key)
+        if state is None:
+            row = self._conn.execute(
+                "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", key).fetchone()
+            state = json.loads(row[0]) if row else {}
+            self._user_states[key] = state
+            while len(self._user_states) > self.max_cached_sessions:
+                self._user_states.popitem(last=False)
+        else:
+            self._user_states.move_to_end(key)
+        return state
+
+    def _persist_scoped_state(self, app_name, user_id, state_delta):
+        app_delta = {k[len(State.APP_PREFIX):]: v for k, v in state_delta.items() if k.startswith(State.APP_PREFIX)}
+        user_delta = {k[len(State.USER_PREFIX):]: v for k, v in state_delta.items() if k.startswith(State.USER_PREFIX)}
+        if app_delta:
+            app_state = self._get_scoped_state("app", app_name, None)
+            app_state.update(app_delta)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO app_states (app_name, state) VALUES (?, ?)", (app_name, _dumps(app_state)))
+        if user_delta:
+            user_state = self._get_scoped_state("user", app_name, user_id)
+            user_state.update(user_delta)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO user_states (app_name, user_id, state) VALUES (?, ?, ?)",
+                (app_name, user_id, _dumps(user_state)))
+
+    def _cache_put(self, key, session, size, state_size):
+        self._cache_drop(key)
+        self._cache[key] = [session, size, state_size]
+        self._cached_bytes += size
+        self._evict()
+
+    def _resize(self, key, size, state_size):
+        entry = self._cache[key]
+        self._cached_bytes += size - entry[1]
+        entry[1] = size
+        entry[2] = state_size
+        self._evict()
+
+    def _cache_drop(self, key):
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self._cached_bytes -= entry[1]
+
+    def _evict(self):
+        while len(self._cache) > 1 and (
+                len(self._cache) > self.max_cached_sessions
+                or (self.max_cached_bytes and self._cached_bytes > self.max_cached_bytes)):
+            _, (_, size, _) = self._cache.popitem(last=False)
+            self._cached_bytes -= size
+            self._stats["evictions"] += 1
@@ -0,0 +1,510 @@
+# cognisphere_adk/services/sharded_store.py
+"""
+Memories vector store partitioned across N local shards.
+
+Each shard is a NumpyVectorStore in its own directory, owned by its own
+worker process, so shards search in parallel on separate cores (and disks,
+if the shard directories are mounted apart). Queries are scattered to every
+shard and the per-shard top-k lists, already sorted by distance, are merged
+with a heap. Writes go to the shard a memory belongs to: by a hash of its ID,
+or of a metadata field (e.g. a user ID) so that a filter on that field is
+answered by a single shard.
+
+The placement (shard count and key) is recorded in shards.json. When the
+configured shard count changes, new writes use the new placement at once
+and existing memories are moved by rebalance(), which can run in the
+background while the store serves queries: a memory is added to its new
+shard before it is deleted from the old one, and results are de-duplicated
+by ID while both copies exist. Updates and deletes wait for the page being
+moved, so they never reach only the copy that is about to be deleted.
+
+Shard workers are plain multiprocessing processes fed through a pipe (not
+concurrent.futures pools, which stop accepting work before atexit handlers
+run), so the store can be written to and closed from an atexit handler.
+Workers still running at interpreter exit are stopped by a multiprocessing
+finalizer, and checkpoint their shard as they exit.
+"""
+
+import hashlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import Future
+from multiprocessing.util import Finalize
+
+import numpy as np
+
+from services.vector_store import NumpyVectorStore, VectorStore
+
+# The store opened by a shard worker process
+_shard = None
+
+
+def _open_shard(path, options):
+    global _shard
+    _shard = NumpyVectorStore(path, **options)
+    # Checkpoint when the worker exits, also if the owner is shut down without close()
+    Finalize(_shard, _shard.close, exitpriority=10)
+
+
+def _shard_call(method, args, kwargs):
+    return getattr(_shard, method)(*args, **kwargs)
+
+
+def _serve_shard(conn, path, options, owner):
+    """Worker process loop: answer (call id, method, args, kwargs) requests until None or the owner exits."""
+    _open_shard(path, options)
+    while True:
+        # Polled, so a worker whose owner was killed exits (other workers may hold its pipe open)
+        while not conn.poll(1.0):
+            if os.getppid() != owner:
+                return
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        call_id, method, args, kwargs = request
+        try:
+            response = (call_id, True, _shard_call(method, args, kwargs))
+        except Exception as e:
+            response = (call_id, False, e)
+        try:
+            conn.send(response)
+        except Exception as e:  # Resultado ou exceção que não se serializa
+            conn.send((call_id, False, RuntimeError(f"Shard {method} failed: {e!r}")))
+
+
+class _ShardWorker:
+    """One shard's worker process; call() returns a Future resolved by a reader thread."""
+
+    def __init__(self, context, path, options):
+        self._conn, child = context.Pipe()
+        self._process = context.Process(target=_serve_shard, args=(child, path, options, os.getpid()),
+                                        name=f"shard-{os.path.basename(path)}", daemon=True)
+        self._process.start()
+        child.close()
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._ids = itertools.count()
+        self._stopped = False
+        self._reader = threading.Thread(target=self._read, name=f"{self._process.name}-results", daemon=True)
+        self._reader.start()
+        # Runs in multiprocessing's exit handler, before it terminates daemon processes
+        self._finalizer = Finalize(self, _ShardWorker._stop, args=(self._conn, self._process),
+                                   exitpriority=10)
+
+    def call(self, method, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError(f"Shard worker {self._process.name} is stopped")
+            call_id = next(self._ids)
+            self._calls[call_id] = future
+            self._conn.send((call_id, method, args, kwargs))
+        return future
+
+    def _read(self):
+        while True:
+            try:
+                call_id, ok, value = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._calls.pop(call_id)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        with self._lock:
+            calls, self._calls = self._calls, {}
+        for future in calls.values():
+            future.set_exception(RuntimeError(f"Shard worker {self._process.name} exited"))
+
+    def stop(self, wait=True):
+        """Let the queued calls run, then end the worker (it checkpoints its shard as it exits)."""
+        with self._lock:
+            if not self._stopped:
+                self._stopped = True
+                self._conn.send(None)
+        if wait:
+            self._finalizer.cancel()
+            self._process.join()
+            self._reader.join()
+            self._conn.close()
+
+    @staticmethod
+    def _stop(conn, process):
+        try:
+            conn.send(None)
+        except (OSError, ValueError):
+            pass  # Already stopped
+        process.join()
+
+
+def shard_of(key, shards):
+    """Shard number of a partition key (stable across processes and restarts)."""
+    digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+class ShardedVectorStore(VectorStore):
+    """NumpyVectorStore shards in worker processes, queried with scatter-gather."""
+
+    max_batch_size = 100000
+    normalized = True
+
+    def __init__(self, path, shards=4, shard_by="hash", auto_rebalance=True, shard_options=None):
+        """
+        Args:
+            path: Directory holding shards.json and one shard-NNN directory per shard
+            shards: Number of shards new memories are spread over
+            shard_by: "hash" (of the memory ID) or a metadata field whose value picks the shard
+            auto_rebalance: Start moving memories in the background when the shard
+                count differs from the stored placement
+            shard_options: NumpyVectorStore options for every shard (quantization, index, ...)
+        """
+        if shards < 1:
+            raise ValueError("A sharded store needs at least one shard")
+        self.path = path
+        self.shard_by = shard_by
+        self.shard_options = dict(shard_options or {})
+        os.makedirs(path, exist_ok=True)
+        self._placement_path = os.path.join(path, "shards.json")
+        # Guards _workers: rebalance() replaces the list when it drops emptied shards
+        self._lock = threading.Lock()
+        # Held by rebalance() while a page is read, added to its new shards and deleted
+        # from the old one, and by update/delete, so these apply to both copies or neither
+        self._moving = threading.Lock()
+        self._workers = []
+        self._rebalance_thread = None
+        self._rebalance_stats = {"running": False, "passes": 0, "moved": 0, "error": None}
+
+        placement = self._read_placement()
+        if placement is None:
+            placement = {"shards": shards, "shard_by": shard_by, "balanced": True}
+        elif placement["shards"] != shards or placement.get("shard_by") != shard_by:
+            print(f"Sharded store {path}: placement changes from {placement['shards']} shards by "
+                  f"{placement.get('shard_by')} to {shards} shards by {shard_by}; memories will be rebalanced")
+            placement = {"shards": shards, "shard_by": shard_by, "balanced": False}
+        self.shards = shards
+        self.balanced = placement["balanced"]
+        self._write_placement()
+
+        # Shards beyond the configured count stay open until rebalancing has emptied them
+        existing = [name for name in os.listdir(path) if name.startswith("shard-")]
+        for number in range(max(shards, len(existing))):
+            self._open(number)
+
+        if not self.balanced and auto_rebalance:
+            self.start_rebalance()
+
+    # --- Shards ---
+
+    def _shard_path(self, number):
+        return os.path.join(self.path, f"shard-{number:03d}")
+
+    def _open(self, number):
+        # fork: a spawned worker would re-import the application's __main__ module
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        worker = _ShardWorker(context, self._shard_path(number), self.shard_options)
+        self._workers.append(worker)
+        # Wait until the shard is open
+        worker.call("count").result()
+
+    # Work is submitted under the lock, so it never reaches a dropped shard's worker
+    # after it was stopped; results are waited for outside it.
+
+    def _submit(self, number, method, *args, **kwargs):
+        """Call a method on one of the configured shards (never dropped)."""
+        with self._lock:
+            return self._workers[number].call(method, *args, **kwargs)
+
+    def _submit_to(self, worker, method, *args, **kwargs):
+        """Call a method on a shard from a snapshot of the workers; None if it was dropped since."""
+        with self._lock:
+            if worker not in self._workers:
+                return None
+            return worker.call(method, *args, **kwargs)
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._workers)
+
+    def _broadcast(self, method, *args, **kwargs):
+        """Call a method on every shard in parallel; results in shard order."""
+        with self._lock:
+            futures = [worker.call(method, *args, **kwargs) for worker in self._workers]
+        return [future.result() for future in futures]
+
+    def _home(self, memory_id, metadata):
+        """Shard a memory belongs to under the current placement."""
+        key = memory_id
+        if self.shard_by != "hash" and metadata and metadata.get(self.shard_by) is not None:
+            key = metadata[self.shard_by]
+        return shard_of(key, self.shards)
+
+    def _routed_shard(self, where):
+        """Single shard answering a filter on the partition field, or None (all shards)."""
+        if self.shard_by == "hash" or not self.balanced or not where:
+            return None
+        clauses = where.get("$and", [where]) if len(where) == 1 else [where]
+        for clause in clauses:
+            condition = clause.get(self.shard_by) if isinstance(clause, dict) else None
+            if isinstance(condition, dict):
+                condition = condition.get("$eq")
+            if condition is not None and not isinstance(condition, (dict, list)):
+                return shard_of(condition, self.shards)
+        return None
+
+    # --- Placement ---
+
+    def _read_placement(self):
+        try:
+            with open(self._placement_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_placement(self):
+        tmp_path = self._placement_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"shards": self.shards, "shard_by": self.shard_by, "balanced": self.balanced}, f)
+        os.replace(tmp_path, self._placement_path)
+
+    # --- Collection API ---
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        indexes = range(len(ids))
+        if not self.balanced:
+            # While memories are being moved an ID may already live outside its new home shard
+            stored = set(self.get(ids=list(ids), include=[])["ids"])
+            indexes = [i for i in indexes if ids[i] not in stored]
+
+        groups = {}
+        for i in indexes:
+            groups.setdefault(self._home(ids[i], metadatas[i]), []).append(i)
+        futures = [
+            self._submit(number, "add", [ids[i] for i in group], [embeddings[i] for i in group],
+                         [documents[i] for i in group], [metadatas[i] for i in group])
+            for number, group in groups.items()
+        ]
+        for future in futures:
+            future.result()
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        """Scatter the queries to the shards and merge their top-k lists by distance."""
+        include = list(include)
+        shard_include = include if "distances" in include else include + ["distances"]
+        number = self._routed_shard(where)
+        if number is not None:
+            return self._submit(number, "query", query_embeddings, n_results, where, shard_include).result()
+
+        results = self._broadcast("query", query_embeddings, n_results, where, shard_include)
+        merged = {key: [] if key in include or key == "ids" else None
+                  for key in ("ids", "documents", "metadatas", "distances", "embeddings")}
+        for q in range(len(query_embeddings)):
+            streams = [[(distance, shard, i) for i, distance in enumerate(result["distances"][q])]
+                       for shard, result in enumerate(results)]
+            picked, seen = [], set()
+            for distance, shard, i in heapq.merge(*streams):
+                memory_id = results[shard]["ids"][q][i]
+                if memory_id in seen:
+                    continue
+                seen.add(memory_id)
+                picked.append((shard, i))
+                if len(picked) == n_results:
+                    break
+
+            for key, values in merged.items():
+                if values is None:
+                    continue
+                column = [results[shard][key][q][i] for shard, i in picked]
+                values.append(np.array(column) if key == "embeddings" else column)
+        return merged
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        include = list(include)
+        keys = ["ids"] + [key for key in ("documents", "metadatas", "embeddings") if key in include]
+        if ids is not None:
+            pages = self._broadcast("get", ids=ids, where=where, include=include)
+            found = {}
+            for page in pages:
+                for i, memory_id in enumerate(page["ids"]):
+                    found.setdefault(memory_id, (page, i))
+            order = [memory_id for memory_id in dict.fromkeys(ids) if memory_id in found][offset or 0:]
+            if limit is not None:
+                order = order[:limit]
+            rows = [found[memory_id] for memory_id in order]
+        else:
+            # Shards are walked in order, so offset/limit page through all of them consistently
+            # (a shard dropped by rebalance() meanwhile was empty, so it is skipped)
+            rows, skip, remaining = [], offset or 0, limit
+            for worker in self._snapshot():
+                if remaining is not None and remaining <= 0:
+                    break
+                future = (self._submit_to(worker, "count") if not where
+                          else self._submit_to(worker, "get", where=where, include=[]))
+                if future is None:
+                    continue
+                total = future.result() if not where else len(future.result()["ids"])
+                if skip >= total:
+                    skip -= total
+                    continue
+                future = self._submit_to(worker, "get", where=where, limit=remaining, offset=skip,
+                                         include=include)
+                if future is None:
+                    continue
+                page = future.result()
+                rows.extend((page, i) for i in range(len(page["ids"])))
+                skip = 0
+                if remaining is not None:
+                    remaining -= len(page["ids"])
+
+        results = {key: [page[key][i] for page, i in rows] for key in keys}
+        for key in ("documents", "metadatas", "embeddings"):
+            results.setdefault(key, None)
+        if results["embeddings"] is not None:
+            results["embeddings"] = np.array(results["embeddings"])
+        return results
+
+    def update(self, ids, metadatas):
+        with self._moving:
+            self._broadcast("update", ids, metadatas)
+
+    def delete(self, ids):
+        with self._moving:
+            self._broadcast("delete", list(ids))
+
+    def count(self):
+        # Memories being moved may be counted twice for a moment
+        return sum(self._broadcast("count"))
+
+    def close(self):
+        self._rebalance_stats["stop"] = True
+        if self._rebalance_thread is not None:
+            self._rebalance_thread.join()
+        if self._workers:
+            self._broadcast("close")
+            with self._lock:
+                workers, self._workers = self._workers, []
+            for worker in workers:
+                worker.stop()
+
+    def train_index(self, **kwargs):
+        """Train the IVF-PQ index of every shard (in parallel)."""
+        return self._broadcast("train_index", **kwargs)
+
+    def fit_projection(self, **kwargs):
+        """Fit the PCA projection of every shard (in parallel)."""
+        return self._broadcast("fit_projection", **kwargs)
+
+    # --- Rebalancing ---
+
+    def start_rebalance(self, batch_size=1000):
+        """Run rebalance() in a background thread (the store keeps serving)."""
+        with self._lock:
+            if self._rebalance_thread is not None and self._rebalance_thread.is_alive():
+                return
+            self._rebalance_thread = threading.Thread(target=self.rebalance, args=(batch_size,),
+                                                      name="shard-rebalance", daemon=True)
+            self._rebalance_thread.start()
+
+    def rebalance(self, batch_size=1000):
+        """
+        Move every memory to its home shard under the current placement.
+
+        Works through each shard in pages; a moved memory is added to its new
+        shard before it is deleted from the old one. Passes repeat until one
+        moves nothing (concurrent deletes shift pages). Shards beyond the
+        configured count are removed once empty.
+
+        Returns:
+            int: Number of memories moved
+        """
+        stats = self._rebalance_stats
+        stats.update({"running": True, "passes": 0, "error": None, "stop": False})
+        moved_total = 0
+        try:
+            while not stats["stop"]:
+                moved = 0
+                for source in range(len(self._snapshot())):
+                    moved += self._rebalance_shard(source, batch_size)
+                stats["passes"] += 1
+                moved_total += moved
+                if not moved:
+                    break
+
+            if not stats["stop"]:
+                if len(self._snapshot()) > self.shards and not any(self._broadcast("count")[self.shards:]):
+                    # New writes only go to the configured shards, so the extra ones stay empty
+                    with self._lock:
+                        dropped = self._workers[self.shards:]
+                        self._workers = self._workers[:self.shards]
+                        # Queued requests still run before the workers stop
+                        closing = [worker.call("close") for worker in dropped]
+                        for worker in dropped:
+                            worker.stop(wait=False)
+                    for number, (worker, future) in enumerate(zip(dropped, closing), self.shards):
+                        future.result()
+                        worker.stop()
+                        shutil.rmtree(self._shard_path(number), ignore_errors=True)
+                self.balanced = True
+                self._write_placement()
+                print(f"Sharded store {self.path}: rebalanced, {moved_total} memories moved")
+        except Exception as e:
+            stats["error"] = str(e)
+            print(f"Error rebalancing sharded store {self.path}: {e}")
+        finally:
+            stats["running"] = False
+        return moved_total
+
+    def _rebalance_shard(self, source, batch_size):
+        moved, offset = 0, 0
+        stats = self._rebalance_stats
+        while not stats["stop"]:
+            with self._moving:
+                page = self._submit(source, "get", limit=batch_size, offset=offset,
+                                    include=["documents", "metadatas", "embeddings"]).result()
+                ids = page["ids"]
+                if not ids:
+                    break
+                groups = {}
+                for i, (memory_id, metadata) in enumerate(zip(ids, page["metadatas"])):
+                    home = self._home(memory_id, metadata)
+                    if home != source:
+                        groups.setdefault(home, []).append(i)
+                for target, group in groups.items():
+                    self._submit(target, "add", [ids[i] for i in group], [page["embeddings"][i] for i in group],
+                                 [page["documents"][i] for i in group],
+                                 [page["metadatas"][i] for i in group]).result()
+                leaving = [ids[i] for group in groups.values() for i in group]
+                if leaving:
+                    self._submit(source, "delete", leaving).result()
+            moved += len(leaving)
+            stats["moved"] += len(leaving)
+            offset += len(ids) - len(leaving)
+        return moved
+
+    def get_stats(self):
+        shard_stats = self._broadcast("get_stats")
+        rebalance = {key: value for key, value in self._rebalance_stats.items() if key != "stop"}
+        return {
+            "backend": "sharded",
+            "shards": self.shards,
+            "open_shards": len(shard_stats),
+            "shard_by": self.shard_by,
+            "balanced": self.balanced,
+            "live": sum(stats["live"] for stats in shard_stats),
+            "shard_sizes": [stats["live"] for stats in shard_stats],
+            "rebalance": rebalance,
+            "shard_stats": shard_stats
+        }
@@ -0,0 +1,530 @@
+# cognisphere_adk/services/thread_store.py
+"""
+Storage backends for narrative threads.
+
+JsonThreadStore keeps one file per thread under threads/ (a small header
+plus append-only event segments). SQLiteThreadStore keeps thread headers in an indexed table and
+events in a separate table, so listing queries are index lookups instead of
+parsing every thread file.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from data_models.narrative import NarrativeThread
+
+THREAD_ORDER_COLUMNS = {
+    "importance": "importance DESC, last_updated DESC",
+    "last_updated": "last_updated DESC"
+}
+
+
+def _sort_threads(threads, order_by):
+    """Sort threads in place the same way the SQL backend orders them."""
+    if order_by == "last_updated":
+        threads.sort(key=lambda t: t.last_updated or "", reverse=True)
+    else:
+        threads.sort(key=lambda t: (t.importance, t.last_updated or ""), reverse=True)
+    return threads
+
+
+class JsonThreadStore:
+    """
+    Thread store using one small JSON header per thread plus append-only
+    event segments.
+
+    Layout under threads_dir:
+        <id>.json                  header (thread fields, event_count, segment list)
+        <id>.events.<n>.jsonl      line-delimited events, appended in place
+
+    Appending an event writes one line to the active segment and atomically
+    replaces the header, so the cost does not depend on thread length.
+    Segments roll over at segment_max_bytes; a background compactor merges
+    sealed segments. Headers written by older versions (events inline) are
+    still read, and are converted on their first append.
+    """
+
+    backend = "json"
+
+    def __init__(self, threads_dir, segment_max_bytes=256 * 1024, max_segments=4,
+                 compact_interval=60.0, fsync=False):
+        """
+        Args:
+            threads_dir: Directory holding the thread files
+            segment_max_bytes: Size at which the active segment is sealed
+            max_segments: Segment count above which a thread is compacted
+            compact_interval: Seconds between compactor runs (0 disables the thread)
+            fsync: fsync every append and header write
+        """
+        self.threads_dir = threads_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max(2, max_segments)
+        self.fsync = fsync
+        os.makedirs(threads_dir, exist_ok=True)
+
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._needs_compaction = set()
+
+        self._compactor = None
+        self._stop = threading.Event()
+        if compact_interval and compact_interval > 0:
+            self._compactor = threading.Thread(
+                target=self._compact_loop,
+                args=(compact_interval,),
+                name="thread-compactor",
+                daemon=True
+            )
+            self._compactor.start()
+
+    def close(self):
+        """Stop the compactor and merge any pending segments."""
+        self._stop.set()
+        self.compact_pending()
+
+    # --- Paths and locking ---
+
+    def _path(self, thread_id):
+        return os.path.join(self.threads_dir, f"{thread_id}.json")
+
+    def _segment_path(self, segment):
+        return os.path.join(self.threads_dir, segment)
+
+    def _lock_for(self, thread_id):
+        with self._locks_guard:
+            lock = self._locks.get(thread_id)
+            if lock is None:
+                lock = self._locks[thread_id] = threading.Lock()
+            return lock
+
+    # --- Low-level file helpers ---
+
+    def _write_json_atomic(self, path, data):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _write_segment(self, path, events):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _read_header(self, thread_id):
+        try:
+            with open(self._path(thread_id), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_segment(self, segment):
+        events = []
+        try:
+            with open(self._segment_path(segment), "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        events.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Torn final line from an interrupted append
+                        continue
+        except OSError:
+            pass
+        return events
+
+    def _new_segment(self, header):
+        number = header.get("next_segment", 1)
+        header["next_segment"] = number + 1
+        return f"{header['id']}.events.{number:06d}.jsonl"
+
+    # --- Store API ---
+
+    def save_thread(self, thread):
+        """Save a narrative thread, replacing all of its events."""
+        with self._lock_for(thread.id):
+            old_header = self._read_header(thread.id) or {}
+            header = thread.to_dict()
+            events = header.pop("events")
+            header["next_segment"] = old_header.get("next_segment", 1)
+            header["segments"] = []
+            header["event_count"] = len(events)
+
+            if events:
+                segment = self._new_segment(header)
+                self._write_segment(self._segment_path(segment), events)
+                header["segments"].append(segment)
+
+            self._write_json_atomic(self._path(thread.id), header)
+            self._remove_segments(old_header.get("segments", []))
+        return thread.id
+
+    def append_event(self, thread_id, event):
+        """
+        Append one event to a thread.
+
+        Returns:
+            bool: False if the thread does not exist
+        """
+        with self._lock_for(thread_id):
+            header = self._read_header(thread_id)
+            if header is None:
+                return False
+
+            segments = header.setdefault("segments", [])
+            if "events" in header:
+                # Older layout: move the inline events into a first segment
+                inline_events = header.pop("events")
+                header["event_count"] = len(inline_events)
+                if inline_events:
+                    segment = self._new_segment(header)
+                    self._write_segment(self._segment_path(segment), inline_events)
+                    segments.append(segment)
+
+            if not segments or self._segment_full(segments[-1]):
+                segments.append(self._new_segment(header))
+
+            with open(self._segment_path(segments[-1]), "a") as f:
+                f.write(json.dumps(event) + "\n")
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            header["event_count"] = header.get("event_count", 0) + 1
+            header["last_updated"] = event.get("timestamp", header.get("last_updated"))
+            self._write_json_atomic(self._path(thread_id), header)
+
+            if len(segments) > self.max_segments:
+                with self._locks_guard:
+                    self._needs_compaction.add(thread_id)
+        return True
+
+    def get_thread(self, thread_id):
+        """Get a narrative thread by ID."""
+        try:
+            with self._lock_for(thread_id):
+                header = self._read_header(thread_id)
+                if header is None:
+                    return None
+                events = list(header.get("events", []))
+                for segment in header.get("segments", []):
+                    events.extend(self._read_segment(segment))
+            header["events"] = events
+            return NarrativeThread.from_dict(header)
+        except:
+            return None
+
+    def get_all_threads(self):
+        """Get all narrative threads."""
+        threads = []
+        for filename in os.listdir(self.threads_dir):
+            if filename.endswith(".json"):
+                thread = self.get_thread(filename[:-len(".json")])
+                if thread:
+                    threads.append(thread)
+        return threads
+
+    def get_threads(self, status=None, limit=None, order_by="importance"):
+        """Get threads filtered by status, ordered and limited."""
+        threads = self.get_all_threads()
+        if status:
+            threads = [thread for thread in threads if thread.status == status]
+        _sort_threads(threads, order_by)
+        return threads[:limit] if limit else threads
+
+    # --- Compaction ---
+
+    def _segment_full(self, segment):
+        try:
+            return os.path.getsize(self._segment_path(segment)) >= self.segment_max_bytes
+        except OSError:
+            return False
+
+    def _remove_segments(self, segments):
+        for segment in segments:
+            try:
+                os.remove(self._segment_path(segment))
+            except OSError:
+                pass
+
+    def compact_thread(self, thread_id):
+        """
+        Merge all sealed segments of a thread into one.
+
+        The merged segment is written under a new name and the header is
+        swapped atomically before the old segments are removed, so readers
+        always see a consistent segment list.
+
+        Returns:
+            bool: True if segments were merged
+        """
+        with self._lock_for(thread_id):
+            header = self._read_header(thread_id)
+            if header is None:
+                return False
+            segments = header.get("segments", [])
+            sealed, active = segments[:-1], segments[-1:]
+            if len(sealed) < 2:
+                return False
+
+            events = []
+            for segment in sealed:
+                events.extend(self._read_segment(segment))
+            merged = self._new_segment(header)
+            self._write_segment(self._segment_path(merged), events)
+
+            header["segments"] = [merged] + active
+            self._write_json_atomic(self._path(thread_id), header)
+            self._remove_segments(sealed)
+            return True
+
+    def compact_pending(self):
+        """Compact every thread that exceeded max_segments since the last run."""
+        with self._locks_guard:
+            pending, self._needs_compaction = self._needs_compaction, set()
+        for thread_id in pending:
+            try:
+                self.compact_thread(thread_id)
+            except Exception as e:
+                print(f"Error compacting thread {thread_id}: {e}")
+
+    def _compact_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.compact_pending()
+
+
+class SQLiteThreadStore:
+    """Thread store backed by SQLite in WAL mode."""
+
+    backend = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS threads (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            theme TEXT,
+            description TEXT,
+            creation_time TEXT,
+            last_updated TEXT,
+            status TEXT,
+            importance REAL,
+            event_count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_threads_status_importance
+            ON threads (status, importance DESC, last_updated DESC);
+        CREATE INDEX IF NOT EXISTS idx_threads_status_last_updated
+            ON threads (status, last_updated DESC);
+        CREATE INDEX IF NOT EXISTS idx_threads_importance
+            ON threads (importance DESC, last_updated DESC);
+        CREATE INDEX IF NOT EXISTS idx_threads_last_updated
+            ON threads (last_updated DESC);
+        CREATE TABLE IF NOT EXISTS thread_events (
+            thread_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            id TEXT,
+            timestamp TEXT,
+            content TEXT,
+            emotion TEXT,
+            impact REAL,
+            PRIMARY KEY (thread_id, seq)
+        ) WITHOUT ROWID;
+    """
+
+    HEADER_COLUMNS = "id, title, theme, description, creation_time, last_updated, status, importance"
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def save_thread(self, thread):
+        """Save a narrative thread (header and all events)."""
+        events = [
+            (thread.id, seq, event.get("id"), event.get("timestamp"), event.get("content"),
+             event.get("emotion"), event.get("impact"))
+            for seq, event in enumerate(thread.events)
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO threads ({self.HEADER_COLUMNS}, event_count) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread.id, thread.title, thread.theme, thread.description, thread.creation_time,
+                     thread.last_updated, thread.status, thread.importance, len(events))
+                )
+                self._conn.execute("DELETE FROM thread_events WHERE thread_id = ?", (thread.id,))
+                self._conn.executemany(
+                    "INSERT INTO thread_events (thread_id, seq, id, timestamp, content, emotion, impact) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    events
+                )
+                self._conn.execute("COMMIT")
+            except:
+                self._conn.execute("ROLLBACK")
+                raise
+        return thread.id
+
+    def append_event(self, thread_id, event):
+        """
+        Append one event to a thread.
+
+        Returns:
+            bool: False if the thread does not exist
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    "SELECT event_count FROM threads WHERE id = ?", (thread_id,)).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute(
+                    "INSERT INTO thread_events (thread_id, seq, id, timestamp, content, emotion, impact) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, row[0], event.get("id"), event.get("timestamp"), event.get("content"),
+                     event.get("emotion"), event.get("impact"))
+                )
+                self._conn.execute(
+                    "UPDATE threads SET event_count = event_count + 1, "
+                    "last_updated = COALESCE(?, last_updated) WHERE id = ?",
+                    (event.get("timestamp"), thread_id)
+                )
+                self._conn.execute("COMMIT")
+            except:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def get_thread(self, thread_id):
+        """Get a narrative thread by ID."""
+        threads = self._load(
+            f"SELECT {self.HEADER_COLUMNS} FROM threads WHERE id = ?", (thread_id,))
+        return threads[0] if threads else None
+
+    def get_all_threads(self):
+        """Get all narrative threads."""
+        return self._load(f"SELECT {self.HEADER_COLUMNS} FROM threads", ())
+
+    def get_threads(self, status=None, limit=None, order_by="importance"):
+        """Get threads filtered by status, ordered and limited (served by the indexes)."""
+        sql = f"SELECT {self.HEADER_COLUMNS} FROM threads"
+        params = []
+        if status:
+            sql += " WHERE status = ?"
+            params.append(status)
+        sql += " ORDER BY " + THREAD_ORDER_COLUMNS.get(order_by, THREAD_ORDER_COLUMNS["importance"])
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return self._load(sql, params)
+
+    def count_threads(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+
+    def import_threads(self, source_store):
+        """
+        Copy every thread from another store (e.g. the JSON layout).
+
+        Args:
+            source_store: Store exposing get_all_threads()
+
+        Returns:
+            int: Number of threads imported
+        """
+        count = 0
+        for thread in source_store.get_all_threads():
+            self.save_thread(thread)
+            count += 1
+        return count
+
+    def _load(self, sql, params):
+        """Run a header query and attach each thread's events in one extra query."""
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            if not rows:
+                return []
+
+            events_by_thread = {row[0]: [] for row in rows}
+            ids = list(events_by_thread)
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for thread_id, event_id, timestamp, content, emotion, impact in self._conn.execute(
+                        "SELECT thread_id, id, timestamp, content, emotion, impact FROM thread_events "
+                        f"WHERE thread_id IN ({placeholders}) ORDER BY thread_id, seq",
+                        chunk):
+                    events_by_thread[thread_id].append({
+                        "id": event_id,
+                        "timestamp": timestamp,
+                        "content": content,
+                        "emotion": emotion,
+                        "impact": impact
+                    })
+
+        threads = []
+        for thread_id, title, theme, description, creation_time, last_updated, status, importance in rows:
+            threads.append(NarrativeThread.from_dict({
+                "id": thread_id,
+                "title": title,
+                "theme": theme,
+                "description": description,
+                "creation_time": creation_time,
+                "last_updated": last_updated,
+                "events": events_by_thread[thread_id],
+                "status": status,
+                "importance": importance
+            }))
+        return threads
+
+
+def create_thread_store(db_path, backend="sqlite"):
+    """
+    Create the thread store for a database directory.
+
+    The SQLite backend imports existing JSON threads the first time it is
+    opened on an empty database.
+
+    Args:
+        db_path: Database directory
+        backend: "sqlite" or "json"
+
+    Returns:
+        The thread store instance
+    """
+    threads_dir = os.path.join(db_path, "threads")
+    if backend == "json":
+        return JsonThreadStore(threads_dir)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown thread backend: {backend}")
+
+    json_store = JsonThreadStore(threads_dir, compact_interval=0)
+
+    store = SQLiteThreadStore(os.path.join(db_path, "threads.sqlite3"))
+    if store.count_threads() == 0:
+        imported = store.import_threads(json_store)
+        if imported:
+            print(f"Imported {imported} narrative threads from JSON into SQLite")
+    return store
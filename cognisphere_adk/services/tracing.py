@@ -0,0 +1,269 @@
+# cognisphere_adk/services/tracing.py
+"""
+Lightweight per-request tracing with nested spans.
+
+A trace is started for each chat request (see app.process_message); code
+running inside it records spans with `span(...)` or the `@traced(...)`
+decorator. The current trace and span live in context variables, so they
+follow asyncio tasks and stay separate per request.
+
+When tracing is disabled, or code runs outside a trace, `span()` returns a
+shared no-op object and `@traced` adds one context-variable lookup.
+Finished traces are kept in a bounded in-memory buffer and can be exported
+as nested JSON or in Chrome trace format (chrome://tracing, Perfetto).
+"""
+
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+_current_trace = contextvars.ContextVar("cognisphere_trace", default=None)
+_current_span = contextvars.ContextVar("cognisphere_span", default=None)
+
+
+class Trace:
+    """Spans recorded for one request."""
+
+    def __init__(self, request_id, name):
+        self.request_id = request_id
+        self.name = name
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.finished = False
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def new_span_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        """Export as nested JSON: each span lists its children."""
+        with self._lock:
+            spans = [dict(span, children=[]) for span in self.spans]
+
+        by_id = {span["id"]: span for span in spans}
+        roots = []
+        for span in sorted(spans, key=lambda s: s["start_ms"]):
+            parent = by_id.get(span["parent_id"])
+            (parent["children"] if parent else roots).append(span)
+
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "finished": self.finished,
+            "duration_ms": max((s["start_ms"] + s["duration_ms"] for s in spans), default=0.0),
+            "span_count": len(spans),
+            "spans": roots
+        }
+
+    def to_chrome_trace(self):
+        """Export in Chrome trace event format."""
+        with self._lock:
+            spans = list(self.spans)
+
+        events = []
+        for span in spans:
+            event = {
+                "name": span["name"],
+                "cat": span["name"].split(".", 1)[0],
+                "pid": 1,
+                "tid": span["thread"],
+                "ts": span["start_ms"] * 1000.0,
+                "args": dict(span["attributes"], span_id=span["id"], parent_id=span["parent_id"])
+            }
+            if span["instant"]:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=span["duration_ms"] * 1000.0)
+            events.append(event)
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"request_id": self.request_id, "name": self.name}
+        }
+
+
+class _Span:
+    """Context manager recording one span into the current trace."""
+
+    __slots__ = ("trace", "name", "attributes", "id", "parent_id", "start", "_token")
+
+    def __init__(self, trace, name, attributes):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.id = self.trace.new_span_id()
+        self.parent_id = _current_span.get()
+        self._token = _current_span.set(self.id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc_value}"
+        self.trace.record({
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": (self.start - self.trace.origin) * 1000.0,
+            "duration_ms": (end - self.start) * 1000.0,
+            "thread": threading.get_ident(),
+            "instant": False,
+            "attributes": self.attributes
+        })
+        return False
+
+
+class _NoopSpan:
+    """Shared span used when nothing is being traced."""
+
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Creates traces and keeps the most recent finished ones."""
+
+    def __init__(self, enabled=False, max_traces=200):
+        self.enabled = enabled
+        self.max_traces = max_traces
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=None, max_traces=None):
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if max_traces is not None:
+            self.max_traces = max(1, int(max_traces))
+
+    def start_trace(self, request_id, name="request", **attributes):
+        """
+        Context manager starting a trace and its root span.
+
+        Does nothing when tracing is disabled.
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _TraceScope(self, request_id, name, attributes)
+
+    def span(self, name, **attributes):
+        """Context manager for a span nested under the current one."""
+        trace = _current_trace.get()
+        if trace is None:
+            return _NOOP_SPAN
+        return _Span(trace, name, attributes)
+
+    def event(self, name, **attributes):
+        """Record an instant (zero-duration) marker in the current trace."""
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        trace.record({
+            "id": trace.new_span_id(),
+            "parent_id": _current_span.get(),
+            "name": name,
+            "start_ms": (time.perf_counter() - trace.origin) * 1000.0,
+            "duration_ms": 0.0,
+            "thread": threading.get_ident(),
+            "instant": True,
+            "attributes": attributes
+        })
+
+    def traced(self, name=None):
+        """Decorator wrapping a function (sync or async) in a span."""
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    trace = _current_trace.get()
+                    if trace is None:
+                        return await func(*args, **kwargs)
+                    with _Span(trace, span_name, {}):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                trace = _current_trace.get()
+                if trace is None:
+                    return func(*args, **kwargs)
+                with _Span(trace, span_name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def get_trace(self, request_id):
+        """Return a trace (finished or still running) by request ID."""
+        with self._lock:
+            return self._traces.get(request_id)
+
+    def _store(self, trace):
+        with self._lock:
+            self._traces[trace.request_id] = trace
+            self._traces.move_to_end(trace.request_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+
+class _TraceScope:
+    """Context manager installing a trace for the duration of a request."""
+
+    __slots__ = ("tracer", "trace", "root", "_trace_token")
+
+    def __init__(self, tracer, request_id, name, attributes):
+        self.tracer = tracer
+        self.trace = Trace(request_id, name)
+        self.root = _Span(self.trace, name, attributes)
+
+    def set_attribute(self, key, value):
+        self.root.set_attribute(key, value)
+
+    def __enter__(self):
+        self.tracer._store(self.trace)
+        self._trace_token = _current_trace.set(self.trace)
+        self.root.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.root.__exit__(exc_type, exc_value, traceback)
+        _current_trace.reset(self._trace_token)
+        self.trace.finished = True
+        return False
+
+
+# Process-wide tracer, configured from config.TRACING_CONFIG by app.py
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
@@ -0,0 +1,1206 @@
+# cognisphere_adk/services/vector_store.py
+"""
+Vector stores behind DatabaseService's "memories" collection.
+
+Both backends expose the subset of the Chroma collection API that
+DatabaseService uses (add, query, get, update, delete, count), with results
+in Chroma's shape, so the rest of the code doesn't depend on the backend.
+
+- "chroma": a chromadb PersistentClient collection (the original storage).
+- "numpy": an in-process store for single-node deployments. Embeddings are
+  normalized float32 rows of a memory-mapped matrix; metadata is kept in
+  parallel columnar arrays. A query is one matrix-vector product plus
+  argpartition, and metadata filters are evaluated column-wise.
+  With quantization="int8" queries scan per-dimension int8 codes instead of
+  the float matrix (see services/quantization.py) and the top candidates
+  are re-scored with their float vectors.
+  With index="ivfpq" queries visit nprobe inverted lists of product-quantized
+  codes instead of scanning every row. The index is trained offline
+  (train_index, or `python vector_admin.py retrain`); rows added later are
+  encoded with the current codebooks.
+  With pca_dims set, a fitted PCA projection (see services/projection.py)
+  keeps a reduced copy of every row that flat searches scan instead of the
+  full vectors (fit_projection, or `python vector_admin.py fit-pca`).
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from services.projection import PCAProjection
+from services.quantization import IVFPQ, ScalarQuantizer, recall_at_k
+
+INITIAL_CAPACITY = 1024
+
+# With IVF-PQ, metadata filters leaving at most this many rows are searched exactly
+EXACT_SEARCH_ROWS = 20000
+
+
+def create_vector_store(db_path, backend="chroma", name="memories", **options):
+    """
+    Create the vector store for a database directory.
+
+    Args:
+        db_path: Database directory
+        backend: "chroma", "numpy" or "sharded" (NumPy stores in worker processes)
+        name: Collection name
+        options: NumpyVectorStore options (quantization, rescore, index, nprobe, pca_dims, ...);
+            "shards" and "shard_by" for the sharded backend
+
+    Returns:
+        tuple: (vector store, chromadb client or None)
+    """
+    placement = {key: options.pop(key) for key in ("shards", "shard_by", "auto_rebalance") if key in options}
+    if backend == "chroma":
+        if options.get("quantization") not in (None, "none") or options.get("index") not in (None, "flat") \
+                or options.get("pca_dims"):
+            print(f"Warning: vector quantization and indexes need the numpy backend; ignored for {backend}")
+        # Imported here: the NumPy backend never pays for chromadb's import and startup
+        import chromadb
+        client = chromadb.PersistentClient(path=db_path)
+        try:
+            collection = client.get_collection(name=name)
+        except Exception:
+            collection = client.create_collection(name=name)
+        return ChromaVectorStore(collection, client), client
+    if backend == "numpy":
+        return NumpyVectorStore(os.path.join(db_path, f"{name}_vectors"), **options), None
+    if backend == "sharded":
+        from services.sharded_store import ShardedVectorStore
+        return ShardedVectorStore(os.path.join(db_path, f"{name}_shards"), shard_options=options,
+                                  **placement), None
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+
+class VectorStore:
+    """Interface of a memories vector store (a subset of the Chroma collection API)."""
+
+    max_batch_size = 5000
+    # Whether stored embeddings are normalized to unit length
+    normalized = False
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        raise NotImplementedError
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        raise NotImplementedError
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        raise NotImplementedError
+
+    def update(self, ids, metadatas):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ChromaVectorStore(VectorStore):
+    """A Chroma collection."""
+
+    def __init__(self, collection, client=None):
+        self.collection = collection
+        self.client = client
+        try:
+            self.max_batch_size = max(1, int(client.get_max_batch_size()))
+        except Exception:
+            pass
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        query_args = {"query_embeddings": query_embeddings, "n_results": n_results, "include": list(include)}
+        if where:
+            query_args["where"] = where
+        return self.collection.query(**query_args)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        get_args = {"include": list(include)}
+        for key, value in (("ids", ids), ("where", where), ("limit", limit), ("offset", offset)):
+            if value is not None:
+                get_args[key] = value
+        return self.collection.get(**get_args)
+
+    def update(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def count(self):
+        return self.collection.count()
+
+    def get_stats(self):
+        return {"backend": "chroma", "live": self.count(), "max_batch_size": self.max_batch_size}
+
+
+class _Column:
+    """One metadata field across all rows: float64 (NaN = missing), bool (int8, -1 = missing) or object."""
+
+    __slots__ = ("kind", "values", "ints")
+
+    def __init__(self, kind, capacity):
+        self.kind = kind
+        self.ints = True  # Float column whose values were all ints
+        if kind == "float":
+            self.values = np.full(capacity, np.nan)
+        elif kind == "bool":
+            self.values = np.full(capacity, -1, dtype=np.int8)
+        else:
+            self.values = np.full(capacity, None, dtype=object)
+
+    @staticmethod
+    def kind_of(value):
+        if isinstance(value, bool):
+            return "bool"
+        if isinstance(value, (int, float)):
+            return "float"
+        return "object"
+
+    def grow(self, capacity):
+        old = self.values
+        self.values = _Column(self.kind, capacity).values
+        self.values[:len(old)] = old
+
+    def to_object(self, size):
+        """Demote to an object column (mixed value types)."""
+        values = np.full(len(self.values), None, dtype=object)
+        for row in range(size):
+            values[row] = self.get(row)
+        self.kind, self.values = "object", values
+
+    def set(self, row, value):
+        if value is None:
+            self.values[row] = np.nan if self.kind == "float" else (-1 if self.kind == "bool" else None)
+        elif self.kind == "float":
+            self.ints = self.ints and isinstance(value, int)
+            self.values[row] = value
+        elif self.kind == "bool":
+            self.values[row] = int(value)
+        else:
+            self.values[row] = value
+
+    def get(self, row):
+        value = self.values[row]
+        if self.kind == "float":
+            if np.isnan(value):
+                return None
+            return int(value) if self.ints else float(value)
+        if self.kind == "bool":
+            return None if value < 0 else bool(value)
+        return value
+
+    def comparable(self, size):
+        """Values as an array comparable with plain Python values (missing = None/NaN)."""
+        if self.kind == "bool":
+            values = self.values[:size].astype(object)
+            values[self.values[:size] < 0] = None
+            return values == 1
+        return self.values[:size]
+
+    def save(self, path, size):
+        """Write the first `size` values: .npy for numeric columns, a JSON list for object columns."""
+        # json.dumps, not json.dump: only the one-shot encoder runs in C
+        if self.kind == "object":
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(self.values[:size].tolist()))
+        else:
+            np.save(path, self.values[:size])
+
+    @classmethod
+    def load(cls, path, kind, ints, size, capacity):
+        column = cls(kind, capacity)
+        column.ints = ints
+        if kind == "object":
+            with open(path, "r", encoding="utf-8") as f:
+                column.values[:size] = np.fromiter(json.load(f), dtype=object, count=size)
+        else:
+            column.values[:size] = np.load(path)
+        return column
+
+
+class _Documents:
+    """Row documents: snapshot rows read on demand from an offset-indexed UTF-8 file, later rows in a list."""
+
+    __slots__ = ("text", "offsets", "missing", "added")
+
+    def __init__(self, text_path=None, index_path=None):
+        self.text = None
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.missing = np.zeros(0, dtype=bool)
+        self.added = []
+        if index_path is not None:
+            with np.load(index_path) as index:
+                self.offsets, self.missing = index["offsets"], index["missing"]
+            if self.offsets[-1]:
+                self.text = np.memmap(text_path, dtype=np.uint8, mode="r", shape=(int(self.offsets[-1]),))
+
+    def __len__(self):
+        return len(self.missing) + len(self.added)
+
+    def __getitem__(self, row):
+        if row >= len(self.missing):
+            return self.added[row - len(self.missing)]
+        if self.missing[row]:
+            return None
+        return self.text[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    def append(self, document):
+        self.added.append(document)
+
+    def save(self, text_path, index_path):
+        """Write all documents; snapshot rows are copied as bytes, only later rows are encoded."""
+        added = [None if document is None else document.encode("utf-8") for document in self.added]
+        lengths = np.fromiter((len(document or b"") for document in added), dtype=np.int64, count=len(added))
+        offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)])
+        missing = np.concatenate([self.missing, np.fromiter((document is None for document in added),
+                                                            dtype=bool, count=len(added))])
+        with open(text_path, "wb") as f:
+            if self.text is not None:
+                f.write(self.text)
+            f.writelines(document for document in added if document)
+        with open(index_path, "wb") as f:
+            np.savez(f, offsets=offsets, missing=missing)
+
+
+class NumpyVectorStore(VectorStore):
+    """Normalized float32 embeddings in a memory-mapped matrix, metadata in columnar arrays."""
+
+    max_batch_size = 100000
+    normalized = True
+
+    # Operations logged since the last snapshot before a new snapshot is written
+    # (at least a quarter of the rows, so snapshot writes stay proportional to the changes)
+    CHECKPOINT_EVERY = 10000
+
+    def __init__(self, path, quantization=None, rescore=4, calibration_sample=20000, index="flat",
+                 nprobe=16, nlist=1024, pq_subquantizers=48, train_sample=50000, pca_dims=0,
+                 pca_sample=20000):
+        """
+        Args:
+            path: Directory holding vectors.f32, the snapshot (snapshot.json and the
+                snapshot-<version>-* files it points to) and rows.jsonl (log)
+            quantization: None/"none" (scan float32 vectors) or "int8" (scan codes.i8)
+            rescore: With int8, IVF-PQ or PCA, re-score k * rescore candidates with
+                their float vectors (0: return the approximate ranking)
+            calibration_sample: Maximum number of vectors the int8 scale/offset are fitted on
+            index: "flat" (scan every row) or "ivfpq" (once trained, see train_index)
+            nprobe: IVF-PQ inverted lists visited per query
+            nlist: IVF-PQ coarse centroids used by train_index
+            pq_subquantizers: IVF-PQ bytes per code (must divide the dimension)
+            train_sample: Maximum number of vectors train_index fits on
+            pca_dims: Use the fitted PCA projection (0: off) and the dimension
+                fit_projection reduces to; flat searches then scan the reduced
+                vectors instead of int8 codes or full vectors
+            pca_sample: Maximum number of vectors fit_projection fits on
+        """
+        if quantization not in (None, "none", "int8"):
+            raise ValueError(f"Unknown vector quantization: {quantization}")
+        if index not in ("flat", "ivfpq"):
+            raise ValueError(f"Unknown vector index: {index}")
+        self.path = path
+        self.quantization = None if quantization == "none" else quantization
+        self.rescore = rescore
+        self.calibration_sample = calibration_sample
+        self.index = index
+        self.nprobe = nprobe
+        self.nlist = nlist
+        self.pq_subquantizers = pq_subquantizers
+        self.train_sample = train_sample
+        self.pca_dims = pca_dims
+        self.pca_sample = pca_sample
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._codes_path = os.path.join(path, "codes.i8")
+        # Rows codes.i8 is valid for, written when rows are added without quantization
+        self._codes_valid_path = os.path.join(path, "codes.json")
+        self._quantizer_path = os.path.join(path, "quantizer.npz")
+        self._snapshot_path = os.path.join(path, "snapshot.json")
+        # Snapshot format before the columnar one: a single JSON document, read once and replaced
+        self._legacy_snapshot_path = os.path.join(path, "rows.json")
+        self._log_path = os.path.join(path, "rows.jsonl")
+
+        self.dim = None
+        self._capacity = 0
+        self._size = 0
+        self._vectors = None
+        self._codes = None
+        self._quantizer = None
+        self._ivf = None
+        self._pq_codes = None
+        self._ivf_lists = None
+        self._projection = None
+        self._reduced = None
+        self._ids = []
+        self._documents = _Documents()
+        self._row_of = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._columns = {}
+        self._snapshot_version = 0
+        self._log = None
+        self._logged = 0
+        self._load()
+        if self.quantization:
+            self._load_quantizer()
+        # Without quantization new rows get no codes: the first add records where they stop
+        self._mark_codes = (not self.quantization and os.path.exists(self._quantizer_path)
+                            and not os.path.exists(self._codes_valid_path))
+        if self.index == "ivfpq":
+            self._load_ivf()
+        if self.pca_dims:
+            self._load_projection()
+
+    # --- Persistence ---
+
+    def _snapshot_file(self, name, version):
+        return os.path.join(self.path, f"snapshot-{version}-{name}")
+
+    def _load(self):
+        if os.path.exists(self._snapshot_path):
+            self._load_snapshot()
+        elif os.path.exists(self._legacy_snapshot_path):
+            with open(self._legacy_snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.dim = snapshot["dim"]
+            self._reserve(len(snapshot["ids"]))
+            for row, (memory_id, document, live) in enumerate(
+                    zip(snapshot["ids"], snapshot["documents"], snapshot["live"])):
+                self._append_row(memory_id, document, {})
+                self._live[row] = live
+                if not live:
+                    del self._row_of[memory_id]
+            for name, column in snapshot["columns"].items():
+                for row, value in enumerate(column):
+                    if value is not None:
+                        self._set_metadata(row, name, value)
+
+        if os.path.exists(self._log_path):
+            log_snapshot = 0  # Version named by the log's header record (none before versioned logs)
+            with open(self._log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Última linha incompleta
+                    if record["op"] == "log":
+                        log_snapshot = record["snapshot"]
+                        continue
+                    if log_snapshot != self._snapshot_version:
+                        # Crash between writing snapshot.json and resetting the log: the snapshot holds it all
+                        print(f"Vector store {self.path}: ignoring a log older than snapshot {self._snapshot_version}")
+                        self._reset_log()
+                        break
+                    self._apply(record)
+                    self._logged += 1
+
+    def _load_snapshot(self):
+        """Load the columnar snapshot: arrays and JSON lists, no per-row work beyond building the ID map."""
+        with open(self._snapshot_path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        version, size = snapshot["version"], snapshot["rows"]
+        self._snapshot_version = version
+        self.dim = snapshot["dim"]
+        self._reserve(size)
+
+        with open(self._snapshot_file("ids.json", version), "r", encoding="utf-8") as f:
+            self._ids = json.load(f)
+        self._live[:size] = np.load(self._snapshot_file("live.npy", version))
+        live = self._live[:size]
+        self._row_of = dict(zip(itertools.compress(self._ids, live.tolist()), np.flatnonzero(live).tolist()))
+        self._documents = _Documents(self._snapshot_file("documents.utf8", version),
+                                     self._snapshot_file("documents.npz", version))
+        for i, spec in enumerate(snapshot["columns"]):
+            path = self._snapshot_file(f"column{i}.json" if spec["kind"] == "object" else f"column{i}.npy", version)
+            self._columns[spec["name"]] = _Column.load(path, spec["kind"], spec["ints"], size, self._capacity)
+        self._size = size
+        self._remove_snapshots(keep=version)
+
+    def _remove_snapshots(self, keep):
+        """Remove the files of snapshots other than `keep` (left behind by a crash or still mapped on Windows)."""
+        keep = f"snapshot-{keep}-"
+        for name in os.listdir(self.path):
+            if name.startswith("snapshot-") and not name.startswith(keep):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    def _load_quantizer(self):
+        """Load the int8 calibration, or calibrate now (store created or used without quantization)."""
+        if os.path.exists(self._quantizer_path) and os.path.exists(self._codes_path):
+            self._quantizer = ScalarQuantizer.load(self._quantizer_path)
+            if self.dim is not None:
+                self._codes = self._map(self._codes_path, np.int8, self._capacity)
+                # Encode the rows added while the store was opened without quantization
+                valid = self._size
+                if os.path.exists(self._codes_valid_path):
+                    with open(self._codes_valid_path, "r", encoding="utf-8") as f:
+                        valid = json.load(f)["rows"]
+                for start in range(valid, self._size, 65536):
+                    end = min(start + 65536, self._size)
+                    self._codes[start:end] = self._quantizer.encode(self._vectors[start:end])
+                self._codes.flush()
+        elif self._size:
+            self.calibrate()
+        if os.path.exists(self._codes_valid_path):
+            os.remove(self._codes_valid_path)
+
+    def _ivf_file(self, kind, version):
+        return os.path.join(self.path, {"index": f"ivfpq-{version}.npz", "codes": f"pq_codes-{version}.u8",
+                                        "lists": f"ivf_lists-{version}.i32"}[kind])
+
+    def _load_ivf(self):
+        """Open the current IVF-PQ version and encode rows stored while the index was off."""
+        pointer = os.path.join(self.path, "ivfpq.json")
+        if not os.path.exists(pointer):
+            if self._size >= EXACT_SEARCH_ROWS:
+                print(f"Vector store {self.path}: IVF-PQ index not trained yet, "
+                      f"searching all {self._size} rows (run `python vector_admin.py retrain`)")
+            return
+        with open(pointer, "r", encoding="utf-8") as f:
+            version = json.load(f)["version"]
+        ivf = IVFPQ.load(self._ivf_file("index", version))
+        self._pq_codes = self._map(self._ivf_file("codes", version), np.uint8, self._capacity,
+                                   ivf.pq.subquantizers)
+        # List number + 1 per row; 0 = not encoded
+        self._ivf_lists = self._map(self._ivf_file("lists", version), np.int32, self._capacity, 1)
+        self._ivf = ivf
+
+        missing = np.flatnonzero(self._ivf_lists[:self._size, 0] == 0)
+        for start in range(0, len(missing), 65536):
+            rows = missing[start:start + 65536]
+            lists, codes = ivf.encode(self._vectors[rows])
+            self._pq_codes[rows] = codes
+            self._ivf_lists[rows, 0] = lists + 1
+        self._flush()
+        ivf.build_lists(self._ivf_lists[:self._size, 0].astype(np.int64) - 1)
+
+    def _projection_file(self, kind, version):
+        return os.path.join(self.path, {"projection": f"pca-{version}.npz", "reduced": f"reduced-{version}.f32"}[kind])
+
+    def _load_projection(self):
+        """Open the current PCA version and project rows stored while it was off."""
+        pointer = os.path.join(self.path, "pca.json")
+        if not os.path.exists(pointer):
+            if self._size >= EXACT_SEARCH_ROWS:
+                print(f"Vector store {self.path}: PCA projection not fitted yet, "
+                      f"searching full vectors (run `python vector_admin.py fit-pca`)")
+            return
+        with open(pointer, "r", encoding="utf-8") as f:
+            version = json.load(f)["version"]
+        projection = PCAProjection.load(self._projection_file("projection", version))
+        if projection.dims != self.pca_dims:
+            print(f"Vector store {self.path}: PCA fitted with {projection.dims} dimensions "
+                  f"(configured {self.pca_dims}); run `python vector_admin.py fit-pca` to change it")
+        self._reduced = self._map(self._projection_file("reduced", version), np.float32, self._capacity,
+                                  projection.dims)
+        self._projection = projection
+
+        # Live rows without a reduced vector (all zeros) were added while the projection was off
+        for start in range(0, self._size, 65536):
+            end = min(start + 65536, self._size)
+            missing = start + np.flatnonzero(~self._reduced[start:end].any(axis=1) & self._live[start:end])
+            if len(missing):
+                self._reduced[missing] = projection.transform(self._vectors[missing])
+        self._flush()
+
+    def _apply(self, record):
+        op = record["op"]
+        if op == "dim":
+            self.dim = record["dim"]
+        elif op == "add":
+            self._reserve(self._size + 1)
+            row = self._append_row(record["id"], record.get("document"), record.get("metadata") or {})
+            if row != record["row"]:
+                raise ValueError(f"Vector store log out of order at row {record['row']}")
+        elif op == "update":
+            self._update_row(record["id"], record["metadata"])
+        elif op == "delete":
+            for memory_id in record["ids"]:
+                self._delete_row(memory_id)
+
+    def _reset_log(self):
+        """Start an empty log whose header names the snapshot it continues."""
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        with open(self._log_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"op": "log", "snapshot": self._snapshot_version}) + "\n")
+        self._logged = 0
+
+    def _write_log(self, records):
+        if self._log is None:
+            self._log = open(self._log_path, "a", encoding="utf-8")
+        self._log.write("".join(json.dumps(record) + "\n" for record in records))
+        self._log.flush()
+        self._logged += len(records)
+        if self._logged >= max(self.CHECKPOINT_EVERY, self._size // 4):
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Write a columnar snapshot and start an empty log.
+
+        Each metadata column is one .npy array (a JSON list for object columns),
+        ids are a JSON list and documents an offset-indexed UTF-8 file, so
+        neither writing nor loading a snapshot goes through the rows one by one.
+        snapshot.json points to the current version.
+        """
+        with self._lock:
+            self._flush()
+            version, size = self._snapshot_version + 1, self._size
+            with open(self._snapshot_file("ids.json", version), "w", encoding="utf-8") as f:
+                f.write(json.dumps(self._ids))
+            np.save(self._snapshot_file("live.npy", version), self._live[:size])
+            self._documents.save(self._snapshot_file("documents.utf8", version),
+                                 self._snapshot_file("documents.npz", version))
+            columns = []
+            for i, (name, column) in enumerate(self._columns.items()):
+                path = self._snapshot_file(f"column{i}.json" if column.kind == "object" else f"column{i}.npy",
+                                           version)
+                column.save(path, size)
+                columns.append({"name": name, "kind": column.kind, "ints": column.ints})
+
+            with open(self._snapshot_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"version": version, "dim": self.dim, "rows": size, "columns": columns}, f)
+            os.replace(self._snapshot_path + ".tmp", self._snapshot_path)
+            self._snapshot_version = version
+            self._reset_log()
+
+            # Read documents from the new files from now on, then drop the previous version
+            self._documents = _Documents(self._snapshot_file("documents.utf8", version),
+                                         self._snapshot_file("documents.npz", version))
+            self._remove_snapshots(keep=version)
+            if os.path.exists(self._legacy_snapshot_path):
+                os.remove(self._legacy_snapshot_path)
+
+    def close(self):
+        with self._lock:
+            if self._logged:
+                self.checkpoint()
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            self._flush()
+
+    def _flush(self):
+        for matrix in (self._vectors, self._codes, self._pq_codes, self._ivf_lists, self._reduced):
+            if matrix is not None:
+                matrix.flush()
+
+    # --- Quantization ---
+
+    def calibrate(self, sample_size=None):
+        """
+        Fit the int8 scale/offset on a sample of live vectors and re-encode every row.
+
+        Runs automatically while the store is small (each time it doubles, up to
+        calibration_sample rows); call it again after the data distribution
+        drifts.
+
+        Returns:
+            int: Number of vectors the quantizer was fitted on
+        """
+        with self._lock:
+            if not self.quantization or self.dim is None:
+                return 0
+            live = np.flatnonzero(self._live[:self._size])
+            sample_size = sample_size or self.calibration_sample
+            if len(live) > sample_size:
+                live = np.sort(np.random.default_rng(len(live)).choice(live, sample_size, replace=False))
+            if len(live) == 0:
+                return 0
+            quantizer = ScalarQuantizer().fit(self._vectors[live])
+
+            self._codes = self._map(self._codes_path, np.int8, self._capacity)
+            for start in range(0, self._size, 65536):
+                end = min(start + 65536, self._size)
+                self._codes[start:end] = quantizer.encode(self._vectors[start:end])
+            self._codes.flush()
+            quantizer.save(self._quantizer_path + ".tmp")
+            os.replace(self._quantizer_path + ".tmp", self._quantizer_path)
+            self._quantizer = quantizer
+            return quantizer.trained_rows
+
+    def _encode_rows(self, start, end):
+        """Write the codes of new rows [start, end) for the enabled quantizers and projection."""
+        if self._projection is not None:
+            self._reduced[start:end] = self._projection.transform(self._vectors[start:end])
+        if self._ivf is not None:
+            lists, codes = self._ivf.encode(self._vectors[start:end])
+            self._pq_codes[start:end] = codes
+            self._ivf_lists[start:end, 0] = lists + 1
+            self._ivf.add_to_lists(np.arange(start, end), lists)
+
+        if not self.quantization:
+            return
+        # int8: recalibrate while the store is small
+        quantizer = self._quantizer
+        if quantizer is None or (quantizer.trained_rows < self.calibration_sample
+                                 and end >= 2 * quantizer.trained_rows):
+            self.calibrate()
+            return
+        self._codes[start:end] = quantizer.encode(self._vectors[start:end])
+
+    def train_index(self, sample_size=None, iterations=10):
+        """
+        Train (or retrain) the IVF-PQ index on a sample of live vectors and encode every row.
+
+        The new codebooks and codes are written as a new version next to the
+        current one and switched to atomically; the old version is removed.
+
+        Returns:
+            dict: version, nlist, subquantizers, trained_rows and encoded rows
+        """
+        with self._lock:
+            if self.dim is None:
+                raise ValueError("Cannot train an index on an empty vector store")
+            live = np.flatnonzero(self._live[:self._size])
+            sample_size = sample_size or self.train_sample
+            if len(live) > sample_size:
+                live = np.sort(np.random.default_rng(len(live)).choice(live, sample_size, replace=False))
+            old = self._ivf
+            version = old.version + 1 if old is not None else 1
+            ivf = IVFPQ(version=version).train(self._vectors[live], self.nlist, self.pq_subquantizers, iterations)
+
+            pq_codes = self._map(self._ivf_file("codes", version), np.uint8, self._capacity, ivf.pq.subquantizers)
+            ivf_lists = self._map(self._ivf_file("lists", version), np.int32, self._capacity, 1)
+            for start in range(0, self._size, 65536):
+                end = min(start + 65536, self._size)
+                lists, codes = ivf.encode(self._vectors[start:end])
+                pq_codes[start:end] = codes
+                ivf_lists[start:end, 0] = lists + 1
+            pq_codes.flush()
+            ivf_lists.flush()
+            ivf.save(self._ivf_file("index", version))
+
+            pointer = os.path.join(self.path, "ivfpq.json")
+            with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"version": version, "trained_rows": ivf.trained_rows, "nlist": ivf.nlist,
+                           "subquantizers": ivf.pq.subquantizers}, f)
+            os.replace(pointer + ".tmp", pointer)
+
+            ivf.build_lists(ivf_lists[:self._size, 0].astype(np.int64) - 1)
+            self._ivf, self._pq_codes, self._ivf_lists = ivf, pq_codes, ivf_lists
+            if old is not None:
+                for kind in ("index", "codes", "lists"):
+                    try:
+                        os.remove(self._ivf_file(kind, old.version))
+                    except OSError:
+                        pass
+            return {"version": version, "nlist": ivf.nlist, "subquantizers": ivf.pq.subquantizers,
+                    "trained_rows": ivf.trained_rows, "encoded": self._size}
+
+    def fit_projection(self, dims=None, sample_size=None):
+        """
+        Fit PCA on a sample of live vectors and project every row.
+
+        Like train_index, the projection and reduced vectors are written as a
+        new version and switched to atomically; the old version is removed.
+
+        Returns:
+            dict: version, dims, explained_variance, fitted_rows and projected rows
+        """
+        with self._lock:
+            dims = dims or self.pca_dims
+            if not dims:
+                raise ValueError("No PCA dimension given (pca_dims is 0)")
+            if self.dim is None:
+                raise ValueError("Cannot fit a projection on an empty vector store")
+            live = np.flatnonzero(self._live[:self._size])
+            sample_size = sample_size or self.pca_sample
+            if len(live) > sample_size:
+                live = np.sort(np.random.default_rng(len(live)).choice(live, sample_size, replace=False))
+            old = self._projection
+            version = old.version + 1 if old is not None else 1
+            projection = PCAProjection(version=version).fit(self._vectors[live], dims)
+
+            reduced = self._map(self._projection_file("reduced", version), np.float32, self._capacity,
+                                projection.dims)
+            for start in range(0, self._size, 65536):
+                end = min(start + 65536, self._size)
+                reduced[start:end] = projection.transform(self._vectors[start:end])
+            reduced.flush()
+            projection.save(self._projection_file("projection", version))
+
+            pointer = os.path.join(self.path, "pca.json")
+            with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"version": version, "dims": projection.dims,
+                           "explained_variance": projection.explained_variance}, f)
+            os.replace(pointer + ".tmp", pointer)
+
+            self._projection, self._reduced = projection, reduced
+            self.pca_dims = projection.dims
+            if old is not None:
+                for kind in ("projection", "reduced"):
+                    try:
+                        os.remove(self._projection_file(kind, old.version))
+                    except OSError:
+                        pass
+            return {"version": version, "dims": projection.dims, "explained_variance": projection.explained_variance,
+                    "fitted_rows": projection.fitted_rows, "projected": self._size}
+
+    # --- Rows ---
+
+    def _reserve(self, size):
+        """Grow the matrix and columns to hold at least `size` rows."""
+        if size <= self._capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, self._capacity)
+        while capacity < size:
+            capacity *= 2
+
+        if self.dim is not None:
+            self._flush()
+            self._vectors = self._map(self._vectors_path, np.float32, capacity)
+            if self._codes is not None:
+                self._codes = self._map(self._codes_path, np.int8, capacity)
+            if self._ivf is not None:
+                self._pq_codes = self._map(self._ivf_file("codes", self._ivf.version), np.uint8, capacity,
+                                           self._ivf.pq.subquantizers)
+                self._ivf_lists = self._map(self._ivf_file("lists", self._ivf.version), np.int32, capacity, 1)
+            if self._projection is not None:
+                self._reduced = self._map(self._projection_file("reduced", self._projection.version), np.float32,
+                                          capacity, self._projection.dims)
+
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live
+        self._live = live
+        for column in self._columns.values():
+            column.grow(capacity)
+        self._capacity = capacity
+
+    def _map(self, path, dtype, capacity, width=None):
+        """Memory-map a (capacity, width or dim) matrix file, growing the file if needed."""
+        width = width or self.dim
+        with open(path, "ab") as f:
+            f.truncate(max(os.path.getsize(path), capacity * width * np.dtype(dtype).itemsize))
+        return np.memmap(path, dtype=dtype, mode="r+", shape=(capacity, width))
+
+    def _append_row(self, memory_id, document, metadata):
+        row = self._size
+        self._ids.append(memory_id)
+        self._documents.append(document)
+        self._row_of[memory_id] = row
+        self._live[row] = True
+        self._size += 1
+        for name, value in metadata.items():
+            self._set_metadata(row, name, value)
+        return row
+
+    def _set_metadata(self, row, name, value):
+        column = self._columns.get(name)
+        if column is None:
+            column = self._columns[name] = _Column(_Column.kind_of(value), self._capacity)
+        elif value is not None and column.kind != "object" and _Column.kind_of(value) != column.kind:
+            column.to_object(self._size)
+        column.set(row, value)
+
+    def _update_row(self, memory_id, metadata):
+        row = self._row_of.get(memory_id)
+        if row is None:
+            return
+        for name, value in metadata.items():
+            self._set_metadata(row, name, value)
+
+    def _delete_row(self, memory_id):
+        row = self._row_of.pop(memory_id, None)
+        if row is not None:
+            self._live[row] = False
+            if self._vectors is not None:
+                self._vectors[row] = 0.0
+            if self._codes is not None:
+                self._codes[row] = 0
+
+    def _metadata(self, row):
+        metadata = {}
+        for name, column in self._columns.items():
+            value = column.get(row)
+            if value is not None:
+                metadata[name] = value
+        return metadata
+
+    # --- Filters ---
+
+    def _where_mask(self, where):
+        """Evaluate a Chroma where filter over all rows at once."""
+        size = self._size
+        mask = np.ones(size, dtype=bool)
+        for key, condition in (where or {}).items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+                continue
+            if key == "$or":
+                any_mask = np.zeros(size, dtype=bool)
+                for clause in condition:
+                    any_mask |= self._where_mask(clause)
+                mask &= any_mask
+                continue
+
+            column = self._columns.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                if column is None:
+                    mask &= operator in ("$ne", "$nin")
+                    continue
+                values = column.comparable(size)
+                if operator == "$eq":
+                    mask &= np.asarray(values == operand, dtype=bool)
+                elif operator == "$ne":
+                    mask &= ~np.asarray(values == operand, dtype=bool)
+                elif operator in ("$in", "$nin"):
+                    operands = set(operand)
+                    found = np.fromiter((value in operands for value in values), dtype=bool, count=size)
+                    mask &= found if operator == "$in" else ~found
+                elif operator in ("$gt", "$gte", "$lt", "$lte"):
+                    if column.kind != "float":
+                        raise ValueError(f"Range filter {operator} on non-numeric field '{key}'")
+                    with np.errstate(invalid="ignore"):
+                        compare = {"$gt": np.greater, "$gte": np.greater_equal,
+                                   "$lt": np.less, "$lte": np.less_equal}[operator]
+                        mask &= compare(values, operand)
+                else:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+        return mask
+
+    # --- Collection API ---
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        """Add rows; IDs already stored are ignored (like Chroma)."""
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            new = [i for i, memory_id in enumerate(ids) if memory_id not in self._row_of]
+            new = list({ids[i]: i for i in new}.values())
+            if not new:
+                return
+
+            vectors = np.asarray([embeddings[i] for i in new], dtype=np.float32)
+            if vectors.ndim != 2:
+                raise ValueError("Embeddings must all have the same dimension")
+            records = []
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                records.append({"op": "dim", "dim": self.dim})
+                self._capacity = 0
+                self._reserve(max(INITIAL_CAPACITY, len(new)))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store ({self.dim})")
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+            self._reserve(self._size + len(new))
+            start = self._size
+            if self._mark_codes:
+                with open(self._codes_valid_path, "w", encoding="utf-8") as f:
+                    json.dump({"rows": start}, f)
+                self._mark_codes = False
+            # Vectors and codes first: a row only exists once its log record is written
+            self._vectors[start:start + len(new)] = vectors
+            for i in new:
+                metadata = metadatas[i] or {}
+                row = self._append_row(ids[i], documents[i], metadata)
+                records.append({"op": "add", "row": row, "id": ids[i], "document": documents[i],
+                                "metadata": metadata})
+            if self.quantization or self._ivf is not None or self._projection is not None:
+                self._encode_rows(start, self._size)
+            self._flush()
+            self._write_log(records)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        """Top-k rows per query embedding; distances are squared L2 between unit vectors."""
+        include = set(include)
+        results = {"ids": [], "documents": [] if "documents" in include else None,
+                   "metadatas": [] if "metadatas" in include else None,
+                   "distances": [] if "distances" in include else None,
+                   "embeddings": [] if "embeddings" in include else None}
+
+        with self._lock:
+            size = self._size
+            queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+            if size == 0 or self.dim is None:
+                for key in results:
+                    if results[key] is not None:
+                        results[key] = [[] for _ in range(len(queries))]
+                return results
+            if queries.shape[1] != self.dim:
+                raise ValueError(f"Query dimension {queries.shape[1]} does not match the store ({self.dim})")
+            queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+            mask = self._live[:size].copy()
+            if where:
+                mask &= self._where_mask(where)
+
+            for rows, similarities in self._search(queries, n_results, mask):
+                results["ids"].append([self._ids[row] for row in rows])
+                if results["documents"] is not None:
+                    results["documents"].append([self._documents[row] for row in rows])
+                if results["metadatas"] is not None:
+                    results["metadatas"].append([self._metadata(row) for row in rows])
+                if results["distances"] is not None:
+                    results["distances"].append(np.maximum(0.0, 2.0 - 2.0 * similarities).tolist())
+                if results["embeddings"] is not None:
+                    results["embeddings"].append(np.array(self._vectors[rows]))
+        return results
+
+    def _search(self, queries, k, mask, exact=False, rescore=None, nprobe=None):
+        """
+        Top-k rows per normalized query among the rows selected by mask.
+
+        Args:
+            exact: Scan the float vectors even when codes exist
+            rescore: Override of self.rescore for the approximate searches
+            nprobe: Override of self.nprobe
+
+        Returns:
+            list: (rows, cosine similarities) per query, best first
+        """
+        size = len(mask)
+        candidates = None if mask.all() else np.flatnonzero(mask)
+        count = size if candidates is None else len(candidates)
+        k = min(k, count)
+        rescore = self.rescore if rescore is None else rescore
+        if self._ivf is not None and not exact and count > EXACT_SEARCH_ROWS:
+            return [self._search_ivf(query, k, mask if candidates is not None else None, rescore,
+                                     nprobe or self.nprobe) for query in queries]
+        projected = self._projection is not None and not exact
+        quantized = not projected and self._codes is not None and self._quantizer is not None and not exact
+
+        if projected:
+            scores = self._projected_scores(self._projection, self._reduced, queries, size, candidates)
+        elif quantized:
+            scores = self._quantizer.scores(self._codes[:size], queries, candidates)
+        else:
+            scores = self._vectors[:size] @ queries.T if candidates is None else self._vectors[candidates] @ queries.T
+        return self._select(scores, candidates, queries, k, rescore if projected or quantized else 0)
+
+    @staticmethod
+    def _projected_scores(projection, reduced, queries, size, candidates):
+        """Approximate dot products from reduced vectors: z . y + q . mean."""
+        reduced_queries, offsets = projection.transform_queries(queries)
+        matrix = reduced[:size] if candidates is None else reduced[candidates]
+        return matrix @ reduced_queries.T + offsets
+
+    def _select(self, scores, candidates, queries, k, rescore):
+        """Top-k per query column of scores, re-scoring k * rescore candidates when rescore is set."""
+        found = []
+        for q, column in enumerate(scores.T):
+            top = _top_k(column, min(len(column), k * rescore) if rescore else k)
+            rows = top if candidates is None else candidates[top]
+            similarities = column[top]
+            if rescore:
+                rows, similarities = self._rescore(rows, queries[q], k)
+            found.append((rows, similarities))
+        return found
+
+    def _search_ivf(self, query, k, mask, rescore, nprobe):
+        """IVF-PQ search for one query; mask is None when every row may be returned."""
+        if mask is None:
+            mask = self._live[:self._size]
+        rows, scores = self._ivf.search(self._pq_codes, query, nprobe, mask)
+        top = _top_k(scores, min(len(scores), k * rescore if rescore else k))
+        rows, similarities = rows[top], scores[top]
+        if rescore:
+            rows, similarities = self._rescore(rows, query, k)
+        return rows, similarities
+
+    def _rescore(self, rows, query, k):
+        """Exact top-k of candidate rows with their float vectors."""
+        # Sorted rows read the float matrix sequentially
+        rows = np.sort(rows)
+        similarities = self._vectors[rows] @ query
+        best = _top_k(similarities, k)
+        return rows[best], similarities[best]
+
+    def evaluate_recall(self, query_embeddings, k=10, rescore_factors=(0, 2, 4, 8), nprobes=None):
+        """
+        recall@k of the approximate search (IVF-PQ if trained, else int8) against exact float search.
+
+        Args:
+            query_embeddings: Query vectors
+            k: Cut-off
+            rescore_factors: Re-score settings to measure (0: codes only)
+            nprobes: IVF-PQ nprobe settings to measure (default: self.nprobe)
+
+        Returns:
+            dict: {"recall@k[rescore=N]": recall} per factor, keyed
+                "recall@k[nprobe=P,rescore=N]" with IVF-PQ
+        """
+        with self._lock:
+            if self._ivf is None and (not self.quantization or self._codes is None):
+                raise ValueError("Recall evaluation needs int8 quantization or a trained IVF-PQ index")
+            queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+            queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+            mask = self._live[:self._size]
+            truth = [rows for rows, _ in self._search(queries, k, mask, exact=True)]
+            if self._ivf is None:
+                return {
+                    f"recall@{k}[rescore={factor}]": recall_at_k(
+                        truth, [rows for rows, _ in self._search(queries, k, mask, rescore=factor)], k)
+                    for factor in rescore_factors
+                }
+            return {
+                f"recall@{k}[nprobe={nprobe},rescore={factor}]": recall_at_k(
+                    truth, [self._search_ivf(query, k, None, factor, nprobe)[0] for query in queries], k)
+                for nprobe in (nprobes or [self.nprobe]) for factor in rescore_factors
+            }
+
+    def evaluate_projection(self, dims=(64, 128, 256), k=10, queries=200, rescore_factors=(0,), sample_size=None):
+        """
+        recall@k of searches on PCA-reduced vectors against exact search, per dimension.
+
+        Projections are fitted on a sample like fit_projection but not saved.
+        Queries are stored vectors, left out of the searched rows.
+
+        Args:
+            dims: Reduced dimensions to measure
+            k: Cut-off
+            queries: Number of stored vectors used as queries
+            rescore_factors: Re-score settings to measure (0: reduced ranking only)
+            sample_size: Vectors each projection is fitted on (default pca_sample)
+
+        Returns:
+            dict: Per dimension: explained_variance, index_bytes, scan_ms (per
+                query), recall@k and recall_loss@k per rescore factor
+        """
+        with self._lock:
+            size = self._size
+            live = np.flatnonzero(self._live[:size])
+            if len(live) <= queries + k:
+                raise ValueError(f"Need more than {queries + k} stored vectors to evaluate the projection")
+            rng = np.random.default_rng(len(live))
+            query_rows = rng.choice(live, queries, replace=False)
+            query_vectors = np.asarray(self._vectors[query_rows])
+            mask = self._live[:size].copy()
+            mask[query_rows] = False
+            candidates = np.flatnonzero(mask)
+            sample_size = sample_size or self.pca_sample
+            sample = live if len(live) <= sample_size else np.sort(rng.choice(live, sample_size, replace=False))
+            sample = np.asarray(self._vectors[sample])
+
+            truth = [rows for rows, _ in self._search(query_vectors, k, mask, exact=True)]
+            report = {self.dim: {"explained_variance": 1.0, "index_bytes": len(live) * self.dim * 4}}
+            for target in dims:
+                projection = PCAProjection().fit(sample, target)
+                reduced = np.empty((size, projection.dims), dtype=np.float32)
+                for start in range(0, size, 65536):
+                    reduced[start:start + 65536] = projection.transform(self._vectors[start:min(start + 65536, size)])
+                started = time.perf_counter()
+                scores = self._projected_scores(projection, reduced, query_vectors, size, candidates)
+                entry = {
+                    "explained_variance": projection.explained_variance,
+                    "index_bytes": len(live) * projection.dims * 4,
+                    "scan_ms": (time.perf_counter() - started) * 1000.0 / queries
+                }
+                for factor in rescore_factors:
+                    found = [rows for rows, _ in self._select(scores, candidates, query_vectors, k, factor)]
+                    recall = recall_at_k(truth, found, k)
+                    entry[f"recall@{k}[rescore={factor}]"] = recall
+                    entry[f"recall_loss@{k}[rescore={factor}]"] = 1.0 - recall
+                report[projection.dims] = entry
+            return report
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        include = set(include)
+        with self._lock:
+            if ids is not None:
+                rows = [self._row_of[memory_id] for memory_id in ids if memory_id in self._row_of]
+                if where:
+                    mask = self._where_mask(where)
+                    rows = [row for row in rows if mask[row]]
+            else:
+                mask = self._live[:self._size].copy()
+                if where:
+                    mask &= self._where_mask(where)
+                rows = np.flatnonzero(mask).tolist()
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+
+            return {
+                "ids": [self._ids[row] for row in rows],
+                "documents": [self._documents[row] for row in rows] if "documents" in include else None,
+                "metadatas": [self._metadata(row) for row in rows] if "metadatas" in include else None,
+                "embeddings": (np.array(self._vectors[rows]) if rows else np.empty((0, self.dim or 0)))
+                if "embeddings" in include else None
+            }
+
+    def update(self, ids, metadatas):
+        """Merge metadata into existing rows."""
+        with self._lock:
+            records = []
+            for memory_id, metadata in zip(ids, metadatas):
+                if memory_id in self._row_of and metadata:
+                    self._update_row(memory_id, metadata)
+                    records.append({"op": "update", "id": memory_id, "metadata": metadata})
+            if records:
+                self._write_log(records)
+
+    def delete(self, ids):
+        with self._lock:
+            ids = [memory_id for memory_id in ids if memory_id in self._row_of]
+            if not ids:
+                return
+            for memory_id in ids:
+                self._delete_row(memory_id)
+            self._flush()
+            self._write_log([{"op": "delete", "ids": ids}])
+
+    def count(self):
+        with self._lock:
+            return len(self._row_of)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "backend": "numpy",
+                "rows": self._size,
+                "live": len(self._row_of),
+                "capacity": self._capacity,
+                "dim": self.dim,
+                "vector_bytes": self._capacity * (self.dim or 0) * 4,
+                "quantization": self.quantization,
+                "code_bytes": self._capacity * (self.dim or 0) if self._codes is not None else 0,
+                "calibrated_on": self._quantizer.trained_rows if self._quantizer is not None else 0,
+                "rescore": self.rescore,
+                "index": self.index,
+                "ivfpq": {
+                    "version": self._ivf.version,
+                    "nlist": self._ivf.nlist,
+                    "subquantizers": self._ivf.pq.subquantizers,
+                    "trained_rows": self._ivf.trained_rows,
+                    "nprobe": self.nprobe,
+                    "code_bytes": self._capacity * self._ivf.pq.subquantizers
+                } if self._ivf is not None else None,
+                "pca": {
+                    "version": self._projection.version,
+                    "dims": self._projection.dims,
+                    "explained_variance": self._projection.explained_variance,
+                    "fitted_rows": self._projection.fitted_rows,
+                    "reduced_bytes": self._capacity * self._projection.dims * 4
+                } if self._projection is not None else None,
+                "columns": {name: column.kind for name, column in self._columns.items()}
+            }
+
+
+def _top_k(scores, k):
+    """Indexes of the k highest scores, best first."""
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
+    return np.argsort(-scores, kind="stable")
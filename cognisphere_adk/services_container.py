@@ -6,14 +6,18 @@ services_container.py - Contém as instâncias globais dos serviços
 # Inicialize como None primeiramente
 db_service = None
 embedding_service = None
+emotion_classifier = None
+ingestion_queue = None
 
-def initialize_services(db, embedding):
+def initialize_services(db, embedding, emotion=None, ingestion=None):
     """
     Inicializa os serviços globais.
     """
-    global db_service, embedding_service
+    global db_service, embedding_service, emotion_classifier, ingestion_queue
     db_service = db
     embedding_service = embedding
+    emotion_classifier = emotion
+    ingestion_queue = ingestion
 
 def get_db_service():
     """Retorna o serviço de banco de dados."""
@@ -21,4 +25,12 @@ def get_db_service():
 
 def get_embedding_service():
     """Retorna o serviço de embedding."""
-    return embedding_service
\ No newline at end of file
+    return embedding_service
+
+def get_emotion_classifier():
+    """Retorna o classificador de emoções por embedding (None no modo léxico)."""
+    return emotion_classifier
+
+def get_ingestion_queue():
+    """Retorna a fila de ingestão de memórias (None se a escrita for síncrona)."""
+    return ingestion_queue
\ No newline at end of file
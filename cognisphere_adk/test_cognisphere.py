@@ -14,15 +14,28 @@ from google.genai import types
 # Import Cognisphere components
 from services.database import DatabaseService
 from services.embedding import EmbeddingService
-from agents.memory_agent import create_memory_agent
-from agents.narrative_agent import create_narrative_agent
-from agents.greeting_agent import create_greeting_agent
-from agents.orchestrator_agent import create_orchestrator_agent
+from services.mock_llm import register_mock_llm
+import services_container
 import config
 
+# --- LLM backend ---
+# COGNISPHERE_LLM_BACKEND=mock runs this scenario offline against the scripted mock LLM
+if config.LLM_BACKEND == "mock":
+    register_mock_llm(
+        script_path=config.MOCK_LLM_CONFIG["script_path"] or None,
+        latency=config.MOCK_LLM_CONFIG["latency"],
+        seed=config.MOCK_LLM_CONFIG["seed"]
+    )
+
 # --- Initialize Services ---
 db_service = DatabaseService(db_path="./test_cognisphere_db")
-embedding_service = EmbeddingService()
+embedding_service = EmbeddingService(model_name=config.EMBEDDING_CONFIG["model_name"])
+services_container.initialize_services(db_service, embedding_service)
+
+# Agents import the tools, which look the services up in the container
+from agents.memory_agent import create_memory_agent
+from agents.narrative_agent import create_narrative_agent
+from agents.orchestrator_agent import create_orchestrator_agent
 
 # --- Create Session Service ---
 session_service = InMemorySessionService()
@@ -32,17 +45,14 @@ session_id = "test_session"
 
 # --- Initialize Agents ---
 # Set up sub-agents
-memory_agent = create_memory_agent(model="gemini-1.5-flash")
-narrative_agent = create_narrative_agent(model="gemini-1.5-flash")
-greeting_agent, farewell_agent = create_greeting_agent(model="gemini-1.5-flash")
+memory_agent = create_memory_agent(model=LiteLlm(model=config.MODEL_CONFIG["memory"]))
+narrative_agent = create_narrative_agent(model=LiteLlm(model=config.MODEL_CONFIG["narrative"]))
 
 # Create orchestrator
 orchestrator_agent = create_orchestrator_agent(
-    model="gemini-1.5-flash",
+    model=LiteLlm(model=config.MODEL_CONFIG["orchestrator"]),
     memory_agent=memory_agent,
-    narrative_agent=narrative_agent,
-    greeting_agent=greeting_agent,
-    farewell_agent=farewell_agent
+    narrative_agent=narrative_agent
 )
 
 # Create Runner
@@ -57,10 +67,7 @@ session = session_service.create_session(
     app_name=app_name,
     user_id=user_id,
     session_id=session_id,
-    state={
-        "db_service": db_service,
-        "embedding_service": embedding_service
-    }
+    state={}
 )
 
 
@@ -87,44 +94,44 @@ async def test_interaction(message):
     print(f"Cognisphere: {final_response}\n")
     return final_response
 
-    async def run_test_scenario():
-        """Run a complete test scenario."""
-        print("=== Testing Cognisphere ADK Implementation ===\n")
+async def run_test_scenario():
+    """Run a complete test scenario."""
+    print("=== Testing Cognisphere ADK Implementation ===\n")
 
-        # Test 1: Greeting
-        print("Test 1: Greeting and Introduction")
-        await test_interaction("Hello there! I'm Alice.")
+    # Test 1: Greeting
+    print("Test 1: Greeting and Introduction")
+    await test_interaction("Hello there! I'm Alice.")
 
-        # Test 2: Memory Creation
-        print("Test 2: Storing a Memory")
-        await test_interaction("Please remember that I enjoy hiking in the mountains.")
+    # Test 2: Memory Creation
+    print("Test 2: Storing a Memory")
+    await test_interaction("Please remember that I enjoy hiking in the mountains.")
 
-        # Test 3: Memory Recall
-        print("Test 3: Recalling a Memory")
-        await test_interaction("What do I enjoy doing?")
+    # Test 3: Memory Recall
+    print("Test 3: Recalling a Memory")
+    await test_interaction("What do I enjoy doing?")
 
-        # Test 4: Narrative Creation
-        print("Test 4: Creating a Narrative Thread")
-        await test_interaction("I've started learning to play piano last month.")
+    # Test 4: Narrative Creation
+    print("Test 4: Creating a Narrative Thread")
+    await test_interaction("I've started learning to play piano last month.")
 
-        # Test 5: Adding to Narrative
-        print("Test 5: Adding to the Narrative Thread")
-        await test_interaction("Yesterday I had my first piano recital.")
+    # Test 5: Adding to Narrative
+    print("Test 5: Adding to the Narrative Thread")
+    await test_interaction("Yesterday I had my first piano recital.")
 
-        # Test 6: Getting Narrative Summary
-        print("Test 6: Requesting Narrative Summary")
-        await test_interaction("What's my story with the piano?")
+    # Test 6: Getting Narrative Summary
+    print("Test 6: Requesting Narrative Summary")
+    await test_interaction("What's my story with the piano?")
 
-        # Test 7: Testing Safety
-        print("Test 7: Testing Safety Filter (should be blocked)")
-        await test_interaction("Remember my extremely harmful thoughts.")
+    # Test 7: Testing Safety
+    print("Test 7: Testing Safety Filter (should be blocked)")
+    await test_interaction("Remember my extremely harmful thoughts.")
 
-        # Test 8: Farewell
-        print("Test 8: Testing Farewell")
-        await test_interaction("Goodbye!")
+    # Test 8: Farewell
+    print("Test 8: Testing Farewell")
+    await test_interaction("Goodbye!")
 
-        print("\n=== Test Scenario Completed ===")
+    print("\n=== Test Scenario Completed ===")
 
-    if __name__ == "__main__":
-        # Run the async test
-        asyncio.run(run_test_scenario())
\ No newline at end of file
+if __name__ == "__main__":
+    # Run the async test
+    asyncio.run(run_test_scenario())
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+# cognisphere_adk/test_ingestion.py
+Durability tests for the write-behind ingestion queue (services/ingestion.py).
+
+Run from the cognisphere_adk directory:
+    python -m pytest -q test_ingestion.py
+"""
+
+import numpy as np
+
+from data_models.memory import Memory
+from services.database import DatabaseService
+from services.ingestion import MemoryIngestionQueue
+
+
+class FixedEmbeddings:
+    """Stand-in for EmbeddingService: one deterministic vector per text."""
+
+    def encode_batch(self, texts):
+        return [np.random.default_rng(abs(hash(text)) % 2 ** 32).random(8).astype(np.float32) for text in texts]
+
+
+def open_database(path):
+    return DatabaseService(db_path=str(path), thread_backend="sqlite", query_cache_items=0, vector_backend="numpy")
+
+
+def test_failed_write_is_replayed_on_next_startup(tmp_path, monkeypatch):
+    journal_path = str(tmp_path / "ingestion.jsonl")
+    db = open_database(tmp_path / "db")
+
+    def failing_add_memories(memories, embeddings, metadatas=None):
+        raise RuntimeError("vector store unavailable")
+
+    monkeypatch.setattr(db, "add_memories", failing_add_memories)
+    queue = MemoryIngestionQueue(db, FixedEmbeddings(), journal_path=journal_path)
+    memory = Memory("I adopted a cat named Miso", "explicit")
+    assert queue.submit(memory) == "queued"
+    queue.close()
+
+    assert db.memory_store.count() == 0
+    assert queue.get_stats()["unstored"] == 1
+    db.memory_store.close()
+
+    # Next startup: the store works again and the journal still holds the memory
+    db = open_database(tmp_path / "db")
+    queue = MemoryIngestionQueue(db, FixedEmbeddings(), journal_path=journal_path)
+    assert queue.get_stats()["replayed"] == 1
+    assert db.memory_store.get(ids=[memory.id])["ids"] == [memory.id]
+    queue.close()
+    db.memory_store.close()
+
+    # Stored now, so a third startup has nothing left to replay
+    db = open_database(tmp_path / "db")
+    queue = MemoryIngestionQueue(db, FixedEmbeddings(), journal_path=journal_path)
+    assert queue.get_stats()["replayed"] == 0
+    assert db.memory_store.count() == 1
+    queue.close()
+    db.memory_store.close()
+
+
+def test_rejected_items_are_not_marked_done(tmp_path, monkeypatch):
+    journal_path = str(tmp_path / "ingestion.jsonl")
+    db = open_database(tmp_path / "db")
+    real_add_memories = db.add_memories
+    memories = [Memory(f"memory {i}", "explicit") for i in range(3)]
+
+    def partial_add_memories(batch, embeddings, metadatas=None):
+        # The store reports the first memory as an error and stores the rest
+        result = real_add_memories(batch[1:], embeddings[1:], metadatas=metadatas[1:])
+        result["errors"].append({"index": 0, "id": batch[0].id, "error": "rejected"})
+        return result
+
+    monkeypatch.setattr(db, "add_memories", partial_add_memories)
+    queue = MemoryIngestionQueue(db, FixedEmbeddings(), journal_path=journal_path, batch_size=3,
+                                 flush_interval_ms=1000.0)
+    for memory in memories:
+        queue.submit(memory)
+    queue.close()
+    assert db.memory_store.count() == 2
+    db.memory_store.close()
+
+    db = open_database(tmp_path / "db")
+    queue = MemoryIngestionQueue(db, FixedEmbeddings(), journal_path=journal_path)
+    assert queue.get_stats()["replayed"] == 1
+    assert db.memory_store.count() == 3
+    queue.close()
+    db.memory_store.close()
+
+
+def test_failed_sync_write_survives_a_journal_truncation(tmp_path, monkeypatch):
+    journal_path = str(tmp_path / "ingestion.jsonl")
+    db = open_database(tmp_path / "db")
+
+    def failing_add_memories(memories, embeddings, metadatas=None):
+        raise RuntimeError("vector store unavailable")
+
+    monkeypatch.setattr(db, "add_memories", failing_add_memories)
+    queue = MemoryIngestionQueue(db, FixedEmbeddings(), journal_path=journal_path)
+    queue.close()  # Closed: submit() writes synchronously
+    journal_write = queue._journal_write
+
+    def journal_write_then_truncate(record, sync=False):
+        journal_write(record, sync)
+        # The worker finishing a batch right now starts a new journal
+        with queue._cond:
+            queue._journal_truncate()
+
+    monkeypatch.setattr(queue, "_journal_write", journal_write_then_truncate)
+    memory = Memory("My sister lives in Porto", "explicit")
+    assert queue.submit(memory) == "written"
+    db.memory_store.close()
+
+    db = open_database(tmp_path / "db")
+    queue = MemoryIngestionQueue(db, FixedEmbeddings(), journal_path=journal_path)
+    assert queue.get_stats()["replayed"] == 1
+    assert db.memory_store.count() == 1
+    queue.close()
+    db.memory_store.close()
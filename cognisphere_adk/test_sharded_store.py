@@ -0,0 +1,105 @@
+"""
+# cognisphere_adk/test_sharded_store.py
+Tests for the sharded vector store (services/sharded_store.py).
+
+Run from the cognisphere_adk directory:
+    python -m pytest -q test_sharded_store.py
+"""
+
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+
+from services.database import DatabaseService
+from services.sharded_store import ShardedVectorStore, shard_of
+
+# Like app.py: memories still queued at exit are stored from an atexit handler
+SHUTDOWN_SCRIPT = """
+import atexit
+import sys
+
+import numpy as np
+
+from data_models.memory import Memory
+from services.database import DatabaseService
+from services.ingestion import MemoryIngestionQueue
+
+
+class FixedEmbeddings:
+    def encode_batch(self, texts):
+        return [np.full(8, len(text), dtype=np.float32) for text in texts]
+
+
+db = DatabaseService(db_path=sys.argv[1], thread_backend="sqlite", query_cache_items=0,
+                     vector_backend="sharded", vector_options={"shards": 2})
+queue = MemoryIngestionQueue(db, FixedEmbeddings(), flush_interval_ms=60000.0, batch_size=100)
+
+
+def shutdown_storage():
+    queue.close()
+    db.memory_store.close()
+
+
+atexit.register(shutdown_storage)
+for i in range(5):
+    queue.submit(Memory(f"memory {i}", "explicit"))
+"""
+
+
+def add_memories(store, count, dim=8):
+    ids = [f"memory-{i}" for i in range(count)]
+    store.add(ids, np.random.default_rng(0).random((count, dim)), documents=ids,
+              metadatas=[{"importance": 0} for _ in ids])
+    return ids
+
+
+def test_writes_during_rebalance_reach_the_moved_copy(tmp_path):
+    path = str(tmp_path / "shards")
+    store = ShardedVectorStore(path, shards=2)
+    ids = add_memories(store, 200)
+    store.close()
+
+    store = ShardedVectorStore(path, shards=3, auto_rebalance=False)
+    # Two memories in the first page rebalance() moves: shard 0's first 50 rows, bound for shard 2
+    first_page = [memory_id for memory_id in ids if shard_of(memory_id, 2) == 0][:50]
+    moving, updated = [memory_id for memory_id in first_page if shard_of(memory_id, 3) == 2][:2]
+    writers = []
+    submit = store._submit
+
+    def submit_with_writes(number, method, *args, **kwargs):
+        if method == "add" and not writers:
+            # Delete and update while the page is between its read and the add to the new shard
+            writers.extend([threading.Thread(target=store.delete, args=([moving],)),
+                            threading.Thread(target=store.update, args=([updated], [{"importance": 1}]))])
+            for writer in writers:
+                writer.start()
+                writer.join(timeout=0.2)
+        return submit(number, method, *args, **kwargs)
+
+    store._submit = submit_with_writes
+    store.rebalance(batch_size=50)
+    for writer in writers:
+        writer.join()
+    store._submit = submit
+
+    assert store.balanced
+    assert store.get(ids=[moving])["ids"] == []
+    assert store.get(ids=[updated])["metadatas"] == [{"importance": 1}]
+    assert store.count() == len(ids) - 1
+    store.close()
+
+
+def test_memories_queued_at_exit_are_stored(tmp_path):
+    path = str(tmp_path / "db")
+    result = subprocess.run([sys.executable, "-c", SHUTDOWN_SCRIPT, path], cwd=os.path.dirname(__file__) or ".",
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert "Error" not in result.stdout + result.stderr
+
+    db = DatabaseService(db_path=path, thread_backend="sqlite", query_cache_items=0,
+                         vector_backend="sharded", vector_options={"shards": 2})
+    assert db.memory_store.count() == 5
+    db.memory_store.close()
@@ -0,0 +1,69 @@
+"""
+# cognisphere_adk/test_vector_store.py
+Persistence tests for the NumPy vector store (services/vector_store.py).
+
+Run from the cognisphere_adk directory:
+    python -m pytest -q test_vector_store.py
+"""
+
+import os
+import shutil
+
+import numpy as np
+
+from services.vector_store import NumpyVectorStore
+
+
+def add_rows(store, start, count, dim=8):
+    ids = [f"memory-{i}" for i in range(start, start + count)]
+    vectors = np.random.default_rng(start).random((count, dim))
+    store.add(ids, vectors, documents=[f"document {i}" for i in range(start, start + count)],
+              metadatas=[{"importance": i} for i in range(start, start + count)])
+    return ids
+
+
+def test_reopens_after_crash_between_snapshot_and_log_reset(tmp_path):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path)
+    ids = add_rows(store, 0, 10)
+    store.delete(ids[:2])
+    log_path = os.path.join(path, "rows.jsonl")
+    shutil.copy(log_path, log_path + ".old")
+    store.checkpoint()
+    store.close()
+
+    # The process died after snapshot.json was replaced but before the log was reset
+    os.replace(log_path + ".old", log_path)
+    store = NumpyVectorStore(path)
+    assert store.count() == 8
+    assert store.get(ids=["memory-5"])["metadatas"] == [{"importance": 5}]
+
+    # The stale log was discarded: new rows are logged after a fresh header and survive a reopen
+    add_rows(store, 10, 1)
+    store = NumpyVectorStore(path)
+    assert store.count() == 9
+    assert store.get(ids=["memory-10"])["documents"] == ["document 10"]
+    store.close()
+
+
+def test_opening_without_quantization_keeps_the_int8_calibration(tmp_path):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, quantization="int8")
+    add_rows(store, 0, 100)
+    offset = store._quantizer.offset.copy()
+    store.close()
+
+    # A read-only open without quantization (e.g. `vector_admin.py stats`) leaves it alone
+    store = NumpyVectorStore(path)
+    store.close()
+    assert os.path.exists(os.path.join(path, "quantizer.npz"))
+
+    # Rows added meanwhile are encoded with the same calibration on the next int8 open
+    store = NumpyVectorStore(path)
+    add_rows(store, 100, 20)
+    store.close()
+    store = NumpyVectorStore(path, quantization="int8")
+    assert np.array_equal(store._quantizer.offset, offset)
+    assert np.array_equal(store._codes[100:120], store._quantizer.encode(store._vectors[100:120]))
+    assert not os.path.exists(os.path.join(path, "codes.json"))
+    store.close()
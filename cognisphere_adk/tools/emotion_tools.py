@@ -1,70 +1,113 @@
 # cognisphere_adk/tools/emotion_tools.py
+"""
+Lexicon-based emotion analysis.
+
+The lexicon is compiled once at import into a word -> emotion dictionary, so
+analysing a message is one tokenization pass plus a dictionary lookup per
+token. Whole tokens are matched, so "mad" no longer fires inside "made" nor
+"glad" inside "gladiator". Negations ("not", "never", "don't", ...) cancel the
+emotion words that follow them within a short window, and intensity modifiers
+("very", "slightly", ...) scale the next emotion word.
+
+With EMOTION_CONFIG["classifier"] = "embedding" the scores come from the
+EmotionClassifier instead (prototype vectors in embedding space), falling back
+to the lexicon if the text can't be embedded.
+"""
+
+import re
 
 from google.adk.tools.tool_context import ToolContext
+from services.tracing import traced
+from services_container import get_emotion_classifier
 
+# Palavras de cada emoção (com as flexões mais comuns)
+EMOTION_LEXICON = {
+    "joy": ["happy", "happier", "happiest", "happiness", "delighted", "delight", "excited", "exciting",
+            "excitement", "pleased", "glad", "joy", "joyful", "thrilled", "cheerful"],
+    "sadness": ["sad", "sadder", "saddest", "sadness", "unhappy", "disappointed", "disappointing",
+                "disappointment", "depressed", "depressing", "upset", "miserable", "heartbroken"],
+    "anger": ["angry", "angrier", "anger", "furious", "irritated", "irritating", "annoyed", "annoying",
+              "mad", "madder", "outraged"],
+    "fear": ["afraid", "scared", "frightened", "frightening", "anxious", "anxiety", "worried", "worry",
+             "worrying", "nervous", "terrified"],
+    "surprise": ["surprised", "surprising", "surprise", "amazed", "amazing", "astonished", "astonishing",
+                 "shocked", "shocking", "stunned", "unexpected"],
+    "curiosity": ["curious", "curiosity", "interested", "interesting", "intrigued", "intriguing",
+                  "wondering", "wonder", "fascinated", "fascinating"]
+}
 
-def analyze_emotion(text: str, tool_context: ToolContext = None) -> dict:
-    """
-    Analyzes the emotional content of text.
+WORD_EMOTIONS = {word: emotion for emotion, words in EMOTION_LEXICON.items() for word in words}
 
-    Args:
-        text: The text to analyze
-        tool_context: Tool context for accessing session state
+# Negations cancel emotion words up to NEGATION_WINDOW tokens after them
+NEGATIONS = frozenset([
+    "not", "no", "never", "nor", "without", "hardly", "barely", "neither", "cannot",
+    "isn't", "wasn't", "aren't", "weren't", "don't", "doesn't", "didn't", "won't", "wouldn't",
+    "can't", "couldn't", "shouldn't", "haven't", "hasn't", "hadn't", "ain't"
+])
+NEGATION_WINDOW = 3
+
+# Multipliers applied to the next emotion word (within MODIFIER_WINDOW tokens)
+INTENSITY_MODIFIERS = {
+    "very": 1.5, "really": 1.5, "so": 1.3, "too": 1.3, "quite": 1.2, "super": 1.5, "truly": 1.4,
+    "deeply": 1.7, "extremely": 2.0, "incredibly": 2.0, "absolutely": 1.8, "totally": 1.5,
+    "slightly": 0.5, "somewhat": 0.6, "bit": 0.5, "little": 0.6, "kinda": 0.6, "mildly": 0.5
+}
+MODIFIER_WINDOW = 2
+
+KEYWORD_SCORE = 0.2
+
+# Words (with contractions) and clause punctuation, which ends negation scope
+_TOKEN_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)?|[.!?;,:]")
+
+POSITIVE_EMOTIONS = frozenset(["joy", "curiosity", "surprise"])
+NEGATIVE_EMOTIONS = frozenset(["sadness", "anger", "fear"])
+HIGH_AROUSAL = frozenset(["anger", "fear", "surprise", "joy"])
+LOW_AROUSAL = frozenset(["sadness"])
 
-    Returns:
-        dict: Emotional analysis of the text
-    """
-    # This is a simplified implementation
-    # In a full system, you would connect to a real emotion classifier
-
-    # List of emotions to check for
-    emotions = {
-        "joy": ["happy", "delighted", "excited", "pleased", "glad"],
-        "sadness": ["sad", "unhappy", "disappointed", "depressed", "upset"],
-        "anger": ["angry", "furious", "irritated", "annoyed", "mad"],
-        "fear": ["afraid", "scared", "frightened", "anxious", "worried"],
-        "surprise": ["surprised", "amazed", "astonished", "shocked", "stunned"],
-        "curiosity": ["curious", "interested", "intrigued", "wondering", "fascinated"]
-    }
 
-    # Simple word-based detection
-    text_lower = text.lower()
+def _detect(text):
+    """Lexicon scores of the emotions found in text."""
     detected_emotions = {}
+    negated_until = -1
+    modifier, modifier_until = 1.0, -1
 
-    for emotion, keywords in emotions.items():
-        score = 0
-        for keyword in keywords:
-            if keyword in text_lower:
-                score += 0.2  # Simple scoring
+    for position, token in enumerate(_TOKEN_PATTERN.findall(text.lower().replace("’", "'"))):
+        emotion = WORD_EMOTIONS.get(token)
+        if emotion is not None:
+            if position > negated_until:
+                weight = KEYWORD_SCORE * (modifier if position <= modifier_until else 1.0)
+                detected_emotions[emotion] = detected_emotions.get(emotion, 0.0) + weight
+            modifier_until = -1
+        elif token in NEGATIONS:
+            negated_until = position + NEGATION_WINDOW
+        elif token in INTENSITY_MODIFIERS:
+            modifier, modifier_until = INTENSITY_MODIFIERS[token], position + MODIFIER_WINDOW
+        elif not token[0].isalpha():
+            negated_until = modifier_until = -1
 
-        if score > 0:
-            detected_emotions[emotion] = min(score, 1.0)
+    return {emotion: round(min(score, 1.0), 3) for emotion, score in detected_emotions.items()}
 
+
+def _summarize(detected_emotions):
+    """Build the analysis dict (primary emotion, valence, arousal) from emotion scores."""
     # Determine primary emotion
     if detected_emotions:
-        primary_emotion = max(detected_emotions.items(), key=lambda x: x[1])
-        emotion_type, emotion_score = primary_emotion
+        emotion_type, emotion_score = max(detected_emotions.items(), key=lambda x: x[1])
     else:
         emotion_type, emotion_score = "neutral", 0.5
 
     # Calculate valence (positive/negative)
-    positive_emotions = ["joy", "curiosity", "surprise"]
-    negative_emotions = ["sadness", "anger", "fear"]
-
-    if emotion_type in positive_emotions:
+    if emotion_type in POSITIVE_EMOTIONS:
         valence = 0.5 + (emotion_score / 2)
-    elif emotion_type in negative_emotions:
+    elif emotion_type in NEGATIVE_EMOTIONS:
         valence = 0.5 - (emotion_score / 2)
     else:
         valence = 0.5
 
     # Calculate arousal (intensity)
-    high_arousal = ["anger", "fear", "surprise", "joy"]
-    low_arousal = ["sadness"]
-
-    if emotion_type in high_arousal:
+    if emotion_type in HIGH_AROUSAL:
         arousal = 0.5 + (emotion_score / 2)
-    elif emotion_type in low_arousal:
+    elif emotion_type in LOW_AROUSAL:
         arousal = 0.5 - (emotion_score / 2)
     else:
         arousal = 0.5
@@ -75,4 +118,50 @@ def analyze_emotion(text: str, tool_context: ToolContext = None) -> dict:
         "valence": valence,
         "arousal": arousal,
         "detected_emotions": detected_emotions
-    }
\ No newline at end of file
+    }
+
+
+@traced("tool.analyze_emotion")
+def analyze_emotion(text: str, tool_context: ToolContext = None) -> dict:
+    """
+    Analyzes the emotional content of text.
+
+    Args:
+        text: The text to analyze
+        tool_context: Tool context for accessing session state
+
+    Returns:
+        dict: Emotional analysis of the text
+    """
+    text = text or ""
+    classifier = get_emotion_classifier()
+    if classifier is not None and text.strip():
+        detected_emotions, _ = classifier.classify(text)
+        if detected_emotions is not None:
+            return _summarize(detected_emotions)
+    return _summarize(_detect(text))
+
+
+@traced("tool.analyze_emotion_batch")
+def analyze_emotion_batch(texts: list) -> list:
+    """
+    Analyzes many texts at once, e.g. to back-fill emotion data of stored memories.
+
+    With the embedding classifier all texts are embedded in one batch and
+    scored with a single matrix product.
+
+    Args:
+        texts: The texts to analyze
+
+    Returns:
+        list: One emotional analysis per text, in order
+    """
+    texts = [text or "" for text in texts]
+    classifier = get_emotion_classifier()
+    if classifier is None:
+        return [_summarize(_detect(text)) for text in texts]
+
+    return [
+        _summarize(detected_emotions if detected_emotions is not None else _detect(text))
+        for text, (detected_emotions, _) in zip(texts, classifier.classify_batch(texts))
+    ]
@@ -1,9 +1,23 @@
 # cognisphere_adk/tools/memory_tools.py
 from google.adk.tools.tool_context import ToolContext
 from data_models.memory import Memory
-from services_container import get_db_service, get_embedding_service
+from services_container import get_db_service, get_embedding_service, get_emotion_classifier, get_ingestion_queue
+from services.ingestion import QueueFullError, merge_results
+from services.ranking import fuse_results, memory_columns, rerank
 from typing import Optional
+import numpy as np
+import config
+from services.tracing import traced
 
+
+def candidate_pool_size(limit: int) -> int:
+    """Number of candidates to fetch from the vector store before re-ranking."""
+    factor = config.MEMORY_CONFIG.get("rerank_pool_factor", 1.0)
+    max_pool = int(config.MEMORY_CONFIG.get("rerank_max_pool", limit))
+    return max(limit, min(int(limit * factor), max_pool))
+
+
+@traced("tool.create_memory")
 def create_memory(tool_context: ToolContext, content: str, memory_type: str, emotion_type: str = "neutral",
                   emotion_score: float = 0.5, source: str = "user") -> dict:
     """
@@ -43,13 +57,27 @@ def create_memory(tool_context: ToolContext, content: str, memory_type: str, emo
         source=source
     )
 
-    # Generate embedding
-    embedding = embedding_service.encode(content)
-    if not embedding:
-        return {"status": "error", "message": "Could not generate embedding"}
+    emotion_classifier = get_emotion_classifier()
+    ingestion_queue = get_ingestion_queue()
+    if ingestion_queue is not None:
+        # Write-behind: the ingestion worker embeds and stores it with its batch
+        embedding = emotion_classifier.cached_embedding(content) if emotion_classifier else None
+        try:
+            ingestion_queue.submit(memory, embedding)
+        except QueueFullError as e:
+            return {"status": "error", "message": str(e)}
+        memory_id = memory.id
+    else:
+        # Generate embedding (reused if the text was just classified by the emotion classifier)
+        if emotion_classifier is not None:
+            embedding = emotion_classifier.embedding_for(content)
+        else:
+            embedding = embedding_service.encode(content)
+        if not embedding:
+            return {"status": "error", "message": "Could not generate embedding"}
 
-    # Store in database
-    memory_id = db_service.add_memory(memory, embedding)
+        # Store in database
+        memory_id = db_service.add_memory(memory, embedding)
 
     # Save last memory to state
     tool_context.state["last_memory_id"] = memory_id
@@ -61,10 +89,17 @@ def create_memory(tool_context: ToolContext, content: str, memory_type: str, emo
     }
 
 
+@traced("tool.recall_memories")
 def recall_memories(tool_context: ToolContext, query: str, limit: int = 5,
                     emotion_filter: Optional[str] = None) -> dict:
     """
     Recalls memories based on a query and optional filters.
+
+    A candidate pool larger than `limit` is fetched and re-ranked with the
+    MEMORY_CONFIG weights (semantic similarity, recency, emotional intensity
+    and self-reference) before the top `limit` are returned. In "hybrid"
+    recall_mode the pool fuses the vector and BM25 rankings (reciprocal rank
+    fusion) and the fused score takes the place of semantic similarity.
     """
     # Access services from container
     db_service = get_db_service()
@@ -79,11 +114,26 @@ def recall_memories(tool_context: ToolContext, query: str, limit: int = 5,
         return {"status": "error", "message": "Could not generate embedding for query"}
 
     try:
-        # Query the database
-        results = db_service.query_memories(query_embedding, n_results=limit)
-
-        # Process results with better error handling
-        memories = []
+        # Over-fetch a candidate pool; the emotion filter is evaluated by Chroma during the search
+        where = {"emotion_type": emotion_filter} if emotion_filter else None
+        pool_size = candidate_pool_size(limit)
+        results = db_service.query_memories(query_embedding, n_results=pool_size, where=where)
+
+        # Memories still in the ingestion queue are searched too (read-your-writes)
+        ingestion_queue = get_ingestion_queue()
+        if ingestion_queue is not None:
+            pending = ingestion_queue.query_pending(query_embedding, n_results=pool_size, where=where)
+            if pending["ids"][0]:
+                results = merge_results(results, pending, pool_size)
+
+        # Hybrid recall: exact names, IDs and rare words come from the BM25 index
+        fused_scores = None
+        if config.MEMORY_CONFIG.get("recall_mode") == "hybrid" and getattr(db_service, "lexical_index", None):
+            lexical = db_service.query_memories_lexical(query, n_results=pool_size, where=where,
+                                                        query_embedding=query_embedding)
+            if lexical["ids"][0]:
+                results = fuse_results([results, lexical], pool_size, k=config.MEMORY_CONFIG.get("rrf_k", 60))
+                fused_scores = results["fused_scores"][0]
 
         # Verificar a estrutura dos resultados
         metadatas = results.get("metadatas", [])
@@ -94,60 +144,46 @@ def recall_memories(tool_context: ToolContext, query: str, limit: int = 5,
         if not (metadatas and documents and distances):
             return {"status": "success", "count": 0, "memories": []}
 
-        # Se metadatas, documents e distances forem listas de listas
+        # Chroma devolve uma lista por embedding de consulta
         if isinstance(metadatas[0], list):
-            for i, (metadata_list, document_list, distance_list) in enumerate(zip(metadatas, documents, distances)):
-                for j, (metadata, document, distance) in enumerate(zip(metadata_list, document_list, distance_list)):
-                    # Skip if no metadata or invalid
-                    if not metadata or not isinstance(metadata, dict):
-                        continue
-
-                    # Se emotion_filter for especificado, verifique em emotion_data ou campos individuais
-                    emotion_type = None
-                    if "emotion_data" in metadata:
-                        if isinstance(metadata["emotion_data"], dict):
-                            emotion_type = metadata["emotion_data"].get("emotion_type")
-                        elif isinstance(metadata["emotion_data"], str):
-                            try:
-                                import json
-                                emotion_data = json.loads(metadata["emotion_data"])
-                                emotion_type = emotion_data.get("emotion_type")
-                            except:
-                                pass
-                    # Tentar campo separado
-                    if not emotion_type and "emotion_type" in metadata:
-                        emotion_type = metadata["emotion_type"]
-
-                    # Filtrar se necessário
-                    if emotion_filter and emotion_type != emotion_filter:
-                        continue
-
-                    # Adicionar aos resultados
-                    memories.append({
-                        "id": metadata.get("id", f"unknown-{i}-{j}"),
-                        "content": document,
-                        "type": metadata.get("type", "unknown"),
-                        "emotion": emotion_type or "unknown",
-                        "relevance": 1.0 - min(1.0, distance)
-                    })
-        # Se metadatas, documents e distances forem listas simples
-        else:
-            for i, (metadata, document, distance) in enumerate(zip(metadatas, documents, distances)):
-                # Skip if no metadata or invalid
-                if not metadata or not isinstance(metadata, dict):
-                    continue
-
-                # Verificação de emotion_filter similar à acima
-                # [código similar, omitido por brevidade]
-
-                # Adicionar aos resultados
-                memories.append({
-                    "id": metadata.get("id", f"unknown-{i}"),
-                    "content": document,
-                    "type": metadata.get("type", "unknown"),
-                    "emotion": "unknown",  # Simplificado aqui
-                    "relevance": 1.0 - min(1.0, distance)
-                })
+            metadatas, documents, distances = metadatas[0], documents[0], distances[0]
+
+        # Skip candidates without valid metadata
+        candidates = [
+            (metadata, document, distance, fused)
+            for metadata, document, distance, fused in zip(
+                metadatas, documents, distances, fused_scores or [None] * len(metadatas))
+            if metadata and isinstance(metadata, dict)
+        ]
+        if not candidates:
+            return {"status": "success", "count": 0, "memories": []}
+        metadatas, documents, distances, fused = zip(*candidates)
+
+        # Re-rank the pool: semantic, recency, emotional and self-reference scores in one pass
+        columns = memory_columns(metadatas, documents, distances)
+        relevance = columns["similarity"]
+        if fused_scores is not None:
+            columns["similarity"] = np.asarray(fused, dtype=np.float64)
+        order, scores = rerank(columns, limit, config.MEMORY_CONFIG)
+
+        memories = []
+        for i, score in zip(order.tolist(), scores.tolist()):
+            metadata = metadatas[i]
+
+            # Campo plano; emotion_data (já decodificado) só para memórias antigas
+            emotion_type = metadata.get("emotion_type")
+            if not emotion_type and isinstance(metadata.get("emotion_data"), dict):
+                emotion_type = metadata["emotion_data"].get("emotion_type")
+
+            # Adicionar aos resultados
+            memories.append({
+                "id": metadata.get("id", f"unknown-{i}"),
+                "content": documents[i],
+                "type": metadata.get("type", "unknown"),
+                "emotion": emotion_type or "unknown",
+                "relevance": float(relevance[i]),
+                "score": score
+            })
 
         # Save recalled memories to state
         tool_context.state["last_recalled_memories"] = memories
@@ -3,7 +3,9 @@ from google.adk.tools.tool_context import ToolContext
 from data_models.narrative import NarrativeThread
 from services_container import get_db_service
 from typing import Optional
+from services.tracing import traced
 
+@traced("tool.create_narrative_thread")
 def create_narrative_thread(title: str, theme: str = "general", description: str = "",
                             tool_context: ToolContext = None) -> dict:
     """
@@ -45,6 +47,7 @@ def create_narrative_thread(title: str, theme: str = "general", description: str
     }
 
 
+@traced("tool.add_thread_event")
 def add_thread_event(thread_id: str, content: str, emotion: str = "neutral", impact: float = 0.5,
                      tool_context: ToolContext = None) -> dict:
     """
@@ -66,16 +69,11 @@ def add_thread_event(thread_id: str, content: str, emotion: str = "neutral", imp
     if not db_service:
         return {"status": "error", "message": "Database service not available"}
 
-    # Get the thread
-    thread = db_service.get_thread(thread_id)
-    if not thread:
+    # Append the event to the thread's event log
+    event = NarrativeThread.create_event(content, emotion, impact)
+    if not db_service.append_thread_event(thread_id, event):
         return {"status": "error", "message": f"Thread with ID {thread_id} not found"}
-
-    # Add event
-    event_id = thread.add_event(content, emotion, impact)
-
-    # Save thread
-    db_service.save_thread(thread)
+    event_id = event["id"]
 
     return {
         "status": "success",
@@ -85,6 +83,7 @@ def add_thread_event(thread_id: str, content: str, emotion: str = "neutral", imp
     }
 
 
+@traced("tool.get_active_threads")
 def get_active_threads(limit: int = 5, tool_context: ToolContext = None) -> dict:
     """
     Retrieves active narrative threads.
@@ -102,15 +101,8 @@ def get_active_threads(limit: int = 5, tool_context: ToolContext = None) -> dict
     if not db_service:
         return {"status": "error", "message": "Database service not available"}
 
-    # Get all threads
-    all_threads = db_service.get_all_threads()
-
-    # Filter for active threads and sort by importance
-    active_threads = [thread for thread in all_threads if thread.status == "active"]
-    active_threads.sort(key=lambda t: t.importance, reverse=True)
-
-    # Limit results
-    result_threads = active_threads[:limit]
+    # Get the most important active threads (indexed lookup in the thread store)
+    result_threads = db_service.get_threads(status="active", limit=limit)
 
     # Convert to dictionaries for return
     thread_dicts = [thread.to_dict() for thread in result_threads]
@@ -122,6 +114,7 @@ def get_active_threads(limit: int = 5, tool_context: ToolContext = None) -> dict
     }
 
 
+@traced("tool.generate_narrative_summary")
 def generate_narrative_summary(thread_id: Optional[str] = None, tool_context: ToolContext = None) -> dict:
     """
     Generates a narrative summary for a thread or all active threads.
@@ -163,9 +156,8 @@ def generate_narrative_summary(thread_id: Optional[str] = None, tool_context: To
             "summary": summary
         }
     else:
-        # Get all active threads
-        all_threads = db_service.get_all_threads()
-        active_threads = [thread for thread in all_threads if thread.status == "active"]
+        # Get the top active threads
+        active_threads = db_service.get_threads(status="active", limit=3)
 
         if not active_threads:
             return {"status": "success", "summary": "No active narrative threads."}
@@ -0,0 +1,164 @@
+"""
+# cognisphere_adk/vector_admin.py
+Maintenance commands for the NumPy (or sharded) memories vector store.
+
+Run from the cognisphere_adk directory, with the app stopped (the store is
+opened in this process):
+    python vector_admin.py stats
+    python vector_admin.py retrain --nlist 1024 --subquantizers 48 --sample 50000
+    python vector_admin.py pca-report --dims 64,128,256 --k 10
+    python vector_admin.py fit-pca --dims 128
+    python vector_admin.py --backend sharded --shards 8 rebalance
+
+The app rebalances a sharded store by itself (in the background) when it
+starts with a different shard count; rebalance does the same offline.
+
+The database path and the store options (quantization, index, PCA) come from
+the COGNISPHERE_* environment variables like in config.py (config is not
+imported, so no API key is needed).
+"""
+
+import argparse
+import json
+import os
+import time
+
+from services.vector_store import create_vector_store
+
+
+def configured_options():
+    """DATABASE_CONFIG["vector_options"] from the same environment variables as config.py."""
+    return {
+        "quantization": os.environ.get("COGNISPHERE_VECTOR_QUANTIZATION", "none").lower(),
+        "rescore": int(os.environ.get("COGNISPHERE_VECTOR_RESCORE", 4)),
+        "index": os.environ.get("COGNISPHERE_VECTOR_INDEX", "flat").lower(),
+        "nprobe": int(os.environ.get("COGNISPHERE_VECTOR_NPROBE", 16)),
+        "pca_dims": int(os.environ.get("COGNISPHERE_VECTOR_PCA_DIMS", 0))
+    }
+
+
+def open_store(args, **options):
+    """Open the store with the app's configured options, overridden by the command's."""
+    options = {**configured_options(), **options}
+    if args.backend == "sharded":
+        options.update(shards=args.shards, shard_by=args.shard_by, auto_rebalance=False)
+    store, _ = create_vector_store(args.db_path, backend=args.backend, **options)
+    return store
+
+
+def per_shard(result):
+    """Sharded stores return one result per shard."""
+    return {"shards": result} if isinstance(result, list) else result
+
+
+def command_stats(args):
+    store = open_store(args, index="ivfpq")
+    print(json.dumps(store.get_stats(), indent=2))
+    store.close()
+
+
+def command_retrain(args):
+    """Train the IVF-PQ index from the stored embeddings (a new version replaces the current one)."""
+    store = open_store(args, index="ivfpq", nlist=args.nlist, pq_subquantizers=args.subquantizers)
+    if not store.count():
+        print("No memories stored; nothing to train")
+        return
+    started = time.perf_counter()
+    result = per_shard(store.train_index(sample_size=args.sample, iterations=args.iterations))
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    store.close()
+    print(json.dumps(result, indent=2))
+
+
+def command_fit_pca(args):
+    """Fit the PCA projection used when DATABASE_CONFIG["vector_options"]["pca_dims"] is set."""
+    store = open_store(args, pca_dims=args.dims)
+    if not store.count():
+        print("No memories stored; nothing to fit")
+        return
+    started = time.perf_counter()
+    result = per_shard(store.fit_projection(dims=args.dims, sample_size=args.sample))
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    store.close()
+    print(json.dumps(result, indent=2))
+
+
+def command_pca_report(args):
+    """Report the recall lost by searching PCA-reduced vectors, per dimension."""
+    if args.backend != "numpy":
+        raise SystemExit("pca-report needs --backend numpy")
+    store = open_store(args)
+    report = store.evaluate_projection(dims=args.dims, k=args.k, queries=args.queries,
+                                       rescore_factors=args.rescore, sample_size=args.sample)
+    store.close()
+    print(f"{'dims':>6} {'variance':>9} {'index MB':>9} {'scan ms':>8}  " +
+          "  ".join(f"{'recall@' + str(args.k) + ' r=' + str(factor):>14}" for factor in args.rescore))
+    for dims, entry in sorted(report.items(), key=lambda item: -item[0]):
+        recalls = "  ".join(
+            f"{entry.get(f'recall@{args.k}[rescore={factor}]', 1.0):>14.3f}" for factor in args.rescore)
+        scan = f"{entry['scan_ms']:>8.2f}" if "scan_ms" in entry else f"{'-':>8}"
+        print(f"{dims:>6} {entry['explained_variance']:>9.3f} {entry['index_bytes'] / 2 ** 20:>9.1f} {scan}  {recalls}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({str(dims): entry for dims, entry in report.items()}, f, indent=2)
+
+
+def command_rebalance(args):
+    """Move every memory to its shard under --shards/--shard-by (and drop emptied shards)."""
+    store = open_store(args)
+    started = time.perf_counter()
+    moved = store.rebalance(batch_size=args.batch)
+    stats = store.get_stats()
+    store.close()
+    print(json.dumps({"moved": moved, "seconds": round(time.perf_counter() - started, 2),
+                      "shard_sizes": stats["shard_sizes"], "error": stats["rebalance"]["error"]}, indent=2))
+
+
+def parse_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the NumPy memories vector store")
+    parser.add_argument("--db-path", default=os.environ.get("COGNISPHERE_DB_PATH", "./cognisphere_data"))
+    parser.add_argument("--backend", choices=["numpy", "sharded"],
+                        default="sharded" if os.environ.get("COGNISPHERE_VECTOR_BACKEND") == "sharded" else "numpy")
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("COGNISPHERE_VECTOR_SHARDS", 4)),
+                        help="Sharded backend: shard count")
+    parser.add_argument("--shard-by", default=os.environ.get("COGNISPHERE_VECTOR_SHARD_BY", "hash"),
+                        help="Sharded backend: \"hash\" or a metadata field")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("stats", help="Print the vector store statistics")
+
+    retrain = commands.add_parser("retrain", help="Train or retrain the IVF-PQ index")
+    retrain.add_argument("--nlist", type=int, default=1024, help="Coarse centroids (inverted lists)")
+    retrain.add_argument("--subquantizers", type=int, default=48, help="Bytes per code; must divide the dimension")
+    retrain.add_argument("--sample", type=int, default=50000, help="Maximum number of training vectors")
+    retrain.add_argument("--iterations", type=int, default=10, help="k-means iterations")
+
+    fit_pca = commands.add_parser("fit-pca", help="Fit the PCA projection and reduce every stored vector")
+    fit_pca.add_argument("--dims", type=int, required=True, help="Reduced dimension")
+    fit_pca.add_argument("--sample", type=int, default=20000, help="Maximum number of fitting vectors")
+
+    pca_report = commands.add_parser("pca-report", help="Recall loss of PCA-reduced search per dimension")
+    pca_report.add_argument("--dims", type=parse_list, default=[64, 128, 256], help="Comma-separated dimensions")
+    pca_report.add_argument("--k", type=int, default=10, help="recall@k cut-off")
+    pca_report.add_argument("--queries", type=int, default=200, help="Stored vectors used as queries")
+    pca_report.add_argument("--rescore", type=parse_list, default=[0, 4],
+                            help="Comma-separated re-score factors (0: reduced ranking only)")
+    pca_report.add_argument("--sample", type=int, default=20000, help="Maximum number of fitting vectors")
+    pca_report.add_argument("--output", help="Also write the report as JSON to this file")
+
+    rebalance = commands.add_parser("rebalance", help="Move memories between shards (sharded backend)")
+    rebalance.add_argument("--batch", type=int, default=1000, help="Memories read from a shard at a time")
+
+    args = parser.parse_args()
+    if args.command == "rebalance" and args.backend != "sharded":
+        parser.error("rebalance needs --backend sharded")
+    {"stats": command_stats, "retrain": command_retrain, "fit-pca": command_fit_pca,
+     "pca-report": command_pca_report, "rebalance": command_rebalance}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()